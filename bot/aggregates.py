@@ -0,0 +1,94 @@
+"""Материализованные агрегаты по корпусам, секциям и планировкам.
+
+Таблицы `agg_*` обновляются инкрементально: при записи diff пересчитываются
+только группы, в которых что-то поменялось, и в той же транзакции, что и
+upsert в `flats`. Пересчёт группы — поиск по индексу, начинающемуся с ключа
+группы, а не проход по всей таблице.
+"""
+
+import json
+from typing import Dict, Iterable, List, Set, Tuple
+
+import aiosqlite
+
+# таблица агрегатов → колонка-ключ группы в flats
+AGGREGATES: Tuple[Tuple[str, str], ...] = (
+    ("agg_bulk", "bulk_id"),
+    ("agg_section", "section_id"),
+    ("agg_layout", "layout_id"),
+)
+
+# Колонки flats, от которых зависят агрегаты (и оценки `bot.deals`)
+SOURCE_COLUMNS: Tuple[str, ...] = (
+    "price",
+    "status",
+    "area",
+    "area_project",
+    "floor",
+    "bulk_id",
+    "section_id",
+    "layout_id",
+    "layout_name",
+)
+
+
+def group_insert_sql(table: str, key: str, where: str) -> str:
+    """INSERT агрегатов по группам `key`, отобранным условием `where`."""
+
+    return f"""
+        INSERT INTO {table}(
+            {key}, layout_name, free_count, reserved_count,
+            min_price, max_price, min_ppm, avg_ppm
+        )
+        SELECT
+            {key},
+            MIN(layout_name),
+            SUM(status = 'free'),
+            SUM(status != 'free'),
+            MIN(CASE WHEN status = 'free' THEN price END),
+            MAX(CASE WHEN status = 'free' THEN price END),
+            MIN(CASE WHEN status = 'free' THEN price / COALESCE(area, area_project) END),
+            AVG(CASE WHEN status = 'free' THEN price / COALESCE(area, area_project) END)
+        FROM flats WHERE {where} GROUP BY {key}
+    """
+
+
+async def snapshot_sources(conn: aiosqlite.Connection, ids: Iterable[int]) -> Dict[int, tuple]:
+    """Значения `SOURCE_COLUMNS` для квартир `ids` (поиск по первичному ключу)."""
+
+    cursor = await conn.execute(
+        f"SELECT id, {', '.join(SOURCE_COLUMNS)} FROM flats "
+        f"WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(ids)),),
+    )
+    return {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+
+
+def affected_groups(before: Dict[int, tuple], after: Dict[int, tuple]) -> Dict[str, Set[int]]:
+    """Ключи групп, затронутых переходом `before` → `after`, по колонке-ключу."""
+
+    positions = {key: SOURCE_COLUMNS.index(key) for _, key in AGGREGATES}
+    groups: Dict[str, Set[int]] = {key: set() for _, key in AGGREGATES}
+    for fid in before.keys() | after.keys():
+        old, new = before.get(fid), after.get(fid)
+        if old == new:
+            continue  # upsert переписал строку без изменений
+        for key, pos in positions.items():
+            for values in (old, new):
+                if values is not None and values[pos] is not None:
+                    groups[key].add(values[pos])
+    return groups
+
+
+async def refresh_groups(conn: aiosqlite.Connection, groups: Dict[str, Set[int]]) -> None:
+    """Пересчитать перечисленные группы (без commit — в транзакции вызывающего)."""
+
+    for table, key in AGGREGATES:
+        keys: List[int] = sorted(groups.get(key, ()))
+        if not keys:
+            continue
+        param = (json.dumps(keys),)
+        await conn.execute(f"DELETE FROM {table} WHERE {key} IN (SELECT value FROM json_each(?))", param)
+        await conn.execute(
+            group_insert_sql(table, key, f"{key} IN (SELECT value FROM json_each(?))"), param
+        )
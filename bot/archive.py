@@ -0,0 +1,274 @@
+import datetime
+import hashlib
+import json
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+import aiosqlite
+
+from bot.config import get_settings
+from bot.executor import CpuExecutor
+from bot.migrations import migrate
+from bot.pik_api_client import unwrap_items
+
+T = TypeVar("T")
+
+# Кодеки хранения тела ответа
+CODEC_FULL = "zlib"  # полный снимок, сжатый zlib
+CODEC_DELTA = "delta"  # изменения относительно предыдущего снимка, сжатые zlib
+
+
+class Snapshot(NamedTuple):
+    """Один архивный ответ `/v1/flat`."""
+
+    digest: str
+    first_seen: str
+    last_seen: str
+    items: List[Dict[str, Any]]
+
+
+def canonical_body(items: Any) -> bytes:
+    """Каноничная сериализация ответа: одинаковые данные дают одинаковые байты."""
+
+    return json.dumps(items, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def body_digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _make_delta(base: List[Dict[str, Any]], items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Построить delta `base` → `items`. None, если квартиры нельзя сопоставить по id."""
+
+    base_map = {item.get("id"): item for item in base}
+    new_map = {item.get("id"): item for item in items}
+    if None in base_map or None in new_map:
+        return None
+    if len(base_map) != len(base) or len(new_map) != len(items):
+        return None  # дубликаты id — храним полный снимок
+
+    changed = {str(fid): item for fid, item in new_map.items() if base_map.get(fid) != item}
+    removed = [fid for fid in base_map if fid not in new_map]
+    return {"set": changed, "del": removed, "order": list(new_map)}
+
+
+def _digest_items(items: List[Dict[str, Any]]) -> Tuple[bytes, str]:
+    body = canonical_body(items)
+    return body, body_digest(body)
+
+
+def _decode_response(body: bytes) -> List[Dict[str, Any]]:
+    return unwrap_items(json.loads(body))
+
+
+def _pack_body(
+    body: bytes,
+    base: Optional[List[Dict[str, Any]]],
+    items: List[Dict[str, Any]],
+) -> Tuple[str, bytes]:
+    """Сжать тело: delta к `base`, если она есть и выходит меньше полного снимка."""
+
+    full = zlib.compress(body, 9)
+    if base is None:
+        return CODEC_FULL, full
+    delta = _make_delta(base, items)
+    if delta is None:
+        return CODEC_FULL, full
+    packed = zlib.compress(canonical_body(delta), 9)
+    if len(packed) >= len(full):
+        return CODEC_FULL, full
+    return CODEC_DELTA, packed
+
+
+def _decode_blob(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data))
+
+
+def _apply_delta(base: List[Dict[str, Any]], delta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    base_map = {item["id"]: item for item in base}
+    for fid in delta["del"]:
+        base_map.pop(fid, None)
+    for fid, item in delta["set"].items():
+        base_map[item["id"]] = item
+    return [base_map[fid] for fid in delta["order"]]
+
+
+class ResponseArchive:
+    """Content-addressed архив «сырых» ответов `/v1/flat`.
+
+    Тело ответа адресуется sha256 от каноничной сериализации, поэтому повторный
+    одинаковый опрос не добавляет новых данных — лишь сдвигает `last_seen`.
+    Тела хранятся сжатыми: полным снимком или delta к предыдущему снимку.
+    Каждые `archive_keyframe_interval` delta записывается полный снимок, чтобы
+    цепочка восстановления оставалась короткой.
+    """
+
+    def __init__(self, executor: Optional[CpuExecutor] = None):
+        self._settings = get_settings()
+        # сериализация, хэширование и сжатие выполняются вне event loop
+        self._executor = executor
+        # Последний сохранённый снимок: база для следующей delta
+        self._last: Optional[Tuple[str, List[Dict[str, Any]]]] = None
+
+    async def init_db(self) -> None:
+        """Создать таблицы архива при первом запуске (общий раннер миграций)."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            await migrate(conn)
+
+    async def save_body(self, body: bytes, *, fetched_at: Optional[str] = None) -> str:
+        """То же, что `save`, для тела ответа API как есть: разбирается в потоке архива."""
+
+        return await self.save(await self._run(_decode_response, body), fetched_at=fetched_at)
+
+    async def save(self, items: List[Dict[str, Any]], *, fetched_at: Optional[str] = None) -> str:
+        """Сохранить ответ API и вернуть его digest."""
+
+        now = fetched_at or datetime.datetime.utcnow().isoformat()
+        body, digest = await self._run(_digest_items, items)
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(
+                "SELECT id, digest FROM raw_polls ORDER BY id DESC LIMIT 1"
+            )
+            last_poll = await cursor.fetchone()
+
+            # Тот же ответ, что и в прошлый раз: только отмечаем время
+            if last_poll is not None and last_poll[1] == digest:
+                await conn.execute(
+                    "UPDATE raw_polls SET last_seen = ? WHERE id = ?", (now, last_poll[0])
+                )
+                await conn.commit()
+                self._last = (digest, items)
+                return digest
+
+            cursor = await conn.execute("SELECT 1 FROM raw_blobs WHERE digest = ?", (digest,))
+            if await cursor.fetchone() is None:
+                base_digest = last_poll[1] if last_poll is not None else None
+                codec, data, depth = await self._encode(conn, body, items, base_digest)
+                await conn.execute(
+                    "INSERT INTO raw_blobs(digest, codec, base_digest, depth, size, data) "
+                    "VALUES(?,?,?,?,?,?)",
+                    (digest, codec, base_digest if codec == CODEC_DELTA else None, depth, len(body), data),
+                )
+
+            await conn.execute(
+                "INSERT INTO raw_polls(digest, first_seen, last_seen) VALUES(?,?,?)",
+                (digest, now, now),
+            )
+            await conn.commit()
+
+        self._last = (digest, items)
+        return digest
+
+    async def _encode(
+        self,
+        conn: aiosqlite.Connection,
+        body: bytes,
+        items: List[Dict[str, Any]],
+        base_digest: Optional[str],
+    ) -> Tuple[str, bytes, int]:
+        """Выбрать способ хранения тела: delta к `base_digest` или полный снимок."""
+
+        if not self._settings.archive_delta or base_digest is None:
+            codec, data = await self._run(_pack_body, body, None, items)
+            return codec, data, 0
+
+        cursor = await conn.execute("SELECT depth FROM raw_blobs WHERE digest = ?", (base_digest,))
+        row = await cursor.fetchone()
+        if row is None or row[0] + 1 >= self._settings.archive_keyframe_interval:
+            codec, data = await self._run(_pack_body, body, None, items)
+            return codec, data, 0
+
+        if self._last is not None and self._last[0] == base_digest:
+            base_items = self._last[1]
+        else:
+            base_items = await self._load(conn, base_digest, {})
+
+        codec, data = await self._run(_pack_body, body, base_items, items)
+        return codec, data, (row[0] + 1 if codec == CODEC_DELTA else 0)
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self._executor is None:
+            return fn(*args)
+        # входные данные — крупные dict/list, в процесс их не передаём
+        return await self._executor.run_threaded(fn, *args)
+
+    async def _load(
+        self,
+        conn: aiosqlite.Connection,
+        digest: str,
+        cache: Dict[str, List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """Восстановить снимок, пройдя цепочку delta до полного снимка или кэша."""
+
+        chain: List[Dict[str, Any]] = []
+        current: Optional[str] = digest
+        items: Optional[List[Dict[str, Any]]] = None
+        while current is not None:
+            if current in cache:
+                items = cache[current]
+                break
+            cursor = await conn.execute(
+                "SELECT codec, base_digest, data FROM raw_blobs WHERE digest = ?", (current,)
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                raise KeyError(f"В архиве нет снимка {current}")
+            codec, base_digest, data = row
+            payload = await self._run(_decode_blob, data)
+            if codec == CODEC_FULL:
+                items = payload
+                break
+            chain.append(payload)
+            current = base_digest
+
+        if items is None:
+            raise KeyError(f"Цепочка delta для {digest} не заканчивается полным снимком")
+
+        for delta in reversed(chain):
+            items = await self._run(_apply_delta, items, delta)
+        return items
+
+    async def version(self) -> Optional[Tuple[int, str]]:
+        """(id, last_seen) последнего опроса: меняется с каждым сохранённым ответом.
+
+        None, если архив пуст.
+        """
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute("SELECT id, last_seen FROM raw_polls ORDER BY id DESC LIMIT 1")
+            row = await cursor.fetchone()
+        return None if row is None else (row[0], row[1])
+
+    async def iter_snapshots(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> AsyncIterator[Snapshot]:
+        """Потоково перебрать архивные ответы за период [since, until] по времени опроса.
+
+        Время — строки ISO-8601 в UTC, как и `last_seen` в таблице `flats`.
+        Снимки идут по возрастанию времени; восстановленный снимок кэшируется,
+        поэтому delta к предыдущему снимку применяется без повторного чтения цепочки.
+        """
+
+        clauses: List[str] = []
+        params: List[str] = []
+        if since is not None:
+            clauses.append("last_seen >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("first_seen <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(
+                f"SELECT digest, first_seen, last_seen FROM raw_polls {where} ORDER BY id", params
+            )
+            cache: Dict[str, List[Dict[str, Any]]] = {}
+            async for digest, first_seen, last_seen in cursor:
+                items = await self._load(conn, digest, cache)
+                cache = {digest: items}  # держим в памяти только последний снимок
+                yield Snapshot(digest, first_seen, last_seen, items)
@@ -0,0 +1,239 @@
+"""Лента изменений квартир (change data capture) для других систем.
+
+Каждый применённый diff (`FlatRepository.apply_diff`) в той же транзакции
+дописывает в таблицу `cdc_events` по событию на изменившуюся квартиру:
+``insert``, ``update`` или ``delete`` со значениями `CDC_COLUMNS` до и
+после. Номера `seq` строго возрастают и не переиспользуются, поэтому
+потребитель хранит последний обработанный `seq` как курсор и после
+перезапуска продолжает с него; `tx` — `seq` первого события той же
+транзакции, по нему события группируются в diff.
+
+`CdcServer` отдаёт ленту по локальному HTTP (aiohttp):
+
+* ``GET /events?after=<seq>&limit=<n>&wait=<сек>`` — пачка событий
+  JSON Lines; если новых нет, запрос ждёт их до `wait` секунд (long poll);
+* ``GET /events/stream?after=<seq>`` — Server-Sent Events, курсор берётся
+  и из заголовка ``Last-Event-ID`` при переподключении.
+
+События старше `cdc_retention_days` удаляются; заголовок ``X-First-Seq``
+в ответе показывает самый старый доступный `seq`, чтобы потребитель мог
+заметить пропуск.
+"""
+
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import aiosqlite
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+    from bot.repository import FlatRepository
+
+logger = logging.getLogger(__name__)
+
+# Колонки flats, изменения которых попадают в ленту (last_seen и raw — нет)
+CDC_COLUMNS = (
+    "rooms",
+    "price",
+    "status",
+    "booking_status",
+    "area",
+    "floor",
+    "bulk_id",
+    "section_id",
+    "layout_name",
+    "url",
+)
+
+# Строка события JSON Lines / поле data в SSE
+EVENT_JSON_SQL = (
+    "json_object('seq', seq, 'tx', tx, 'ts', ts, 'op', op, 'id', flat_id, "
+    "'before', json(old_values), 'after', json(new_values))"
+)
+
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+async def snapshot(conn: aiosqlite.Connection, ids: Iterable[int]) -> Dict[int, str]:
+    """JSON-объект `CDC_COLUMNS` для каждой из квартир `ids`."""
+
+    values = ", ".join(f"'{name}', {name}" for name in CDC_COLUMNS)
+    cursor = await conn.execute(
+        f"SELECT id, json_object({values}) FROM flats WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(ids)),),
+    )
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+
+async def append_events(
+    conn: aiosqlite.Connection,
+    before: Dict[int, str],
+    after: Dict[int, str],
+    ts: str,
+    retention_cutoff: str,
+) -> int:
+    """Записать события перехода `before` → `after` (внутри транзакции diff).
+
+    Удаляет события старше `retention_cutoff`. Возвращает число новых событий.
+    """
+
+    events = []
+    for fid in sorted(before.keys() | after.keys()):
+        old, new = before.get(fid), after.get(fid)
+        if old == new:
+            continue  # upsert переписал строку без изменений
+        op = "insert" if old is None else "delete" if new is None else "update"
+        events.append((ts, op, fid, old, new))
+
+    await conn.execute("DELETE FROM cdc_events WHERE ts < ?", (retention_cutoff,))
+    if not events:
+        return 0
+    # tx — seq первого события транзакции; sqlite_sequence не уменьшается при удалении
+    cursor = await conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cdc_events'")
+    row = await cursor.fetchone()
+    tx = (row[0] if row is not None else 0) + 1
+    await conn.executemany(
+        "INSERT INTO cdc_events(tx, ts, op, flat_id, old_values, new_values) VALUES (?, ?, ?, ?, ?, ?)",
+        [(tx, *event) for event in events],
+    )
+    return len(events)
+
+
+class ChangeSignal:
+    """Будит ожидающих после коммита diff в этом процессе."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """Дождаться `notify` не дольше `timeout` секунд; True — дождались."""
+
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class CdcServer:
+    """HTTP-сервер ленты изменений на `listen:port`."""
+
+    def __init__(
+        self,
+        repo: "FlatRepository",
+        listen: str,
+        port: int,
+        *,
+        batch_limit: int = 1000,
+        max_wait: float = 60.0,
+        poll_interval: float = 1.0,
+    ):
+        self._repo = repo
+        self._listen = listen
+        self._port = port
+        self._batch_limit = batch_limit
+        self._max_wait = max_wait
+        # запись может сделать другой экземпляр (ведущий): его коммиты
+        # видны только через БД, поэтому ожидание периодически её перечитывает
+        self._poll_interval = poll_interval
+        self._runner: Optional["web.AppRunner"] = None
+        self._closing = False
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (если сервер запущен с `port=0`)."""
+
+        if self._runner is None:
+            return self._port
+        return self._runner.addresses[0][1]
+
+    async def start(self) -> None:
+        from aiohttp import web
+
+        web_app = web.Application()
+        web_app.router.add_get("/events", self._handle_poll)
+        web_app.router.add_get("/events/stream", self._handle_stream)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._listen, self._port).start()
+        logger.info("CDC feed listening on %s:%s", self._listen, self.port)
+
+    async def stop(self) -> None:
+        # SSE-потоки бесконечны: будим их, чтобы они завершились сами, а не
+        # были отменены посреди запроса к БД
+        self._closing = True
+        self._repo.changes.notify()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _wait_events(self, after: int, limit: int, wait: float) -> List[Tuple[int, str, str]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            events = await self._repo.get_events(after, limit)
+            remaining = deadline - loop.time()
+            if events or remaining <= 0 or self._closing:
+                return events
+            await self._repo.changes.wait(min(remaining, self._poll_interval))
+
+    def _params(self, request: "web.Request") -> Tuple[int, int, float]:
+        from aiohttp import web
+
+        try:
+            after_seq = int(request.query.get("after", 0))
+            limit = int(request.query.get("limit", self._batch_limit))
+            wait = float(request.query.get("wait", 0))
+        except ValueError:
+            raise web.HTTPBadRequest(text="after, limit и wait должны быть числами") from None
+        return after_seq, max(1, min(limit, self._batch_limit)), max(0.0, min(wait, self._max_wait))
+
+    async def _handle_poll(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        after, limit, wait = self._params(request)
+        events = await self._wait_events(after, limit, wait)
+        body = "".join(f"{line}\n" for _, _, line in events)
+        headers = {
+            "X-Next-After": str(events[-1][0] if events else after),
+            "X-First-Seq": str(await self._repo.first_event_seq()),
+        }
+        return web.Response(text=body, content_type="application/x-ndjson", headers=headers)
+
+    async def _handle_stream(self, request: "web.Request") -> "web.StreamResponse":
+        from aiohttp import web
+
+        after, limit, _ = self._params(request)
+        # при переподключении EventSource повторяет тот же URL: Last-Event-ID важнее `after`
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if last_event_id.isdigit():
+            after = int(last_event_id)
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "X-First-Seq": str(await self._repo.first_event_seq()),
+            }
+        )
+        await response.prepare(request)
+
+        try:
+            while not self._closing:
+                events = await self._wait_events(after, limit, SSE_KEEPALIVE_SECONDS)
+                if not events:
+                    if not self._closing:
+                        await response.write(b": keepalive\n\n")
+                    continue
+                chunk = "".join(f"id: {seq}\nevent: {op}\ndata: {line}\n\n" for seq, op, line in events)
+                await response.write(chunk.encode())
+                after = events[-1][0]
+        except ConnectionResetError:
+            pass  # потребитель отключился
+        return response
@@ -0,0 +1,265 @@
+"""Графики цен по архиву ответов API (`/chart`).
+
+Ряды строятся по снимкам `ResponseArchive` за последние
+`chart_history_days` дней: минимальная цена свободных студий и 1-к. или
+цена одной квартиры. PNG рисует matplotlib в пуле `CpuExecutor` (в режиме
+``process`` — в отдельном процессе), поэтому event loop не блокируется.
+
+Готовые картинки лежат в LRU-кэше в памяти и на диске по ключу
+«запрос + версия архива»: пока не пришёл новый опрос, повторный запрос —
+это только отправка файла (а после первой отправки — по `file_id` Telegram,
+без повторной загрузки). matplotlib импортируется только при рисовании,
+чтобы не замедлять старт бота.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from bot.archive import ResponseArchive
+from bot.config import get_settings
+from bot.executor import CpuExecutor
+from bot.pik_api_client import parse_flats
+from bot.services import is_one, is_studio
+
+
+class ChartError(RuntimeError):
+    """График построить нельзя: нет данных или matplotlib."""
+
+
+class Series(NamedTuple):
+    label: str
+    times: Tuple[str, ...]  # ISO-8601, UTC
+    values: Tuple[Optional[float], ...]  # None — точки нет (квартиры не было в продаже)
+
+
+class ChartSpec(NamedTuple):
+    title: str
+    series: Tuple[Series, ...]
+
+
+class Chart(NamedTuple):
+    key: str
+    png: Optional[bytes]  # None, если картинка уже загружена в Telegram
+    file_id: Optional[str] = None
+
+
+def render_png(spec: ChartSpec) -> bytes:
+    """Нарисовать ступенчатый график цен (выполняется в пуле)."""
+
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        raise ChartError("Для графиков нужен пакет matplotlib: pip install matplotlib") from None
+
+    # Figure без pyplot: не трогает глобальное состояние и безопасна в потоках
+    fig = Figure(figsize=(8, 4.5), dpi=100)
+    ax = fig.subplots()
+    for series in spec.series:
+        times = [datetime.datetime.fromisoformat(t) for t in series.times]
+        values = [float("nan") if v is None else v / 1_000_000 for v in series.values]
+        ax.step(times, values, where="post", label=series.label)
+    ax.set_title(spec.title)
+    ax.set_ylabel("млн ₽")
+    ax.grid(alpha=0.3)
+    if len(spec.series) > 1:
+        ax.legend()
+    fig.autofmt_xdate()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _min_free_prices(items: List[Dict[str, Any]]) -> Tuple[Optional[int], Optional[int]]:
+    """Минимальные цены свободных студий и 1-к. в одном ответе API."""
+
+    studio: Optional[int] = None
+    one: Optional[int] = None
+    for flat in parse_flats(items):
+        if flat.status != "free":
+            continue
+        if is_studio(flat) and (studio is None or flat.price < studio):
+            studio = flat.price
+        elif is_one(flat) and (one is None or flat.price < one):
+            one = flat.price
+    return studio, one
+
+
+def _flat_price(items: List[Dict[str, Any]], flat_id: int) -> Optional[int]:
+    for item in items:
+        if item.get("id") == flat_id:
+            return item.get("price")
+    return None
+
+
+class ChartCache:
+    """LRU-кэш PNG: `max_items` в памяти и `max_disk_items` файлов в `directory`."""
+
+    def __init__(self, max_items: int, directory: str = "", max_disk_items: int = 0):
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._max_items = max_items
+        self._directory = directory
+        self._max_disk_items = max_disk_items
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.png")
+
+    def _remember(self, key: str, png: bytes) -> None:
+        self._memory[key] = png
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                png = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(self._path(key))  # время доступа для LRU на диске
+        return png
+
+    def _write_disk(self, key: str, png: bytes) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, self._path(key))  # читатели не увидят недописанный файл
+
+        files = [entry for entry in os.scandir(self._directory) if entry.name.endswith(".png")]
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[: max(0, len(files) - self._max_disk_items)]:
+            os.remove(entry.path)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if not self._directory:
+            return None
+        png = await asyncio.to_thread(self._read_disk, key)
+        if png is not None:
+            self._remember(key, png)
+        return png
+
+    async def put(self, key: str, png: bytes) -> None:
+        self._remember(key, png)
+        if self._directory and self._max_disk_items > 0:
+            await asyncio.to_thread(self._write_disk, key, png)
+
+
+class ChartService:
+    """Строит графики по архиву и кэширует готовые PNG."""
+
+    def __init__(
+        self,
+        archive: Optional[ResponseArchive],
+        executor: Optional[CpuExecutor] = None,
+        cache: Optional[ChartCache] = None,
+    ):
+        self._settings = get_settings()
+        self._archive = archive
+        self._executor = executor or CpuExecutor()
+        self._cache = cache or ChartCache(
+            self._settings.chart_cache_items,
+            self._settings.chart_cache_dir,
+            self._settings.chart_cache_disk_items,
+        )
+        # ключ → file_id загруженной в Telegram картинки
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+        # одинаковые запросы во время построения ждут один результат
+        self._pending: Dict[str, "asyncio.Future[Chart]"] = {}
+
+    def _since(self) -> str:
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=self._settings.chart_history_days)
+        return since.date().isoformat()
+
+    async def market(self) -> Chart:
+        """Минимальная цена свободных студий и 1-к. по опросам."""
+
+        since = self._since()
+
+        async def build() -> ChartSpec:
+            times: List[str] = []
+            studio: List[Optional[float]] = []
+            one: List[Optional[float]] = []
+            async for snapshot in self._archive.iter_snapshots(since):
+                prices = await self._executor.run_threaded(_min_free_prices, snapshot.items)
+                # две точки на снимок: ответ был актуален с first_seen по last_seen
+                for moment in dict.fromkeys((snapshot.first_seen, snapshot.last_seen)):
+                    times.append(moment)
+                    studio.append(prices[0])
+                    one.append(prices[1])
+            return ChartSpec(
+                "Минимальная цена свободных квартир",
+                (Series("Студии", tuple(times), tuple(studio)), Series("1-к.", tuple(times), tuple(one))),
+            )
+
+        return await self._get(f"market:{since}", build)
+
+    async def flat(self, flat_id: int) -> Chart:
+        """Цена квартиры `flat_id` по опросам."""
+
+        since = self._since()
+
+        async def build() -> ChartSpec:
+            times: List[str] = []
+            prices: List[Optional[float]] = []
+            async for snapshot in self._archive.iter_snapshots(since):
+                price = await self._executor.run_threaded(_flat_price, snapshot.items, flat_id)
+                for moment in dict.fromkeys((snapshot.first_seen, snapshot.last_seen)):
+                    times.append(moment)
+                    prices.append(price)
+            if all(price is None for price in prices):
+                raise ChartError(f"Квартиры #{flat_id} нет в архиве за {self._settings.chart_history_days} дн.")
+            return ChartSpec(f"Цена квартиры #{flat_id}", (Series("Цена", tuple(times), tuple(prices)),))
+
+        return await self._get(f"flat:{flat_id}:{since}", build)
+
+    def remember_file_id(self, key: str, file_id: str) -> None:
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self._settings.chart_cache_items:
+            self._file_ids.popitem(last=False)
+
+    async def _get(self, query: str, build: Callable[[], Awaitable[ChartSpec]]) -> Chart:
+        if self._archive is None:
+            raise ChartError("Архив ответов выключен (ARCHIVE_ENABLED=false) — истории цен нет")
+        version = await self._archive.version()
+        if version is None:
+            raise ChartError("Истории цен пока нет: дождитесь первого обновления")
+
+        key = hashlib.sha256(f"{query}@{version[0]}:{version[1]}".encode()).hexdigest()[:32]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+        future: "asyncio.Future[Chart]" = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            chart = await self._load(key, build)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # ожидающих может не быть — не логировать «never retrieved»
+            raise
+        else:
+            future.set_result(chart)
+            return chart
+        finally:
+            del self._pending[key]
+
+    async def _load(self, key: str, build: Callable[[], Awaitable[ChartSpec]]) -> Chart:
+        if key in self._file_ids:
+            self._file_ids.move_to_end(key)
+            return Chart(key, None, self._file_ids[key])
+        png = await self._cache.get(key)
+        if png is None:
+            png = await self._executor.run(render_png, await build())
+            await self._cache.put(key, png)
+        return Chart(key, png)
@@ -8,13 +8,84 @@ class Settings(BaseSettings):
     telegram_token: str
     telegram_chat_id: str
 
+    # адрес Bot API: можно указать локальный Bot API server или фейковый из bot.loadtest
+    telegram_api_url: str = "https://api.telegram.org/bot"
+
+    # webhook вместо long polling: задаётся публичный https-адрес, по которому
+    # Telegram достучится до webhook_listen:webhook_port/webhook_path
+    webhook_url: str = ""  # пусто — long polling
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_path: str = "telegram"
+    webhook_secret: str = ""  # X-Telegram-Bot-Api-Secret-Token
+
+    # несколько экземпляров на одной БД: опрашивает API и пишет только ведущий
+    leader_election: bool = False
+    leader_lease_seconds: float = 15.0  # срок аренды; за столько заметят падение ведущего
+    leader_heartbeat_seconds: float = 3.0  # как часто продлевать аренду / пытаться её захватить
+    instance_id: str = ""  # имя экземпляра в аренде; по умолчанию hostname:pid
+
+    # сколько обновлений обрабатывать одновременно (1 — строго по очереди);
+    # внутри одного чата порядок сохраняется всегда
+    concurrent_updates: int = 8
+
     pik_base_url: str = "https://api.pik.ru"
     yauza_block_id: int = 1220
 
+    # общий лимит запросов к api.pik.ru (см. bot.governor)
+    pik_rate_per_minute: float = 6.0
+    pik_burst: int = 3  # столько запросов можно сделать подряд
+    pik_max_queue: int = 20
+    # сколько запрос может ждать токена, с; дольше — отказ
+    pik_watch_max_wait: float = 60.0
+    pik_scheduled_max_wait: float = 300.0
+    pik_manual_max_wait: float = 10.0
+
     database_path: str = "pik_yauza.db"
 
     summary_interval_seconds: int = 14400  # 4 часа
 
+    # архив «сырых» ответов API
+    archive_enabled: bool = True
+    archive_delta: bool = True  # хранить delta к предыдущему ответу вместо полного снимка
+    archive_keyframe_interval: int = 24  # полный снимок не реже чем раз в N ответов
+
+    # быстрый опрос отслеживаемых квартир (/watch)
+    watch_enabled: bool = True
+    # каждый опрос скачивает весь блок (API не отдаёт квартиры по одной), поэтому
+    # по умолчанию он один между обычными обновлениями: +6 запросов в сутки к 6
+    watch_interval_seconds: int = 14400
+    watch_requests_per_hour: float = 0.25  # бюджет запросов к API на быстрый опрос
+    watch_max_per_chat: int = 20
+
+    # выгодные предложения (см. bot.deals)
+    deal_score_threshold: float = -2.0  # робастный z-score цены за м², ниже — «выгодно»
+    deal_min_peers: int = 5  # минимум сопоставимых квартир для оценки
+    deal_floor_band: int = 5  # ширина диапазона этажей для сравнения
+
+    # выгрузка /export и `python -m bot.export` (см. bot.export)
+    export_batch_size: int = 1000  # строк за одно чтение из БД и запись в файл
+
+    # графики /chart (см. bot.charts)
+    chart_history_days: int = 30  # за сколько дней строить ряды
+    chart_cache_items: int = 32  # PNG в памяти
+    chart_cache_dir: str = "chart_cache"  # пусто — кэш только в памяти
+    chart_cache_disk_items: int = 256
+
+    # лента изменений для других систем (см. bot.cdc); события пишутся всегда,
+    # cdc_enabled включает HTTP-сервер на cdc_listen:cdc_port
+    cdc_enabled: bool = False
+    cdc_listen: str = "127.0.0.1"
+    cdc_port: int = 8765
+    cdc_retention_days: int = 30
+    cdc_batch_limit: int = 1000  # событий в одном ответе
+    cdc_max_wait_seconds: float = 60.0  # предел long poll
+
+    # где выполнять CPU-ёмкую работу (декодирование, diff, статистика):
+    # inline — в event loop, thread — пул потоков, process — пул процессов
+    cpu_executor: str = "thread"
+    cpu_workers: int = 2
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
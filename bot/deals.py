@@ -0,0 +1,131 @@
+"""Поиск выгодных предложений: выбросы цены за м² среди сопоставимых квартир.
+
+Каждая свободная квартира сравнивается с «соседями» — свободными квартирами
+той же категории (студия, 1-к.) в том же корпусе и, если их хватает, в том же
+диапазоне этажей. Оценка — робастный z-score по медиане и MAD::
+
+    score = 0.6745 * (ppm - median) / MAD
+
+Отрицательный score — дешевле соседей. Квартиры с `score <= deal_score_threshold`
+считаются выгодными. Оценки хранятся в `deal_scores` и пересчитываются
+инкрементально — только для корпусов, затронутых очередным diff.
+"""
+
+import bisect
+import json
+import statistics
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import aiosqlite
+
+from bot.config import get_settings
+
+# коэффициент, приводящий MAD к стандартному отклонению нормального распределения
+_MAD_SCALE = 0.6745
+
+
+class DealScore(NamedTuple):
+    id: int
+    room_category: str
+    bulk_id: int
+    peer_count: int
+    ppm: float
+    median_ppm: float
+    mad_ppm: float
+    score: float
+    percentile: float
+    is_outlier: bool
+
+
+def _robust_stats(values: List[float]) -> Tuple[float, float]:
+    median = statistics.median(values)
+    mad = statistics.median(abs(v - median) for v in values)
+    # одинаковые цены дают MAD = 0; не даём оценке уйти в бесконечность
+    return median, max(mad, median * 0.005)
+
+
+def compute_scores(
+    rows: Iterable[Tuple[int, str, int, Optional[int], int, Optional[float]]],
+    *,
+    floor_band: int,
+    min_peers: int,
+    threshold: float,
+) -> List[DealScore]:
+    """Посчитать оценки для строк (id, room_category, bulk_id, floor, price, area).
+
+    Статистика считается один раз на группу соседей, а не на каждую квартиру.
+    """
+
+    flats: List[Tuple[int, str, int, Optional[int], float]] = []
+    for fid, category, bulk_id, floor, price, area in rows:
+        if not area or not price:
+            continue
+        flats.append((fid, category, bulk_id, floor, price / area))
+
+    # группы: (категория, корпус) и (категория, корпус, диапазон этажей)
+    groups: Dict[tuple, List[float]] = {}
+    for _, category, bulk_id, floor, ppm in flats:
+        groups.setdefault((category, bulk_id), []).append(ppm)
+        if floor is not None:
+            groups.setdefault((category, bulk_id, (floor - 1) // floor_band), []).append(ppm)
+
+    stats: Dict[tuple, Tuple[List[float], float, float]] = {}
+    for key, values in groups.items():
+        if len(values) >= min_peers:
+            values.sort()
+            stats[key] = (values, *_robust_stats(values))
+
+    scores: List[DealScore] = []
+    for fid, category, bulk_id, floor, ppm in flats:
+        band_key = (category, bulk_id, (floor - 1) // floor_band) if floor is not None else None
+        group = stats.get(band_key) if band_key else None
+        if group is None:
+            group = stats.get((category, bulk_id))
+        if group is None:
+            continue  # мало соседей — сравнивать не с чем
+        values, median, mad = group
+        score = _MAD_SCALE * (ppm - median) / mad
+        percentile = bisect.bisect_right(values, ppm) / len(values)
+        scores.append(
+            DealScore(fid, category, bulk_id, len(values), ppm, median, mad, score, percentile, score <= threshold)
+        )
+    return scores
+
+
+async def refresh_scores(conn: aiosqlite.Connection, bulk_ids: Iterable[int]) -> List[int]:
+    """Пересчитать оценки для корпусов `bulk_ids` (без commit).
+
+    Возвращает id квартир, которые стали выгодными только что.
+    """
+
+    keys = sorted(set(bulk_ids))
+    if not keys:
+        return []
+    settings = get_settings()
+    param = (json.dumps(keys),)
+
+    cursor = await conn.execute(
+        "SELECT id FROM deal_scores WHERE is_outlier = 1 AND bulk_id IN (SELECT value FROM json_each(?))",
+        param,
+    )
+    previous: Set[int] = {row[0] for row in await cursor.fetchall()}
+
+    cursor = await conn.execute(
+        "SELECT id, room_category, bulk_id, floor, price, COALESCE(area, area_project) FROM flats "
+        "WHERE bulk_id IN (SELECT value FROM json_each(?)) AND status = 'free'",
+        param,
+    )
+    scores = compute_scores(
+        await cursor.fetchall(),
+        floor_band=settings.deal_floor_band,
+        min_peers=settings.deal_min_peers,
+        threshold=settings.deal_score_threshold,
+    )
+
+    await conn.execute("DELETE FROM deal_scores WHERE bulk_id IN (SELECT value FROM json_each(?))", param)
+    await conn.executemany(
+        "INSERT INTO deal_scores(id, room_category, bulk_id, peer_count, ppm, median_ppm, mad_ppm, "
+        "score, percentile, is_outlier) VALUES(?,?,?,?,?,?,?,?,?,?)",
+        scores,
+    )
+    return sorted(s.id for s in scores if s.is_outlier and s.id not in previous)
@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import functools
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from bot.config import get_settings
+from bot.models import Flat
+
+T = TypeVar("T")
+
+# Порядок полей при упаковке `Flat` в кортеж для передачи в пул; совпадает
+# с `repository.UPSERT_FIELDS`, поэтому кортежи можно сразу писать в БД
+FLAT_FIELDS: Tuple[str, ...] = tuple(Flat.model_fields)
+# `raw` — последнее поле; без него кортеж совпадает со строкой `get_all_rows`
+_RAW_INDEX = FLAT_FIELDS.index("raw")
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+
+def pack_flats(flats: List[Flat]) -> List[tuple]:
+    """Упаковать квартиры в кортежи: они сериализуются в разы дешевле моделей."""
+
+    return [tuple(getattr(flat, name) for name in FLAT_FIELDS) for flat in flats]
+
+
+def drop_raw(rows: List[tuple]) -> List[tuple]:
+    """Кортежи `pack_flats` без «сырого» JSON — самой тяжёлой их части.
+
+    Для задач пула, которым `raw` не нужен: в режиме ``process`` он иначе
+    сериализовался бы при каждой передаче.
+    """
+
+    return [row[:_RAW_INDEX] for row in rows]
+
+
+def unpack_flats(rows: List[tuple]) -> List[Flat]:
+    """Обратная операция к `pack_flats` (без повторной валидации pydantic).
+
+    Кортежи короче `FLAT_FIELDS` (например, строки БД без `raw`) дополняются
+    значениями по умолчанию.
+    """
+
+    return [Flat.model_construct(**dict(zip(FLAT_FIELDS, row))) for row in rows]
+
+
+class CpuExecutor:
+    """Выполняет CPU-ёмкую работу вне event loop бота.
+
+    Режимы (`cpu_executor` в настройках):
+
+    * ``inline`` — прямо в event loop, как раньше;
+    * ``thread`` — в пуле потоков;
+    * ``process`` — в пуле процессов; функции и аргументы должны быть picklable,
+      поэтому квартиры передаются кортежами (`pack_flats`).
+    """
+
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None):
+        settings = get_settings()
+        self._mode = mode or settings.cpu_executor
+        if self._mode not in EXECUTOR_MODES:
+            raise ValueError(f"Неизвестный режим executor: {self._mode!r}, ожидается один из {EXECUTOR_MODES}")
+        self._workers = workers or settings.cpu_workers
+        self._pool: Optional[concurrent.futures.Executor] = None
+        self._threads: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    def _get_pool(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            if self._mode == "process":
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+            else:
+                self._pool = self._get_threads()
+        return self._pool
+
+    def _get_threads(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="cpu"
+            )
+        return self._threads
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполнить `fn(*args, **kwargs)` в пуле согласно режиму."""
+
+        if self._mode == "inline":
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **kwargs))
+
+    async def run_threaded(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Как `run`, но без пула процессов.
+
+        Для работы, входные данные которой дорого сериализовать (большие dict/list):
+        в режиме ``process`` она выполняется в пуле потоков.
+        """
+
+        if self._mode == "inline":
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_threads(), functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        for pool in {id(p): p for p in (self._pool, self._threads) if p is not None}.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._threads = None
@@ -0,0 +1,238 @@
+"""Выгрузка каталога и истории в CSV или Parquet.
+
+Текущие квартиры читаются из `flats` курсором пачками по
+`export_batch_size` строк, история — из архива ответов (`bot.archive`)
+по одному снимку. В памяти держится одна пачка или один снимок, а
+форматирование и запись в файл идут в пуле потоков (`CpuExecutor`), так
+что event loop бота не блокируется даже на больших выгрузках.
+
+Parquet требует необязательного пакета `pyarrow` (`pip install pyarrow`);
+он импортируется только при выгрузке в этот формат.
+
+Запуск из командной строки::
+
+    python -m bot.export flats.csv
+    python -m bot.export history.parquet --history --since 2024-01-01
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import typing
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from bot.archive import ResponseArchive, Snapshot
+from bot.config import get_settings
+from bot.executor import CpuExecutor
+from bot.models import Flat
+from bot.pik_api_client import parse_flats
+from bot.repository import FLAT_COLUMNS, FlatRepository
+
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_SOURCES = ("flats", "history")
+
+# Колонки выгрузки: каталог — с временем последнего обновления строки,
+# история — по строке на квартиру в каждом архивном ответе
+FLATS_EXPORT_COLUMNS: Tuple[str, ...] = (*FLAT_COLUMNS, "last_seen")
+HISTORY_EXPORT_COLUMNS: Tuple[str, ...] = ("poll_first_seen", "poll_last_seen", *FLAT_COLUMNS)
+
+Progress = Callable[[int], Awaitable[None]]
+
+
+class ExportError(RuntimeError):
+    """Выгрузка невозможна (нет pyarrow, выключен архив, неизвестный формат)."""
+
+
+class ExportResult(NamedTuple):
+    path: str
+    rows: int
+    size: int  # байт
+
+
+def _python_type(column: str) -> type:
+    if column not in Flat.model_fields:
+        return str  # last_seen, poll_*: ISO-8601
+    annotation = Flat.model_fields[column].annotation
+    if typing.get_origin(annotation) is typing.Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    return annotation
+
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: Tuple[str, ...]):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows: List[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str, columns: Tuple[str, ...]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError("Для выгрузки в Parquet нужен пакет pyarrow: pip install pyarrow") from None
+
+        arrow_types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string()}
+        self._pa = pa
+        self._bools = [_python_type(column) is bool for column in columns]
+        self._schema = pa.schema([(column, arrow_types[_python_type(column)]) for column in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        arrays = []
+        for values, field, is_bool in zip(zip(*rows), self._schema, self._bools):
+            if is_bool:  # в SQLite логические значения хранятся как 0/1
+                values = [None if value is None else bool(value) for value in values]
+            arrays.append(self._pa.array(values, type=field.type))
+        # одна row group на пачку: файл читается по частям так же, как писался
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "parquet": _ParquetWriter}
+
+
+def _snapshot_rows(snapshot: Snapshot) -> List[tuple]:
+    """Строки `HISTORY_EXPORT_COLUMNS` для одного архивного ответа."""
+
+    rows: List[tuple] = []
+    for flat in parse_flats(snapshot.items):
+        values = (getattr(flat, name) for name in FLAT_COLUMNS)
+        # как в БД: логические значения — 0/1, чтобы CSV каталога и истории совпадали
+        values = (int(value) if isinstance(value, bool) else value for value in values)
+        rows.append((snapshot.first_seen, snapshot.last_seen, *values))
+    return rows
+
+
+def _write_snapshot(writer: Any, snapshot: Snapshot) -> int:
+    rows = _snapshot_rows(snapshot)
+    writer.write(rows)
+    return len(rows)
+
+
+class Exporter:
+    """Пишет каталог (`flats`) или историю из архива в файл."""
+
+    def __init__(
+        self,
+        repo: FlatRepository,
+        archive: Optional[ResponseArchive] = None,
+        executor: Optional[CpuExecutor] = None,
+    ):
+        self._settings = get_settings()
+        self._repo = repo
+        self._archive = archive
+        self._executor = executor or CpuExecutor()
+
+    async def export(
+        self,
+        source: str,
+        fmt: str,
+        path: str,
+        *,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        progress: Optional[Progress] = None,
+    ) -> ExportResult:
+        """Выгрузить `source` ('flats' или 'history') в `path` в формате `fmt`.
+
+        `progress` вызывается после каждой пачки с числом записанных строк.
+        `since`/`until` (ISO-8601) ограничивают историю по времени опроса.
+        """
+
+        if fmt not in _WRITERS:
+            raise ExportError(f"Неизвестный формат {fmt!r}, ожидается один из {EXPORT_FORMATS}")
+        if source not in EXPORT_SOURCES:
+            raise ExportError(f"Неизвестный источник {source!r}, ожидается один из {EXPORT_SOURCES}")
+        if source == "history" and self._archive is None:
+            raise ExportError("Архив ответов выключен (ARCHIVE_ENABLED=false) — истории нет")
+
+        columns = FLATS_EXPORT_COLUMNS if source == "flats" else HISTORY_EXPORT_COLUMNS
+        # открытие файла (и импорт pyarrow) — тоже не в event loop
+        writer = await self._executor.run_threaded(_WRITERS[fmt], path, columns)
+        rows = 0
+        try:
+            if source == "flats":
+                async for batch in self._repo.iter_rows(self._settings.export_batch_size, columns):
+                    await self._executor.run_threaded(writer.write, batch)
+                    rows += len(batch)
+                    if progress is not None:
+                        await progress(rows)
+            else:
+                async for snapshot in self._archive.iter_snapshots(since, until):
+                    rows += await self._executor.run_threaded(_write_snapshot, writer, snapshot)
+                    if progress is not None:
+                        await progress(rows)
+        finally:
+            await self._executor.run_threaded(writer.close)
+        return ExportResult(path, rows, os.path.getsize(path))
+
+
+def _guess_format(path: str) -> str:
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+async def _run_cli(args: argparse.Namespace) -> ExportResult:
+    settings = get_settings()
+    if args.db:
+        settings.database_path = args.db
+    if args.batch_size:
+        settings.export_batch_size = args.batch_size
+
+    repo = FlatRepository()
+    await repo.init_db()
+    executor = CpuExecutor()
+    exporter = Exporter(repo, ResponseArchive(executor), executor)
+
+    async def report(rows: int) -> None:
+        print(f"\r{rows} строк…", end="", flush=True)
+
+    try:
+        return await exporter.export(
+            "history" if args.history else "flats",
+            args.format or _guess_format(args.output),
+            args.output,
+            since=args.since,
+            until=args.until,
+            progress=report,
+        )
+    finally:
+        executor.shutdown()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Выгрузка квартир и истории цен в CSV/Parquet")
+    parser.add_argument("output", help="файл выгрузки; формат по расширению (.csv, .parquet)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None)
+    parser.add_argument("--history", action="store_true", help="историю из архива ответов вместо каталога")
+    parser.add_argument("--since", default=None, help="история: с этого времени (ISO-8601, UTC)")
+    parser.add_argument("--until", default=None, help="история: по это время (ISO-8601, UTC)")
+    parser.add_argument("--batch-size", type=int, default=None, help="строк за одно чтение из БД")
+    parser.add_argument("--db", default=None, help="файл БД (по умолчанию DATABASE_PATH)")
+    args = parser.parse_args(argv)
+
+    # токен и чат для выгрузки не нужны
+    os.environ.setdefault("telegram_token", "export")
+    os.environ.setdefault("telegram_chat_id", "0")
+
+    try:
+        result = asyncio.run(_run_cli(args))
+    except ExportError as exc:
+        parser.exit(1, f"\n{exc}\n")
+    print(f"\r{result.rows} строк → {result.path} ({result.size / 1024:.0f} КБ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Общий лимит запросов к api.pik.ru на процесс.
+
+Все запросы `PIKApiClient` проходят через один token bucket: `burst`
+запросов можно сделать сразу, дальше — не чаще `rate_per_minute`. Когда
+токенов нет, запросы ждут в очереди по приоритету: быстрый опрос
+отслеживаемых квартир, затем плановое обновление, затем ручное. Запрос,
+который не дождался бы токена за `max_wait` своего приоритета (или не
+помещается в очередь), сразу отклоняется с `BudgetExceeded`.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter, deque
+from enum import IntEnum
+from functools import lru_cache
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from bot.config import get_settings
+
+
+class Priority(IntEnum):
+    """Приоритет запроса: меньше — важнее."""
+
+    WATCH = 0  # быстрый опрос отслеживаемых квартир
+    SCHEDULED = 1  # плановое обновление
+    MANUAL = 2  # /update, /mock и прочие ручные запросы
+
+
+class BudgetExceeded(RuntimeError):
+    """Запрос к API отклонён: лимит исчерпан, а ждать дольше нельзя."""
+
+    def __init__(self, priority: Priority, retry_after: float):
+        super().__init__(f"API request budget exhausted for {priority.name}, retry in {retry_after:.0f} s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class GovernorStats(NamedTuple):
+    rate_per_minute: float
+    burst: int
+    tokens: float  # доступно прямо сейчас
+    used_last_hour: int
+    queued: Dict[str, int]
+    granted: Dict[str, int]
+    rejected: Dict[str, int]
+
+
+class RequestGovernor:
+    """Token bucket с приоритетной очередью ожидающих запросов."""
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int,
+        max_queue: int,
+        max_wait: Dict[Priority, float],
+    ):
+        self._rate = rate_per_minute / 60  # токенов в секунду
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._max_queue = max_queue
+        self._max_wait = max_wait
+        # (приоритет, порядковый номер, future) — heap
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # loop, к которому привязаны таймер и ожидающие (singleton переживает loop)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._granted: Counter = Counter()
+        self._rejected: Counter = Counter()
+        self._history: Deque[float] = deque()  # время выданных токенов за последний час
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _grant(self, priority: Priority) -> None:
+        self._tokens -= 1
+        self._granted[priority] += 1
+        self._history.append(time.monotonic())
+
+    def _queued(self) -> List[Tuple[int, int, asyncio.Future]]:
+        return [w for w in self._waiters if not w[2].done()]
+
+    def _bind_loop(self) -> None:
+        """Забыть таймер и ожидающих прежнего event loop: он закрыт и их не разбудит."""
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._timer = None
+            self._waiters = []
+
+    async def acquire(self, priority: Priority) -> None:
+        """Дождаться разрешения на один запрос или получить `BudgetExceeded`."""
+
+        self._bind_loop()
+        self._refill()
+        if not self._queued() and self._tokens >= 1:
+            self._grant(priority)
+            return
+
+        # оценка: все ожидающие с тем же или более высоким приоритетом пройдут раньше
+        ahead = sum(1 for p, _, _ in self._queued() if p <= priority)
+        wait = (ahead + 1 - self._tokens) / self._rate
+        max_wait = self._max_wait[priority]
+        if len(self._queued()) >= self._max_queue or wait > max_wait:
+            self._rejected[priority] += 1
+            raise BudgetExceeded(priority, wait)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        try:
+            # запросы с более высоким приоритетом могут обогнать — ожидание ограничено
+            await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            self._rejected[priority] += 1
+            raise BudgetExceeded(priority, (len(self._queued()) + 1) / self._rate) from None
+
+    def _schedule(self) -> None:
+        if self._timer is not None or not self._waiters:
+            return
+        delay = max(0.0, (1 - self._tokens) / self._rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # ожидание уже отменено по таймауту
+            self._grant(Priority(priority))
+            future.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+    def stats(self) -> GovernorStats:
+        self._refill()
+        hour_ago = time.monotonic() - 3600
+        while self._history and self._history[0] < hour_ago:
+            self._history.popleft()
+        queued = Counter(Priority(p).name for p, _, _ in self._queued())
+        return GovernorStats(
+            rate_per_minute=self._rate * 60,
+            burst=self._burst,
+            tokens=self._tokens,
+            used_last_hour=len(self._history),
+            queued={p.name: queued[p.name] for p in Priority},
+            granted={p.name: self._granted[p] for p in Priority},
+            rejected={p.name: self._rejected[p] for p in Priority},
+        )
+
+
+@lru_cache(maxsize=1)
+def get_governor() -> RequestGovernor:
+    """Singleton-доступ к лимиту запросов процесса."""
+
+    settings = get_settings()
+    return RequestGovernor(
+        rate_per_minute=settings.pik_rate_per_minute,
+        burst=settings.pik_burst,
+        max_queue=settings.pik_max_queue,
+        max_wait={
+            Priority.WATCH: settings.pik_watch_max_wait,
+            Priority.SCHEDULED: settings.pik_scheduled_max_wait,
+            Priority.MANUAL: settings.pik_manual_max_wait,
+        },
+    )
@@ -0,0 +1,795 @@
+"""Хендлеры команд и сборка `Application`.
+
+Модуль тянет за собой весь стек python-telegram-bot, поэтому `bot.main`
+импортирует его в отдельном потоке параллельно с миграциями БД.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+import asyncio
+import html
+import json
+import datetime
+import logging
+import os
+import tempfile
+import time
+
+from telegram import (
+    BotCommand,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    ReplyKeyboardMarkup,
+    Update,
+)
+from telegram.ext import (
+    Application,
+    BaseUpdateProcessor,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    MessageHandler,
+    filters,
+)
+# Добавим ParseMode для HTML-разметки
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+from bot.cdc import CdcServer
+from bot.charts import ChartError, ChartService
+from bot.config import Settings, get_settings
+from bot.export import ExportError, Exporter
+from bot.governor import BudgetExceeded, Priority, get_governor
+from bot.leader import LeaderElector
+from bot.repository import FlatRepository
+from bot.search import FlatSearch, SearchError
+from bot.services import MonitorService, deal_lines
+from bot.pik_api_client import parse_flats, unwrap_items
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------- command handlers --------------------------
+
+
+aSYNC_DEF = Callable[[Update, ContextTypes.DEFAULT_TYPE], None]
+
+
+async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    keyboard = [
+        ["Студии 🏠", "1-к. 🚪"],
+        ["Статистика 📊", "Обновить сейчас 🔄"],
+        ["Mock 🛠"],  # dev-кнопка
+    ]
+    await update.message.reply_text(
+        "Привет! Я слежу за ценами в ЖК «Яуза Парк». Выберите команду:",
+        reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
+        parse_mode=ParseMode.HTML,
+    )
+
+
+PAGE_SIZE = 10
+
+# категория в callback-данных → заголовок списка
+PAGE_TITLES = {
+    "studio": "Самые дешёвые студии",
+    "one": "Самые дешёвые 1-к.",
+}
+
+
+def _render_page(category: str, flats: list, has_prev: bool, has_next: bool):
+    """Текст страницы и inline-кнопки «назад/вперёд».
+
+    В callback-данных только курсор: категория и (price, id) крайней строки.
+    """
+
+    lines: list[str] = []
+    for flat in flats:
+        line = f"• {flat.price / 1_000_000:.2f} млн · этаж {flat.floor} · {flat.url}"
+        # Статусы отличные от 'free' считаем забронированными и зачёркиваем строку
+        if flat.status != "free":
+            line = f"<s>{line}</s>"
+        lines.append(line)
+
+    buttons: list[InlineKeyboardButton] = []
+    if has_prev:
+        first = flats[0]
+        buttons.append(
+            InlineKeyboardButton("◀️ Дешевле", callback_data=f"pg:{category}:b:{first.price}:{first.id}")
+        )
+    if has_next:
+        last = flats[-1]
+        buttons.append(
+            InlineKeyboardButton("Дороже ▶️", callback_data=f"pg:{category}:a:{last.price}:{last.id}")
+        )
+
+    text = f"{PAGE_TITLES[category]}:\n" + "\n".join(lines)
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def _send_first_page(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str):
+    repo: FlatRepository = context.application.bot_data["repo"]
+    flats, has_next = await repo.select_page(category, limit=PAGE_SIZE)
+    if not flats:
+        await update.message.reply_text("Нет данных. Попробуйте позже.")
+        return
+    text, markup = _render_page(category, flats, has_prev=False, has_next=has_next)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+
+
+async def cmd_studios(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _send_first_page(update, context, "studio")
+
+
+async def cmd_one(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _send_first_page(update, context, "one")
+
+
+async def cb_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание списка по inline-кнопкам (`pg:<категория>:<a|b>:<price>:<id>`)."""
+
+    query = update.callback_query
+    repo: FlatRepository = context.application.bot_data["repo"]
+
+    # данные присылает клиент: кнопка могла остаться от старой версии бота или быть подделана
+    try:
+        _, category, direction, price, flat_id = query.data.split(":")
+        cursor = (int(price), int(flat_id))
+    except (AttributeError, ValueError):
+        category = direction = None
+    if category not in PAGE_TITLES or direction not in ("a", "b"):
+        await query.answer("Список устарел, повторите команду")
+        return
+
+    if direction == "a":
+        flats, has_next = await repo.select_page(category, after=cursor, limit=PAGE_SIZE)
+        has_prev = True
+    else:
+        flats, has_prev = await repo.select_page(category, before=cursor, limit=PAGE_SIZE)
+        has_next = True
+
+    if not flats:
+        # данные успели обновиться, и за курсором ничего не осталось
+        await query.answer("Больше квартир нет")
+        return
+
+    await query.answer()
+    text, markup = _render_page(category, flats, has_prev=has_prev, has_next=has_next)
+    await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+
+
+FIND_HELP = (
+    "Использование: <code>/find условия</code>\n"
+    "Например: <code>/find 1-к. этаж 10-20 площадь>=38 цена<=12м свободные секция 22414</code>\n\n"
+    "Условия: студия, 1-к., 2-к., свободные, бронь, цена, площадь, этаж, секция, корпус, "
+    "планировка, отделка да/нет. Диапазон — через «-» или «..»."
+)
+
+
+async def cmd_find(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск по фильтру (см. `bot.search`)."""
+
+    search: FlatSearch = context.application.bot_data["search"]
+    text = " ".join(context.args or [])
+    if not text:
+        await update.message.reply_text(FIND_HELP, parse_mode=ParseMode.HTML)
+        return
+
+    try:
+        flats, has_more = await search.find(text)
+    except SearchError as exc:
+        await update.message.reply_text(f"⚠️ {html.escape(str(exc))}", parse_mode=ParseMode.HTML)
+        return
+
+    if not flats:
+        await update.message.reply_text("Ничего не найдено.")
+        return
+
+    lines: list[str] = []
+    for flat in flats:
+        line = f"• {flat.price / 1_000_000:.2f} млн · {flat.area} м² · этаж {flat.floor} · {flat.url}"
+        if flat.status != "free":
+            line = f"<s>{line}</s>"
+        lines.append(line)
+    if has_more:
+        lines.append(f"\nПоказаны первые {len(flats)} — уточните фильтр.")
+
+    await update.message.reply_text(
+        "🔎 Найдено:\n" + "\n".join(lines), parse_mode=ParseMode.HTML
+    )
+
+
+# аргумент /bulks → уровень агрегатов и подпись группы
+AGGREGATE_LEVELS = {
+    "": ("bulk", "🏢 Корпус"),
+    "секции": ("section", "🧱 Секция"),
+    "section": ("section", "🧱 Секция"),
+    "планировки": ("layout", "📐 Планировка"),
+    "layout": ("layout", "📐 Планировка"),
+}
+
+
+async def cmd_bulks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сводка по корпусам (секциям, планировкам) из материализованных агрегатов."""
+
+    repo: FlatRepository = context.application.bot_data["repo"]
+    arg = (context.args[0].lower() if context.args else "")
+    if arg not in AGGREGATE_LEVELS:
+        await update.message.reply_text("Использование: /bulks [секции|планировки]")
+        return
+    level, label = AGGREGATE_LEVELS[arg]
+    key = f"{level}_id"
+
+    rows = await repo.get_aggregates(level)
+    if not rows:
+        await update.message.reply_text("Нет данных. Попробуйте позже.")
+        return
+
+    lines: list[str] = []
+    for row in rows:
+        name = html.escape(row["layout_name"]) if level == "layout" and row["layout_name"] else row[key]
+        line = f"{label} {name}: <b>{row['free_count']}</b> своб. (бронь {row['reserved_count']})"
+        if row["min_price"] is not None:
+            spread = (row["max_price"] - row["min_price"]) / 1_000_000
+            line += f" · от {row['min_price'] / 1_000_000:.2f} млн · разброс {spread:.2f} млн"
+        if row["min_ppm"] is not None:
+            line += f" · от {row['min_ppm'] / 1000:.0f} тыс/м² (ср. {row['avg_ppm'] / 1000:.0f})"
+        lines.append(line)
+
+    await _send_long_text(context.bot, update.effective_chat.id, "\n".join(lines))
+
+
+async def cmd_best(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Лучшие по цене за м² относительно сопоставимых квартир (см. `bot.deals`)."""
+
+    repo: FlatRepository = context.application.bot_data["repo"]
+    arg = context.args[0].lower() if context.args else ""
+    category = {"студии": "studio", "studio": "studio", "1-к": "one", "1-к.": "one", "one": "one"}.get(arg)
+
+    deals = await repo.get_deals(category=category, limit=10)
+    if not deals:
+        await update.message.reply_text("Нет данных. Попробуйте позже.")
+        return
+
+    await update.message.reply_text(
+        "💎 <b>Лучшая цена за м² среди сопоставимых</b>\n" + "\n".join(deal_lines(deals)),
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True,
+    )
+
+
+def _watch_interval(settings: Settings) -> float:
+    """Период быстрого опроса: растягивается, чтобы уложиться в бюджет (1 запрос за опрос)."""
+
+    return max(settings.watch_interval_seconds, 3600 / max(settings.watch_requests_per_hour, 0.01))
+
+
+def _parse_flat_id(context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+    """id квартиры из аргумента команды: `123`, `#123` или ссылка на квартиру."""
+
+    if not context.args:
+        return None
+    tail = context.args[0].rstrip("/").rsplit("/", 1)[-1].lstrip("#")
+    return int(tail) if tail.isdigit() else None
+
+
+async def cmd_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Добавить квартиру в список быстрого отслеживания."""
+
+    repo: FlatRepository = context.application.bot_data["repo"]
+    settings = get_settings()
+    flat_id = _parse_flat_id(context)
+    if flat_id is None:
+        await update.message.reply_text("Использование: /watch <id квартиры>")
+        return
+
+    chat_id = update.effective_chat.id
+    if await repo.count_watched(chat_id) >= settings.watch_max_per_chat:
+        await update.message.reply_text(
+            f"Можно отслеживать не больше {settings.watch_max_per_chat} квартир. Уберите лишние: /unwatch <id>"
+        )
+        return
+
+    flat = await repo.add_watch(chat_id, flat_id)
+    if flat is None:
+        await update.message.reply_text(f"Квартира #{flat_id} не найдена среди студий и 1-к.")
+        return
+
+    # квартиру проверяют и быстрый опрос, и обычное обновление
+    minutes = round(min(_watch_interval(settings), settings.summary_interval_seconds) / 60)
+    await update.message.reply_text(
+        f"👀 Слежу за квартирой #{flat.id}: {flat.price / 1_000_000:.2f} млн, этаж {flat.floor}, {flat.status}.\n"
+        f"Об изменении цены или статуса сообщу в течение ~{minutes} мин.",
+        disable_web_page_preview=True,
+    )
+
+
+async def cmd_unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    repo: FlatRepository = context.application.bot_data["repo"]
+    flat_id = _parse_flat_id(context)
+    if flat_id is None:
+        await update.message.reply_text("Использование: /unwatch <id квартиры>")
+        return
+
+    if await repo.remove_watch(update.effective_chat.id, flat_id):
+        await update.message.reply_text(f"Больше не слежу за квартирой #{flat_id}.")
+    else:
+        await update.message.reply_text(f"Квартира #{flat_id} не отслеживается.")
+
+
+async def cmd_watchlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    repo: FlatRepository = context.application.bot_data["repo"]
+    watched = await repo.get_watchlist(update.effective_chat.id)
+    if not watched:
+        await update.message.reply_text("Список отслеживания пуст. Добавьте квартиру: /watch <id>")
+        return
+
+    lines: list[str] = []
+    for flat_id, flat in watched:
+        if flat is None:
+            lines.append(f"• <s>#{flat_id}</s> — нет в продаже")
+            continue
+        line = f"• #{flat.id} · {flat.price / 1_000_000:.2f} млн · этаж {flat.floor} · {flat.status} · {flat.url}"
+        lines.append(line)
+    await update.message.reply_text(
+        "👀 <b>Отслеживаемые квартиры</b>\n" + "\n".join(lines),
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True,
+    )
+
+
+EXPORT_HELP = (
+    "Использование: /export [история] [csv|parquet]\n"
+    "Без аргументов — текущий каталог в CSV; «история» — все архивные ответы API."
+)
+EXPORT_DOCUMENT_LIMIT = 50 * 1024 * 1024  # больше Bot API не принимает
+EXPORT_PROGRESS_INTERVAL = 2.0  # не чаще, с: правка сообщения тоже запрос к Bot API
+
+
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузить каталог или историю цен файлом (см. `bot.export`)."""
+
+    exporter: Exporter = context.application.bot_data["exporter"]
+    args = {arg.lower() for arg in context.args or []}
+    if args - {"история", "history", "csv", "parquet"}:
+        await update.message.reply_text(EXPORT_HELP)
+        return
+    source = "history" if args & {"история", "history"} else "flats"
+    fmt = "parquet" if "parquet" in args else "csv"
+
+    status = await update.message.reply_text("⏳ Готовлю выгрузку…")
+    last_report = time.monotonic()
+
+    async def progress(rows: int) -> None:
+        nonlocal last_report
+        if time.monotonic() - last_report < EXPORT_PROGRESS_INTERVAL:
+            return
+        last_report = time.monotonic()
+        try:
+            await status.edit_text(f"⏳ Выгружено строк: {rows}…")
+        except TelegramError:
+            pass  # прогресс не важнее самой выгрузки
+
+    filename = f"pik-{source}-{datetime.datetime.now():%Y%m%d-%H%M}.{fmt}"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, filename)
+        try:
+            result = await exporter.export(source, fmt, path, progress=progress)
+        except ExportError as exc:
+            await status.edit_text(f"⚠️ {exc}")
+            return
+        if result.size > EXPORT_DOCUMENT_LIMIT:
+            await status.edit_text(
+                f"⚠️ Файл занимает {result.size / 1024 / 1024:.0f} МБ — Telegram принимает до 50 МБ. "
+                "Выгрузите его на сервере: python -m bot.export"
+            )
+            return
+        with open(path, "rb") as document:
+            await context.bot.send_document(
+                update.effective_chat.id,
+                document,
+                filename=filename,
+                caption=f"Строк: {result.rows}",
+            )
+    await status.edit_text(f"✅ Выгружено строк: {result.rows}")
+
+
+FOLLOWER_TEXT = "⏸ Этот экземпляр бота резервный: данные обновляет ведущий. Попробуйте позже."
+
+
+def _is_follower(context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Экземпляр не держит аренду ведущего и не должен опрашивать API и писать в БД."""
+
+    elector: Optional[LeaderElector] = context.application.bot_data.get("elector")
+    return elector is not None and not elector.is_leader
+
+
+async def cmd_mockupdate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отправляет замоканное сообщение-обновление из JSON-файла."""
+    if _is_follower(context):
+        await update.message.reply_text(FOLLOWER_TEXT)
+        return
+
+    MOCK_FILE_PATH = "mock_data.json"
+    try:
+        with open(MOCK_FILE_PATH, "r", encoding="utf-8") as f:
+            raw_data = json.load(f)
+    except FileNotFoundError:
+        await update.message.reply_text(
+            f"Не удалось найти файл {MOCK_FILE_PATH}. Положите mock JSON рядом с ботом."
+        )
+        return
+    except json.JSONDecodeError:
+        await update.message.reply_text(
+            f"Файл {MOCK_FILE_PATH} содержит некорректный JSON."
+        )
+        return
+
+    # raw_data должен быть списком квартир как из API
+    if not isinstance(raw_data, list):
+        await update.message.reply_text(
+            "Ожидался JSON-массив с объектами квартир, как в ответе v1/flat."
+        )
+        return
+
+    # Используем ту же маппинг-логику, что и в PIKApiClient
+    flats = parse_flats(unwrap_items(raw_data))
+
+    monitor: MonitorService = context.application.bot_data["monitor"]
+    summary = await monitor.update_from_list(flats)
+    await _send_long_text(context.bot, update.effective_chat.id, summary)
+
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    repo: FlatRepository = context.application.bot_data["repo"]  # только чтобы TypeChecker не ругался
+    monitor: MonitorService = context.application.bot_data["monitor"]
+
+    stats = await monitor.stats_text(include_links=True)
+    
+    # Добавляем время следующего обновления
+    next_update_time = _get_next_update_time(context)
+    stats += f"\n\n⏰ Следующее автообновление: {next_update_time}"
+    
+    await _send_long_text(context.bot, update.effective_chat.id, stats)
+
+
+# --------------------------- jobs --------------------------------------
+
+
+TELEGRAM_LIMIT = 4096
+
+async def _send_long_text(bot, chat_id: Union[str, int], text: str) -> None:
+    """Отправить длинный текст несколькими сообщениями, если превышает лимит Telegram."""
+    if len(text) <= TELEGRAM_LIMIT:
+        await bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.HTML)
+        return
+
+    chunk: list[str] = []
+    current_len = 0
+    for line in text.split("\n"):
+        # +1 учитывает символ новой строки при склейке
+        if current_len + len(line) + 1 > TELEGRAM_LIMIT:
+            await bot.send_message(chat_id=chat_id, text="\n".join(chunk), parse_mode=ParseMode.HTML)
+            chunk = [line]
+            current_len = len(line) + 1
+        else:
+            chunk.append(line)
+            current_len += len(line) + 1
+
+    if chunk:
+        await bot.send_message(chat_id=chat_id, text="\n".join(chunk), parse_mode=ParseMode.HTML)
+
+
+def _get_next_update_time(context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Получить время следующего автообновления."""
+    settings = get_settings()
+    if context.job_queue is None:
+        return "неизвестно"
+    current_jobs = context.job_queue.get_jobs_by_name("hourly_update")
+    
+    if current_jobs:
+        next_run = current_jobs[0].next_t
+        if next_run:
+            # Конвертируем в московское время (UTC+3)
+            moscow_time = next_run + datetime.timedelta(hours=3)
+            return moscow_time.strftime("%H:%M")
+    
+    return "неизвестно"
+
+
+async def cmd_update_now(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ручное обновление данных с отменой и пересозданием автообновления."""
+    monitor: MonitorService = context.application.bot_data["monitor"]
+    settings = get_settings()
+    if _is_follower(context):
+        await update.message.reply_text(FOLLOWER_TEXT)
+        return
+    
+    # Выполняем обновление; ручные запросы к API — последние в очереди лимита
+    try:
+        summary = await monitor.update_from_api(priority=Priority.MANUAL)
+    except BudgetExceeded as exc:
+        await update.message.reply_text(
+            f"⏳ Лимит запросов к API ПИК исчерпан, попробуйте через {exc.retry_after:.0f} с. Подробнее: /limits"
+        )
+        return
+    
+    # Отменяем текущие задачи автообновления (планировщика нет, если бот
+    # собран с schedule=False или без apscheduler) и создаём новую
+    job_queue = context.job_queue
+    if job_queue is not None:
+        for job in job_queue.get_jobs_by_name("hourly_update"):
+            job.schedule_removal()
+    if job_queue is not None:
+        job_queue.run_repeating(
+            hourly_job,
+            interval=settings.summary_interval_seconds,
+            first=settings.summary_interval_seconds,
+            data={"monitor": monitor},
+            name="hourly_update"
+        )
+    
+    # Добавляем время следующего обновления
+    next_update_time = _get_next_update_time(context)
+    summary += f"\n\n🔄 <b>Ручное обновление выполнено</b>\n⏰ Следующее автообновление: {next_update_time}"
+    
+    await _send_long_text(context.bot, update.effective_chat.id, summary)
+    await _send_watch_notes(context.bot, monitor.take_watch_notes())
+
+
+async def cmd_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """График цен: минимальные цены студий и 1-к. или `/chart <id>` — одна квартира."""
+
+    charts: ChartService = context.application.bot_data["charts"]
+    flat_id = _parse_flat_id(context)
+    if context.args and flat_id is None:
+        await update.message.reply_text("Использование: /chart [id квартиры]")
+        return
+
+    try:
+        chart = await (charts.market() if flat_id is None else charts.flat(flat_id))
+    except ChartError as exc:
+        await update.message.reply_text(f"⚠️ {exc}")
+        return
+
+    caption = "📈 Минимальные цены свободных квартир" if flat_id is None else f"📈 Цена квартиры #{flat_id}"
+    message = await context.bot.send_photo(
+        update.effective_chat.id, chart.file_id or chart.png, caption=caption
+    )
+    if chart.file_id is None and message.photo:
+        # следующие запросы до нового опроса уйдут без загрузки картинки
+        charts.remember_file_id(chart.key, message.photo[-1].file_id)
+
+
+async def cmd_limits(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Состояние общего лимита запросов к API ПИК (см. `bot.governor`)."""
+
+    stats = get_governor().stats()
+    names = {"WATCH": "отслеживание", "SCHEDULED": "по расписанию", "MANUAL": "ручные"}
+    lines = [
+        "🚦 <b>Лимит запросов к API ПИК</b>",
+        f"• {stats.rate_per_minute:g} в минуту, подряд до {stats.burst}; доступно сейчас: {stats.tokens:.1f}",
+        f"• за последний час: {stats.used_last_hour} из {stats.rate_per_minute * 60:g}",
+    ]
+    for key, name in names.items():
+        lines.append(
+            f"• {name}: выполнено {stats.granted[key]}, в очереди {stats.queued[key]}, отклонено {stats.rejected[key]}"
+        )
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+
+async def hourly_job(context: ContextTypes.DEFAULT_TYPE):
+    monitor: MonitorService = context.job.data["monitor"]
+    settings = get_settings()
+    # задача запланирована на всех экземплярах, но опрашивает API только ведущий
+    if _is_follower(context):
+        return
+    try:
+        summary = await monitor.update_from_api()
+    except BudgetExceeded as exc:
+        # лимит занят командами пользователей — пропускаем запуск до следующего
+        logger.warning("Hourly update skipped: API budget exhausted, retry in %.0f s", exc.retry_after)
+        return
+    
+    # Добавляем время следующего обновления
+    next_update_time = _get_next_update_time(context)
+    summary += f"\n\n⏰ Следующее автообновление: {next_update_time}"
+    
+    await _send_long_text(context.bot, settings.telegram_chat_id, summary)
+    await _send_watch_notes(context.bot, monitor.take_watch_notes())
+
+
+async def _send_watch_notes(bot, notes: Dict[int, List[str]]) -> None:
+    for chat_id, lines in notes.items():
+        await _send_long_text(bot, chat_id, "👀 <b>Изменения в отслеживаемых квартирах</b>\n" + "\n".join(lines))
+
+
+async def watch_job(context: ContextTypes.DEFAULT_TYPE):
+    """Быстрый опрос отслеживаемых квартир (`/watch`)."""
+
+    monitor: MonitorService = context.job.data["monitor"]
+    if _is_follower(context):
+        return
+    await _send_watch_notes(context.bot, monitor.take_watch_notes())
+    try:
+        notes = await monitor.update_watched()
+    except BudgetExceeded as exc:
+        logger.warning("Watch poll skipped: API budget exhausted, retry in %.0f s", exc.retry_after)
+        return
+    await _send_watch_notes(context.bot, notes)
+
+
+# --------------------------- application -------------------------------
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обрабатывает обновления параллельно, но по порядку внутри одного чата.
+
+    Одновременно выполняются не более `max_workers` обработчиков, так что долгий
+    `/update` одного пользователя не задерживает команды остальных. Обновление,
+    ждущее предыдущее из своего чата, слот не занимает: иначе один «шумный»
+    чат мог бы занять их все.
+    """
+
+    # сколько обновлений может ждать своей очереди (ограничение базового класса)
+    MAX_PENDING = 1024
+
+    def __init__(self, max_workers: int):
+        super().__init__(self.MAX_PENDING)
+        self._workers = asyncio.Semaphore(max_workers)
+        # чат → (замок, число обновлений этого чата в обработке или ожидании)
+        self._chats: Dict[int, list] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        entry = self._chats.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+# список доступных команд с описанием и эмодзи
+BOT_COMMANDS = [
+    BotCommand("start", "ℹ️ помощь"),
+    BotCommand("studios", "🏠 дешёвые студии"),
+    BotCommand("one", "🚪 дешёвые 1-к."),
+    BotCommand("find", "🔎 поиск по фильтру"),
+    BotCommand("bulks", "🏢 сводка по корпусам"),
+    BotCommand("best", "💎 выгодные по цене за м²"),
+    BotCommand("watch", "👀 следить за квартирой"),
+    BotCommand("unwatch", "🙈 перестать следить"),
+    BotCommand("watchlist", "📋 отслеживаемые квартиры"),
+    BotCommand("stats", "📊 статистика"),
+    BotCommand("chart", "📈 график цен"),
+    BotCommand("export", "📤 выгрузка в CSV/Parquet"),
+    BotCommand("update", "🔄 обновить сейчас"),
+    BotCommand("limits", "🚦 лимит запросов к API"),
+    BotCommand("mock", "🛠 mock-обновление (dev)"),
+]
+
+
+def build_application(
+    settings: Settings,
+    repo: FlatRepository,
+    monitor: MonitorService,
+    *,
+    schedule: bool = True,
+    elector: Optional[LeaderElector] = None,
+) -> Application:
+    """Собрать `Application` со всеми хендлерами и планировщиком.
+
+    `schedule=False` — без автообновления (нагрузочный тест, см. `bot.loadtest`).
+    С `elector` обновляет данные только ведущий экземпляр (см. `bot.leader`).
+    С `settings.cdc_enabled` вместе с ботом работает HTTP-лента изменений (`bot.cdc`).
+    """
+
+    cdc_server = None
+    if settings.cdc_enabled:
+        cdc_server = CdcServer(
+            repo,
+            settings.cdc_listen,
+            settings.cdc_port,
+            batch_limit=settings.cdc_batch_limit,
+            max_wait=settings.cdc_max_wait_seconds,
+        )
+
+    async def on_init(_: Application) -> None:
+        if elector is not None:
+            elector.start()
+        if cdc_server is not None:
+            await cdc_server.start()
+
+    async def on_shutdown(_: Application) -> None:
+        if cdc_server is not None:
+            await cdc_server.stop()
+        if elector is not None:
+            await elector.stop()
+        await repo.close()
+
+    builder = (
+        Application.builder()
+        .token(settings.telegram_token)
+        .base_url(settings.telegram_api_url)
+        .post_init(on_init)
+        .post_shutdown(on_shutdown)
+    )
+    if settings.concurrent_updates > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(settings.concurrent_updates))
+    app = builder.build()
+
+    # сохраняем repo и monitor для хендлеров
+    app.bot_data["repo"] = repo
+    app.bot_data["monitor"] = monitor
+    app.bot_data["search"] = FlatSearch(repo)
+    app.bot_data["elector"] = elector
+    app.bot_data["exporter"] = Exporter(repo, monitor.archive, monitor.executor)
+    app.bot_data["charts"] = ChartService(monitor.archive, monitor.executor)
+
+    # Регистрация команд
+    app.add_handler(CommandHandler("start", cmd_start))
+    app.add_handler(CommandHandler("studios", cmd_studios))
+    app.add_handler(CommandHandler("one", cmd_one))
+    app.add_handler(CommandHandler("mock", cmd_mockupdate))
+    app.add_handler(CommandHandler("find", cmd_find))
+    app.add_handler(CommandHandler("bulks", cmd_bulks))
+    app.add_handler(CommandHandler("best", cmd_best))
+    app.add_handler(CommandHandler("watch", cmd_watch))
+    app.add_handler(CommandHandler("unwatch", cmd_unwatch))
+    app.add_handler(CommandHandler("watchlist", cmd_watchlist))
+    app.add_handler(CommandHandler("stats", cmd_stats))
+    app.add_handler(CommandHandler("update", cmd_update_now))
+    app.add_handler(CommandHandler("limits", cmd_limits))
+    app.add_handler(CommandHandler("chart", cmd_chart))
+    app.add_handler(CommandHandler("export", cmd_export))
+    app.add_handler(CallbackQueryHandler(cb_page, pattern=r"^pg:"))
+
+    # Обработчики для кнопок-клавиатуры (тексты без слеша)
+    button_map = {
+        "Студии 🏠": cmd_studios,
+        "1-к. 🚪": cmd_one,
+        "Статистика 📊": cmd_stats,
+        "Обновить сейчас 🔄": cmd_update_now,
+        "Mock 🛠": cmd_mockupdate,
+    }
+
+    for text, handler in button_map.items():
+        app.add_handler(MessageHandler(filters.Regex(f"^{text}$"), handler))
+
+    # Планировщик
+    if schedule:
+        app.job_queue.run_repeating(
+            hourly_job,
+            interval=settings.summary_interval_seconds,
+            # first=settings.summary_interval_seconds,
+            first=5,
+            data={"monitor": monitor},
+            name="hourly_update"
+        )
+    if schedule and settings.watch_enabled:
+        watch_interval = _watch_interval(settings)
+        app.job_queue.run_repeating(
+            watch_job,
+            interval=watch_interval,
+            # посередине между обычными обновлениями
+            first=watch_interval / 2,
+            data={"monitor": monitor},
+            name="watch_update",
+        )
+
+    return app
@@ -0,0 +1,172 @@
+"""Выбор ведущего экземпляра бота через аренду (lease) в общей SQLite.
+
+Несколько экземпляров `bot.main` работают с одним файлом БД. Ведущий
+держит строку в `leader_lease` и продлевает её каждые `heartbeat` секунд;
+только он опрашивает API и пишет в `flats`. Остальные отвечают на команды
+чтения и раз в `heartbeat` пытаются перехватить аренду — это удаётся, как
+только она истекла (ведущий упал) или освобождена (ведущий остановлен).
+
+Время аренды — `time.time()`, поэтому экземпляры должны работать на одной
+машине или с синхронизированными часами (общий файл SQLite по сети всё
+равно не рекомендуется).
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import aiosqlite
+
+from bot.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[], Awaitable[None]]
+
+# Захват или продление одной командой: строка обновляется, только если аренда
+# наша или уже истекла. term растёт при каждой смене ведущего.
+_ACQUIRE_SQL = """
+INSERT INTO leader_lease(name, holder, term, acquired_at, expires_at) VALUES(?, ?, 1, ?, ?)
+ON CONFLICT(name) DO UPDATE SET
+    holder = excluded.holder,
+    term = CASE WHEN leader_lease.holder = excluded.holder THEN leader_lease.term ELSE leader_lease.term + 1 END,
+    acquired_at = CASE WHEN leader_lease.holder = excluded.holder
+                       THEN leader_lease.acquired_at ELSE excluded.acquired_at END,
+    expires_at = excluded.expires_at
+WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at <= excluded.acquired_at
+"""
+
+
+class NotLeaderError(RuntimeError):
+    """Запись от экземпляра, который не держит аренду."""
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaderElector:
+    """Держит или ждёт аренду `name` в БД из настроек.
+
+    `is_leader` можно проверять в любой момент: он становится ложным сам,
+    если продлить аренду вовремя не удалось (например, event loop был занят).
+    """
+
+    def __init__(
+        self,
+        name: str = "poller",
+        holder: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        heartbeat_seconds: Optional[float] = None,
+    ):
+        self._settings = get_settings()
+        self.name = name
+        self.holder = holder or self._settings.instance_id or default_instance_id()
+        self._lease = lease_seconds or self._settings.leader_lease_seconds
+        self._heartbeat = heartbeat_seconds or self._settings.leader_heartbeat_seconds
+        self._leader = False
+        self._valid_until = 0.0  # time.monotonic(), до которого аренда точно наша
+        self.term = 0
+        self._on_elected: List[Callback] = []
+        self._on_demoted: List[Callback] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader and time.monotonic() < self._valid_until
+
+    def on_elected(self, callback: Callback) -> None:
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: Callback) -> None:
+        self._on_demoted.append(callback)
+
+    async def try_acquire(self) -> bool:
+        """Захватить или продлить аренду; вернуть, наша ли она теперь."""
+
+        started = time.monotonic()
+        now = time.time()
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await conn.execute(_ACQUIRE_SQL, (self.name, self.holder, now, now + self._lease))
+                cursor = await conn.execute(
+                    "SELECT holder, term FROM leader_lease WHERE name = ?", (self.name,)
+                )
+                holder, term = await cursor.fetchone()
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
+        if holder != self.holder:
+            return False
+        self.term = term
+        # отсчёт от момента до запроса: ожидание блокировки съедает часть аренды
+        self._valid_until = started + self._lease
+        return True
+
+    async def check(self, conn: aiosqlite.Connection) -> None:
+        """Проверить внутри транзакции записи, что аренда всё ещё наша."""
+
+        cursor = await conn.execute(
+            "SELECT 1 FROM leader_lease WHERE name = ? AND holder = ? AND expires_at > ?",
+            (self.name, self.holder, time.time()),
+        )
+        if await cursor.fetchone() is None:
+            raise NotLeaderError(f"{self.holder} не держит аренду {self.name!r}")
+
+    async def release(self) -> None:
+        """Освободить аренду, чтобы другой экземпляр перехватил её сразу."""
+
+        was_leader = self._leader
+        self._leader = False
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            await conn.execute(
+                "DELETE FROM leader_lease WHERE name = ? AND holder = ?", (self.name, self.holder)
+            )
+            await conn.commit()
+        if was_leader:
+            logger.info("%s released leadership (term %s)", self.holder, self.term)
+
+    async def _set_leader(self, leader: bool) -> None:
+        if leader == self._leader:
+            return
+        self._leader = leader
+        if leader:
+            logger.info("%s became leader (term %s)", self.holder, self.term)
+            callbacks = self._on_elected
+        else:
+            logger.warning("%s lost leadership", self.holder)
+            callbacks = self._on_demoted
+        for callback in callbacks:
+            await callback()
+
+    async def run(self) -> None:
+        """Цикл heartbeat: продлевать аренду или ждать её освобождения."""
+
+        while True:
+            try:
+                leader = await self.try_acquire()
+            except (aiosqlite.Error, OSError) as exc:
+                logger.warning("Lease heartbeat failed: %s", exc)
+                leader = self._leader  # аренда могла ещё не истечь
+            await self._set_leader(leader and time.monotonic() < self._valid_until)
+            await asyncio.sleep(self._heartbeat)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.release()
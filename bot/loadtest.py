@@ -0,0 +1,545 @@
+"""Нагрузочный тест хендлеров без Telegram и api.pik.ru.
+
+`FakeBotApi` — локальный HTTP-сервер, который отвечает на методы Bot API
+(`getUpdates`, `sendMessage`, `editMessageText`, `answerCallbackQuery`, ...)
+и на `/v1/flat` вместо api.pik.ru. Бот собирается обычным
+`handlers.build_application`, только `telegram_api_url` и `pik_base_url`
+указывают на этот сервер. Генератор подаёт в `getUpdates` синтетические
+обновления с заданной частотой и замеряет время до ответа.
+
+Запуск::
+
+    python -m bot.loadtest --rate 50 --duration 30 --users 100 --burst 5 --burst-every 10
+    python -m bot.loadtest --webhook --concurrent-updates 1
+
+С `--webhook` бот вызывает у фейкового API `setWebhook`, и тот присылает
+обновления POST-запросами на `bot.webhook.WebhookServer`.
+
+Задержка команды — время от появления обновления в `getUpdates` до первого
+`sendMessage` в тот же чат (ответы в чат сопоставляются с командами по
+очереди), задержка нажатия inline-кнопки — до `answerCallbackQuery`.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from bot.config import get_settings
+from bot.executor import CpuExecutor
+from bot.governor import get_governor
+from bot.repository import FlatRepository
+from bot.services import MonitorService
+
+if TYPE_CHECKING:
+    import aiohttp
+    from aiohttp import web
+
+BOT_ID = 1_000_000
+
+# сценарий → (тип обновления, текст команды или callback-данные)
+SCENARIOS: Dict[str, Tuple[str, str]] = {
+    "studios": ("text", "/studios"),
+    "one": ("text", "/one"),
+    "find": ("text", "/find 1-к. этаж 10-20"),
+    "bulks": ("text", "/bulks"),
+    "best": ("text", "/best"),
+    "stats": ("text", "/stats"),
+    "studios_button": ("text", "Студии 🏠"),
+    "stats_button": ("text", "Статистика 📊"),
+    "page": ("callback", "pg:studio:a:0:0"),
+    "update": ("text", "/update"),
+}
+
+# доли сценариев в основном потоке; /update идёт отдельными пачками
+DEFAULT_MIX: Dict[str, float] = {
+    "studios": 3,
+    "one": 3,
+    "studios_button": 2,
+    "page": 3,
+    "find": 2,
+    "bulks": 1,
+    "best": 1,
+    "stats_button": 1,
+}
+
+
+class LoadConfig(NamedTuple):
+    rate: float = 20.0  # обновлений в секунду в основном потоке
+    duration: float = 10.0  # длительность подачи, с
+    users: int = 50  # число чатов, между которыми распределяются обновления
+    mix: Dict[str, float] = DEFAULT_MIX
+    burst: int = 0  # сколько /update подать разом (0 — без пачек)
+    burst_every: float = 5.0  # интервал между пачками /update, с
+    drain_timeout: float = 30.0  # сколько ждать ответов после окончания подачи, с
+    database_path: Optional[str] = None  # по умолчанию — временный файл
+    webhook: bool = False  # доставлять обновления через webhook, а не getUpdates
+    concurrent_updates: Optional[int] = None  # по умолчанию — из настроек
+    pik_rate_per_minute: Optional[float] = None  # лимит запросов к /v1/flat; по умолчанию — из настроек
+    seed: int = 0
+
+
+class ScenarioStats(NamedTuple):
+    name: str
+    sent: int
+    answered: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+class LoadReport(NamedTuple):
+    elapsed: float
+    sent: int
+    answered: int
+    throughput: float  # ответов в секунду
+    scenarios: List[ScenarioStats]
+    api_calls: Dict[str, int]
+
+    def format(self) -> str:
+        lines = [
+            f"{'сценарий':<16}{'отпр.':>7}{'отв.':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (мс)"
+        ]
+        for s in self.scenarios:
+            lines.append(
+                f"{s.name:<16}{s.sent:>7}{s.answered:>7}"
+                f"{s.p50 * 1000:>9.1f}{s.p90 * 1000:>9.1f}{s.p99 * 1000:>9.1f}{s.max * 1000:>9.1f}"
+            )
+        lines.append(
+            f"\nВсего: {self.sent} обновлений, {self.answered} ответов за {self.elapsed:.1f} с "
+            f"({self.throughput:.1f} ответов/с)"
+        )
+        lines.append("Вызовы API: " + ", ".join(f"{k}={v}" for k, v in sorted(self.api_calls.items())))
+        return "\n".join(lines)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга (`values` отсортирован)."""
+
+    if not values:
+        return 0.0
+    rank = max(1, min(len(values), round(q * len(values))))
+    return values[rank - 1]
+
+
+class FakeBotApi:
+    """Локальная замена Bot API и `/v1/flat` для нагрузочного теста."""
+
+    def __init__(self, flats: List[Dict[str, Any]]):
+        self._flats = flats
+        self._updates: List[Dict[str, Any]] = []
+        self._has_updates = asyncio.Event()
+        self._update_id = 0
+        self._message_id = 0
+        # чат → очередь (сценарий, время подачи) команд без ответа
+        self._pending: Dict[int, Deque[Tuple[str, float]]] = defaultdict(deque)
+        # id callback-запроса → (сценарий, время подачи)
+        self._pending_callbacks: Dict[str, Tuple[str, float]] = {}
+        self.sent: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.calls: Counter = Counter()
+        self.last_reply = 0.0
+        # адрес и секрет из setWebhook; пока они заданы, getUpdates пуст
+        self._webhook: Optional[Tuple[str, str]] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._deliveries: Set[asyncio.Task] = set()
+
+    @property
+    def outstanding(self) -> int:
+        return sum(len(q) for q in self._pending.values()) + len(self._pending_callbacks)
+
+    # --------------------------- синтетические обновления -------------------
+
+    def inject(self, scenario: str, chat_id: int) -> None:
+        """Поставить обновление сценария `scenario` от пользователя `chat_id`."""
+
+        kind, payload = SCENARIOS[scenario]
+        self._update_id += 1
+        now = time.perf_counter()
+        user = {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+        chat = {"id": chat_id, "type": "private"}
+
+        if kind == "callback":
+            query_id = str(self._update_id)
+            self._pending_callbacks[query_id] = (scenario, now)
+            self._message_id += 1
+            update = {
+                "update_id": self._update_id,
+                "callback_query": {
+                    "id": query_id,
+                    "from": user,
+                    "chat_instance": str(chat_id),
+                    "data": payload,
+                    "message": {
+                        "message_id": self._message_id,
+                        "date": int(time.time()),
+                        "chat": chat,
+                        "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                        "text": "…",
+                    },
+                },
+            }
+        else:
+            self._pending[chat_id].append((scenario, now))
+            self._message_id += 1
+            message: Dict[str, Any] = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": user,
+                "text": payload,
+            }
+            if payload.startswith("/"):
+                command = payload.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+            update = {"update_id": self._update_id, "message": message}
+
+        self.sent[scenario] += 1
+        if self._webhook is not None:
+            task = asyncio.ensure_future(self._deliver(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            return
+        self._updates.append(update)
+        self._has_updates.set()
+
+    async def _deliver(self, update: Dict[str, Any]) -> None:
+        url, secret = self._webhook
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        async with self._session.post(url, json=update, headers=headers) as resp:
+            resp.raise_for_status()
+
+    async def close(self) -> None:
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    def _reply_to_chat(self, chat_id: int) -> None:
+        pending = self._pending.get(chat_id)
+        self.last_reply = time.perf_counter()
+        # сообщение закрывает самую старую команду чата; ответы из нескольких
+        # сообщений (/update) закрыли бы и следующие, поэтому пачки /update
+        # идут из отдельных чатов, а в них лишние сообщения не учитываются
+        if pending:
+            scenario, injected = pending.popleft()
+            self.latencies[scenario].append(self.last_reply - injected)
+
+    # --------------------------- HTTP ----------------------------------------
+
+    def build_app(self) -> "web.Application":
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle_bot_method)
+        app.router.add_get("/v1/flat", self._handle_flats)
+        return app
+
+    async def _handle_flats(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        self.calls["pik:/v1/flat"] += 1
+        # каждый опрос немного меняет цены, чтобы /update строил непустой diff
+        shift = self.calls["pik:/v1/flat"] * 10_000
+        items = [
+            dict(item, price=item.get("price", 0) + shift) if idx % 10 == 0 else item
+            for idx, item in enumerate(self._flats)
+        ]
+        return web.json_response(items)
+
+    async def _handle_bot_method(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler is not None else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _api_getMe(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": BOT_ID,
+            "is_bot": True,
+            "first_name": "Load test",
+            "username": "loadtest_bot",
+            "can_join_groups": False,
+            "can_read_all_group_messages": False,
+            "supports_inline_queries": False,
+        }
+
+    async def _api_getUpdates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # обновления с id < offset бот уже получил
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    async def _api_setWebhook(self, params: Dict[str, Any]) -> bool:
+        import aiohttp
+
+        self._webhook = (params["url"], params.get("secret_token", ""))
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return True
+
+    async def _api_deleteWebhook(self, params: Dict[str, Any]) -> bool:
+        self._webhook = None
+        return True
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_id = int(params["chat_id"])
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+            "text": params.get("text", ""),
+        }
+
+    async def _api_sendMessage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._reply_to_chat(int(params["chat_id"]))
+        return self._message(params)
+
+    async def _api_sendDocument(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._api_sendMessage(params)
+
+    async def _api_sendPhoto(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._api_sendMessage(params)
+
+    async def _api_editMessageText(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._message(params)
+
+    async def _api_answerCallbackQuery(self, params: Dict[str, Any]) -> bool:
+        pending = self._pending_callbacks.pop(str(params["callback_query_id"]), None)
+        self.last_reply = time.perf_counter()
+        if pending is not None:
+            scenario, injected = pending
+            self.latencies[scenario].append(self.last_reply - injected)
+        return True
+
+    # --------------------------- отчёт ---------------------------------------
+
+    def report(self, started: float) -> LoadReport:
+        scenarios: List[ScenarioStats] = []
+        for name in sorted(self.sent):
+            values = sorted(self.latencies[name])
+            scenarios.append(
+                ScenarioStats(
+                    name,
+                    self.sent[name],
+                    len(values),
+                    percentile(values, 0.5),
+                    percentile(values, 0.9),
+                    percentile(values, 0.99),
+                    values[-1] if values else 0.0,
+                )
+            )
+        elapsed = max(self.last_reply - started, 1e-9)
+        answered = sum(s.answered for s in scenarios)
+        return LoadReport(
+            elapsed=elapsed,
+            sent=sum(self.sent.values()),
+            answered=answered,
+            throughput=answered / elapsed,
+            scenarios=scenarios,
+            api_calls=dict(self.calls),
+        )
+
+
+async def _drive(api: FakeBotApi, config: LoadConfig) -> None:
+    """Подать основной поток с частотой `rate` и пачки /update."""
+
+    rng = random.Random(config.seed)
+    names = list(config.mix)
+    weights = [config.mix[name] for name in names]
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def stream() -> None:
+        n = 0
+        # расписание от момента старта, чтобы задержки sleep не копились
+        while n / config.rate < config.duration:
+            delay = started + n / config.rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            api.inject(rng.choices(names, weights)[0], 1 + n % config.users)
+            n += 1
+
+    async def bursts() -> None:
+        at = config.burst_every
+        while config.burst and at < config.duration:
+            await asyncio.sleep(started + at - loop.time())
+            for i in range(config.burst):
+                api.inject("update", config.users + 1 + i)
+            at += config.burst_every
+
+    await asyncio.gather(stream(), bursts())
+
+
+async def run_load(config: LoadConfig) -> LoadReport:
+    """Поднять фейковый Bot API, бота и прогнать нагрузку по `config`."""
+
+    from aiohttp import web
+
+    settings = get_settings()
+    overridden = {
+        name: getattr(settings, name)
+        for name in (
+            "telegram_api_url",
+            "pik_base_url",
+            "database_path",
+            "concurrent_updates",
+            "pik_rate_per_minute",
+        )
+    }
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        api = FakeBotApi(json.load(f))
+
+    runner = web.AppRunner(api.build_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    base_url = "http://127.0.0.1:%d" % runner.addresses[0][1]
+
+    tmp_dir = None
+    if config.database_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+    executor = CpuExecutor()
+    try:
+        settings.telegram_api_url = f"{base_url}/bot"
+        settings.pik_base_url = base_url
+        settings.database_path = config.database_path or os.path.join(tmp_dir.name, "loadtest.db")
+        if config.concurrent_updates is not None:
+            settings.concurrent_updates = config.concurrent_updates
+        if config.pik_rate_per_minute is not None:
+            settings.pik_rate_per_minute = config.pik_rate_per_minute
+        # у каждого прогона свой полный token bucket
+        get_governor.cache_clear()
+
+        repo = FlatRepository()
+        await repo.init_db()
+        monitor = MonitorService(repo, executor=executor)
+        # первичное наполнение БД с фейкового /v1/flat
+        await monitor.update_from_api()
+
+        handlers = importlib.import_module("bot.handlers")
+        app = handlers.build_application(settings, repo, monitor, schedule=False)
+
+        async with app:
+            if config.webhook:
+                from bot.webhook import WebhookServer
+
+                server = WebhookServer(app, "127.0.0.1", 0, "telegram", secret="loadtest")
+                await server.start()
+                await app.bot.set_webhook(f"http://127.0.0.1:{server.port}/telegram", secret_token="loadtest")
+            else:
+                await app.updater.start_polling(poll_interval=0, timeout=1)
+            await app.start()
+
+            try:
+                started = time.perf_counter()
+                await _drive(api, config)
+                deadline = time.perf_counter() + config.drain_timeout
+                while api.outstanding and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.05)
+            finally:
+                await api.close()
+                if config.webhook:
+                    await server.stop()
+                else:
+                    await app.updater.stop()
+                await app.stop()
+        await repo.close()
+        return api.report(started)
+    finally:
+        for name, value in overridden.items():
+            setattr(settings, name, value)
+        get_governor.cache_clear()
+        executor.shutdown()
+        await runner.cleanup()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий {name!r}, доступны: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+_DEFAULTS = LoadConfig._field_defaults
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на фейковом Bot API")
+    parser.add_argument("--rate", type=float, default=_DEFAULTS["rate"], help="обновлений в секунду")
+    parser.add_argument("--duration", type=float, default=_DEFAULTS["duration"], help="длительность, с")
+    parser.add_argument("--users", type=int, default=_DEFAULTS["users"], help="число чатов")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=DEFAULT_MIX,
+        help="доли сценариев, например studios=3,page=2,find=1",
+    )
+    parser.add_argument("--burst", type=int, default=0, help="размер пачки /update")
+    parser.add_argument("--burst-every", type=float, default=_DEFAULTS["burst_every"], help="интервал пачек, с")
+    parser.add_argument("--drain-timeout", type=float, default=_DEFAULTS["drain_timeout"])
+    parser.add_argument("--pik-rate", type=float, default=None, help="лимит запросов к /v1/flat в минуту")
+    parser.add_argument("--db", default=None, help="файл БД (по умолчанию временный)")
+    parser.add_argument("--webhook", action="store_true", help="доставлять обновления через webhook")
+    parser.add_argument(
+        "--concurrent-updates", type=int, default=None, help="параллельных обновлений (1 — по очереди)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # токен и чат не нужны: все запросы уходят на локальный сервер
+    os.environ.setdefault("telegram_token", "loadtest")
+    os.environ.setdefault("telegram_chat_id", "0")
+
+    config = LoadConfig(
+        rate=args.rate,
+        duration=args.duration,
+        users=args.users,
+        mix=args.mix,
+        burst=args.burst,
+        burst_every=args.burst_every,
+        drain_timeout=args.drain_timeout,
+        database_path=args.db,
+        webhook=args.webhook,
+        concurrent_updates=args.concurrent_updates,
+        pik_rate_per_minute=args.pik_rate,
+        seed=args.seed,
+    )
+    report = asyncio.run(run_load(config))
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+"""Версионированные миграции схемы SQLite.
+
+Номер применённой миграции хранится в `PRAGMA user_version`. Каждая миграция
+выполняется в отдельной транзакции вместе с повышением версии, поэтому
+прерванный запуск не оставляет схему в промежуточном состоянии. Шаги написаны
+идемпотентно: БД, созданные до появления версий (`user_version = 0`), спокойно
+проходят всю цепочку.
+"""
+
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+import aiosqlite
+
+
+logger = logging.getLogger(__name__)
+
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+# Сгенерированные колонки поверх `raw` (SQLite JSON1) для часто фильтруемых
+# вложенных полей. VIRTUAL: значения не занимают места в строке, но индексируются.
+JSON_COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ("layout_id", "INTEGER", "$.layout.id"),
+    ("layout_name", "TEXT", "$.layout.name"),
+    ("is_finish", "INTEGER", "$.finish.isFinish"),
+    ("booking_period", "INTEGER", "$.booking.period"),
+)
+
+
+async def _columns(conn: aiosqlite.Connection, table: str) -> set:
+    cursor = await conn.execute(f"PRAGMA table_xinfo({table})")
+    return {row[1] for row in await cursor.fetchall()}
+
+
+async def _v1_flats(conn: aiosqlite.Connection) -> None:
+    """Основная таблица квартир."""
+
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS flats (
+            id INTEGER PRIMARY KEY,
+            rooms TEXT,
+            price INTEGER,
+            status TEXT,
+            url TEXT,
+            area REAL,
+            floor INTEGER,
+            location INTEGER,
+            type_id INTEGER,
+            guid TEXT,
+            bulk_id INTEGER,
+            section_id INTEGER,
+            sale_scheme_id INTEGER,
+            ceiling_height REAL,
+            is_pre_sale INTEGER,
+            rooms_fact INTEGER,
+            number TEXT,
+            number_bti TEXT,
+            number_stage INTEGER,
+            min_month_fee INTEGER,
+            discount INTEGER,
+            has_advertising_price INTEGER,
+            has_new_price INTEGER,
+            area_bti REAL,
+            area_project REAL,
+            callback INTEGER,
+            kitchen_furniture INTEGER,
+            booking_cost INTEGER,
+            compass_angle INTEGER,
+            booking_status TEXT,
+            pdf TEXT,
+            is_resell INTEGER,
+            last_seen TEXT NOT NULL
+        )
+        """
+    )
+
+
+async def _v2_raw_json(conn: aiosqlite.Connection) -> None:
+    """Колонка `raw` с исходным JSON и индексированные сгенерированные колонки."""
+
+    existing = await _columns(conn, "flats")
+    if "raw" not in existing:
+        await conn.execute("ALTER TABLE flats ADD COLUMN raw TEXT")
+    for name, sql_type, path in JSON_COLUMNS:
+        if name not in existing:
+            await conn.execute(
+                f"ALTER TABLE flats ADD COLUMN {name} {sql_type} "
+                f"GENERATED ALWAYS AS (json_extract(raw, '{path}')) VIRTUAL"
+            )
+        await conn.execute(f"CREATE INDEX IF NOT EXISTS idx_flats_{name} ON flats({name})")
+
+
+async def _v3_archive(conn: aiosqlite.Connection) -> None:
+    """Таблицы архива «сырых» ответов API (см. `bot.archive`)."""
+
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS raw_blobs (
+            digest TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            base_digest TEXT,
+            depth INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+        """
+    )
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS raw_polls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            digest TEXT NOT NULL REFERENCES raw_blobs(digest),
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL
+        )
+        """
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_raw_polls_first_seen ON raw_polls(first_seen)")
+
+
+async def _v4_room_category(conn: aiosqlite.Connection) -> None:
+    """Категория комнатности и индекс для keyset-пагинации по (price, id)."""
+
+    if "room_category" not in await _columns(conn, "flats"):
+        await conn.execute(
+            "ALTER TABLE flats ADD COLUMN room_category TEXT GENERATED ALWAYS AS ("
+            "CASE WHEN rooms IN ('0', 'studio', 'студия') THEN 'studio' "
+            "WHEN rooms = '1' THEN 'one' ELSE rooms END) VIRTUAL"
+        )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_flats_category_price ON flats(room_category, price, id)"
+    )
+
+
+async def _v5_search_indexes(conn: aiosqlite.Connection) -> None:
+    """Составные индексы под фильтры `/find` (см. `bot.search`)."""
+
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_flats_category_status_price ON flats(room_category, status, price)"
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_flats_section_floor ON flats(section_id, floor)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_flats_bulk_floor ON flats(bulk_id, floor)")
+
+
+async def _v6_aggregates(conn: aiosqlite.Connection) -> None:
+    """Материализованные агрегаты по корпусам, секциям и планировкам (см. `bot.aggregates`)."""
+
+    for table, key in (("agg_bulk", "bulk_id"), ("agg_section", "section_id"), ("agg_layout", "layout_id")):
+        await conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key} INTEGER PRIMARY KEY,
+                layout_name TEXT,  -- осмысленно только для agg_layout
+                free_count INTEGER NOT NULL,
+                reserved_count INTEGER NOT NULL,
+                min_price INTEGER,
+                max_price INTEGER,
+                min_ppm REAL,
+                avg_ppm REAL
+            )
+            """
+        )
+        # Первичное заполнение по текущим данным; дальше — только инкрементально
+        await conn.execute(f"DELETE FROM {table}")
+        await conn.execute(
+            f"""
+            INSERT INTO {table}(
+                {key}, layout_name, free_count, reserved_count,
+                min_price, max_price, min_ppm, avg_ppm
+            )
+            SELECT
+                {key},
+                MIN(layout_name),
+                SUM(status = 'free'),
+                SUM(status != 'free'),
+                MIN(CASE WHEN status = 'free' THEN price END),
+                MAX(CASE WHEN status = 'free' THEN price END),
+                MIN(CASE WHEN status = 'free' THEN price / COALESCE(area, area_project) END),
+                AVG(CASE WHEN status = 'free' THEN price / COALESCE(area, area_project) END)
+            FROM flats WHERE {key} IS NOT NULL GROUP BY {key}
+            """
+        )
+
+
+async def _v7_deal_scores(conn: aiosqlite.Connection) -> None:
+    """Оценки цены за м² относительно сопоставимых квартир (см. `bot.deals`)."""
+
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS deal_scores (
+            id INTEGER PRIMARY KEY,
+            room_category TEXT NOT NULL,
+            bulk_id INTEGER NOT NULL,
+            peer_count INTEGER NOT NULL,
+            ppm REAL NOT NULL,
+            median_ppm REAL NOT NULL,
+            mad_ppm REAL NOT NULL,
+            score REAL NOT NULL,
+            percentile REAL NOT NULL,
+            is_outlier INTEGER NOT NULL
+        )
+        """
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_deal_scores_bulk ON deal_scores(bulk_id)")
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_deal_scores_category_score ON deal_scores(room_category, score)"
+    )
+    # оценки заполняет `FlatRepository.init_db` по текущим настройкам
+
+
+async def _v8_leader_lease(conn: aiosqlite.Connection) -> None:
+    """Аренда ведущего экземпляра (см. `bot.leader`)."""
+
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leader_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            term INTEGER NOT NULL,
+            acquired_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+
+
+async def _v9_watchlist(conn: aiosqlite.Connection) -> None:
+    """Отслеживаемые пользователями квартиры (`/watch`)."""
+
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS watchlist (
+            chat_id INTEGER NOT NULL,
+            flat_id INTEGER NOT NULL,
+            added_at TEXT NOT NULL,
+            PRIMARY KEY (chat_id, flat_id)
+        ) WITHOUT ROWID
+        """
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_flat ON watchlist(flat_id)")
+
+
+# Схема v10 (см. `bot.storage`) в том виде, в каком её создала миграция
+_V10_SCHEMA: Tuple[str, ...] = (
+    "CREATE TABLE IF NOT EXISTS flat_statuses (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS bulks (id INTEGER PRIMARY KEY, block_id INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS layouts (id INTEGER PRIMARY KEY, name TEXT, data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_layouts_name ON layouts(name)",
+    """
+    CREATE TABLE IF NOT EXISTS flat_rows (
+        id INTEGER PRIMARY KEY,
+        rooms TEXT,
+        price INTEGER,
+        status_id INTEGER REFERENCES flat_statuses(id),
+        url TEXT,  -- NULL: 'https://www.pik.ru/yauza/flats/' || id
+        area REAL,
+        floor INTEGER,
+        location INTEGER,
+        type_id INTEGER,
+        guid TEXT,
+        bulk_id INTEGER,
+        section_id INTEGER,
+        sale_scheme_id INTEGER,
+        ceiling_height REAL,
+        is_pre_sale INTEGER,
+        rooms_fact INTEGER,
+        number TEXT,
+        number_bti TEXT,
+        number_stage INTEGER,
+        min_month_fee INTEGER,
+        discount INTEGER,
+        has_advertising_price INTEGER,
+        has_new_price INTEGER,
+        area_bti REAL,
+        area_project REAL,
+        callback INTEGER,
+        kitchen_furniture INTEGER,
+        booking_cost INTEGER,
+        compass_angle INTEGER,
+        booking_status_id INTEGER REFERENCES flat_statuses(id),
+        pdf TEXT,  -- NULL и pdf_version: шаблон по bulks.block_id
+        pdf_version INTEGER,
+        is_resell INTEGER,
+        layout_id INTEGER REFERENCES layouts(id),
+        raw TEXT,  -- без ключей url, pdf и layout
+        last_seen TEXT NOT NULL,
+        is_finish INTEGER GENERATED ALWAYS AS (json_extract(raw, '$.finish.isFinish')) VIRTUAL,
+        booking_period INTEGER GENERATED ALWAYS AS (json_extract(raw, '$.booking.period')) VIRTUAL,
+        room_category TEXT GENERATED ALWAYS AS (
+            CASE WHEN rooms IN ('0', 'studio', 'студия') THEN 'studio'
+            WHEN rooms = '1' THEN 'one' ELSE rooms END
+        ) VIRTUAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_flats_category_price ON flat_rows(room_category, price, id)",
+    "CREATE INDEX IF NOT EXISTS idx_flats_category_status_price ON flat_rows(room_category, status_id, price)",
+    "CREATE INDEX IF NOT EXISTS idx_flats_section_floor ON flat_rows(section_id, floor)",
+    "CREATE INDEX IF NOT EXISTS idx_flats_bulk_floor ON flat_rows(bulk_id, floor)",
+    "CREATE INDEX IF NOT EXISTS idx_flats_layout_id ON flat_rows(layout_id)",
+    "CREATE INDEX IF NOT EXISTS idx_flats_is_finish ON flat_rows(is_finish)",
+    "CREATE INDEX IF NOT EXISTS idx_flats_booking_period ON flat_rows(booking_period)",
+    """
+    CREATE VIEW IF NOT EXISTS flats AS
+    SELECT
+        flats.id, flats.rooms, flats.price, s.name AS status,
+        COALESCE(flats.url, 'https://www.pik.ru/yauza/flats/' || flats.id) AS url,
+        flats.area, flats.floor, flats.location, flats.type_id, flats.guid, flats.bulk_id, flats.section_id,
+        flats.sale_scheme_id, flats.ceiling_height, flats.is_pre_sale, flats.rooms_fact, flats.number,
+        flats.number_bti, flats.number_stage, flats.min_month_fee, flats.discount, flats.has_advertising_price,
+        flats.has_new_price, flats.area_bti, flats.area_project, flats.callback, flats.kitchen_furniture,
+        flats.booking_cost, flats.compass_angle, bs.name AS booking_status,
+        COALESCE(flats.pdf, CASE WHEN flats.pdf_version IS NOT NULL THEN 'https://pdf.pik.ru/flat/' || b.block_id
+            || '/' || flats.bulk_id || '/' || flats.id || '.pdf?v=' || flats.pdf_version END) AS pdf,
+        flats.is_resell,
+        CASE WHEN flats.raw IS NOT NULL THEN
+            json_insert(
+                flats.raw,
+                '$.url', COALESCE(flats.url, 'https://www.pik.ru/yauza/flats/' || flats.id),
+                '$.pdf', COALESCE(flats.pdf, CASE WHEN flats.pdf_version IS NOT NULL
+                    THEN 'https://pdf.pik.ru/flat/' || b.block_id || '/' || flats.bulk_id || '/' || flats.id
+                    || '.pdf?v=' || flats.pdf_version END),
+                '$.layout', json(l.data)
+            )
+        END AS raw,
+        flats.last_seen,
+        flats.layout_id,
+        l.name AS layout_name,
+        flats.is_finish,
+        flats.booking_period,
+        flats.room_category
+    FROM flat_rows AS flats  -- в планах запросов таблица видна под прежним именем
+    LEFT JOIN flat_statuses AS s ON s.id = flats.status_id
+    LEFT JOIN flat_statuses AS bs ON bs.id = flats.booking_status_id
+    LEFT JOIN bulks AS b ON b.id = flats.bulk_id
+    LEFT JOIN layouts AS l ON l.id = flats.layout_id
+    """,
+)
+
+# Перенос строк flats v9 → flat_rows. pdf разбирается на проект и версию
+# и сверяется с шаблоном целиком: значения, не совпавшие с ним, хранятся как есть.
+_V10_PDF = """
+    SELECT
+        *,
+        CAST(substr(pdf, 25, instr(substr(pdf, 25), '/') - 1) AS INTEGER) AS pdf_block,
+        CAST(substr(pdf, instr(pdf, '?v=') + 3) AS INTEGER) AS pdf_v,
+        json_type(raw, '$.layout') = 'object' AND json_type(raw, '$.layout.id') = 'integer' AS has_layout
+    FROM flats_v9
+"""
+
+_V10_COPY = f"""
+    WITH v AS ({_V10_PDF}),
+    encoded AS (
+        SELECT
+            v.*,
+            s.id AS status_id,
+            bs.id AS booking_status_id,
+            v.pdf = 'https://pdf.pik.ru/flat/' || b.block_id || '/' || v.bulk_id || '/' || v.id
+                || '.pdf?v=' || v.pdf_v AS pdf_templated,
+            CASE WHEN v.has_layout THEN json_remove(v.raw, '$.layout') ELSE v.raw END AS raw1
+        FROM v
+        LEFT JOIN flat_statuses AS s ON s.name = v.status
+        LEFT JOIN flat_statuses AS bs ON bs.name = v.booking_status
+        LEFT JOIN bulks AS b ON b.id = v.bulk_id
+    ),
+    stripped AS (
+        SELECT
+            *,
+            CASE WHEN json_extract(raw1, '$.url') = url THEN json_remove(raw1, '$.url') ELSE raw1 END AS raw2
+        FROM encoded
+    )
+    INSERT INTO flat_rows(
+        id, rooms, price, status_id, url, area, floor, location, type_id, guid, bulk_id, section_id,
+        sale_scheme_id, ceiling_height, is_pre_sale, rooms_fact, number, number_bti, number_stage,
+        min_month_fee, discount, has_advertising_price, has_new_price, area_bti, area_project,
+        callback, kitchen_furniture, booking_cost, compass_angle, booking_status_id, pdf,
+        pdf_version, is_resell, layout_id, raw, last_seen
+    )
+    SELECT
+        id, rooms, price, status_id, NULLIF(url, 'https://www.pik.ru/yauza/flats/' || id), area, floor,
+        location, type_id, guid, bulk_id, section_id, sale_scheme_id, ceiling_height, is_pre_sale,
+        rooms_fact, number, number_bti, number_stage, min_month_fee, discount, has_advertising_price,
+        has_new_price, area_bti, area_project, callback, kitchen_furniture, booking_cost, compass_angle,
+        booking_status_id, CASE WHEN pdf_templated THEN NULL ELSE pdf END,
+        CASE WHEN pdf_templated THEN pdf_v END, is_resell,
+        CASE WHEN has_layout THEN json_extract(raw, '$.layout.id') END,
+        CASE WHEN json_extract(raw2, '$.pdf') = pdf THEN json_remove(raw2, '$.pdf') ELSE raw2 END,
+        last_seen
+    FROM stripped
+"""
+
+
+async def _v10_normalized_storage(conn: aiosqlite.Connection) -> None:
+    """Словари и шаблоны ссылок: `flats` становится представлением над `flat_rows` (см. `bot.storage`)."""
+
+    cursor = await conn.execute("SELECT type FROM sqlite_master WHERE name = 'flats'")
+    row = await cursor.fetchone()
+    has_table = row is not None and row[0] == "table"
+    if has_table:
+        await conn.execute("ALTER TABLE flats RENAME TO flats_v9")
+        # имена индексов переходят к `flat_rows`
+        cursor = await conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'flats_v9' AND sql IS NOT NULL"
+        )
+        for (index,) in await cursor.fetchall():
+            await conn.execute(f"DROP INDEX {index}")
+    for statement in _V10_SCHEMA:
+        await conn.execute(statement)
+    if not has_table:
+        return
+
+    await conn.execute(
+        "INSERT OR IGNORE INTO flat_statuses(name) "
+        "SELECT status FROM flats_v9 WHERE status IS NOT NULL "
+        "UNION SELECT booking_status FROM flats_v9 WHERE booking_status IS NOT NULL"
+    )
+    # проект корпуса — из первой ссылки на PDF, совпавшей с шаблоном
+    await conn.execute(
+        f"""
+        INSERT OR IGNORE INTO bulks(id, block_id)
+        SELECT bulk_id, pdf_block FROM ({_V10_PDF})
+        WHERE bulk_id IS NOT NULL
+            AND pdf = 'https://pdf.pik.ru/flat/' || pdf_block || '/' || bulk_id || '/' || id || '.pdf?v=' || pdf_v
+        ORDER BY id
+        """
+    )
+    # объект планировки один на все её квартиры: хранится последний
+    await conn.execute(
+        f"""
+        INSERT OR REPLACE INTO layouts(id, name, data)
+        SELECT json_extract(raw, '$.layout.id'), json_extract(raw, '$.layout.name'), json_extract(raw, '$.layout')
+        FROM ({_V10_PDF}) WHERE has_layout ORDER BY id
+        """
+    )
+    await conn.execute(_V10_COPY)
+    await conn.execute("DROP TABLE flats_v9")
+
+
+async def _v11_cdc_events(conn: aiosqlite.Connection) -> None:
+    """Лента изменений квартир для других систем (см. `bot.cdc`)."""
+
+    # AUTOINCREMENT: seq не переиспользуется после удаления старых событий,
+    # курсоры потребителей остаются монотонными
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cdc_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx INTEGER NOT NULL,
+            ts TEXT NOT NULL,
+            op TEXT NOT NULL,
+            flat_id INTEGER NOT NULL,
+            old_values TEXT,
+            new_values TEXT
+        )
+        """
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_cdc_events_ts ON cdc_events(ts)")
+
+
+async def _v12_watch_state(conn: aiosqlite.Connection) -> None:
+    """Что видел быстрый опрос `/watch`: сравнение идёт с этим, а не с flats."""
+
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS watch_state (
+            flat_id INTEGER PRIMARY KEY,
+            price INTEGER,
+            status TEXT,
+            seen_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+# `flats` v13: в `raw` возвращаются только те ключи, которые из него убрал
+# `write_rows`. Путь '$' для json_insert — пропуск: корень есть всегда, а
+# существующие значения json_insert не перезаписывает.
+_V13_VIEW = """
+    CREATE VIEW flats AS
+    SELECT
+        flats.id, flats.rooms, flats.price, s.name AS status,
+        COALESCE(flats.url, 'https://www.pik.ru/yauza/flats/' || flats.id) AS url,
+        flats.area, flats.floor, flats.location, flats.type_id, flats.guid, flats.bulk_id, flats.section_id,
+        flats.sale_scheme_id, flats.ceiling_height, flats.is_pre_sale, flats.rooms_fact, flats.number,
+        flats.number_bti, flats.number_stage, flats.min_month_fee, flats.discount, flats.has_advertising_price,
+        flats.has_new_price, flats.area_bti, flats.area_project, flats.callback, flats.kitchen_furniture,
+        flats.booking_cost, flats.compass_angle, bs.name AS booking_status,
+        COALESCE(flats.pdf, CASE WHEN flats.pdf_version IS NOT NULL THEN 'https://pdf.pik.ru/flat/' || b.block_id
+            || '/' || flats.bulk_id || '/' || flats.id || '.pdf?v=' || flats.pdf_version END) AS pdf,
+        flats.is_resell,
+        CASE WHEN flats.raw IS NOT NULL THEN
+            json_insert(
+                flats.raw,
+                CASE WHEN flats.raw_stripped & 1 THEN '$.url' ELSE '$' END,
+                COALESCE(flats.url, 'https://www.pik.ru/yauza/flats/' || flats.id),
+                CASE WHEN flats.raw_stripped & 2 THEN '$.pdf' ELSE '$' END,
+                COALESCE(flats.pdf, CASE WHEN flats.pdf_version IS NOT NULL
+                    THEN 'https://pdf.pik.ru/flat/' || b.block_id || '/' || flats.bulk_id || '/' || flats.id
+                    || '.pdf?v=' || flats.pdf_version END),
+                CASE WHEN flats.layout_id IS NOT NULL THEN '$.layout' ELSE '$' END, json(l.data)
+            )
+        END AS raw,
+        flats.last_seen,
+        flats.layout_id,
+        l.name AS layout_name,
+        flats.is_finish,
+        flats.booking_period,
+        flats.room_category
+    FROM flat_rows AS flats  -- в планах запросов таблица видна под прежним именем
+    LEFT JOIN flat_statuses AS s ON s.id = flats.status_id
+    LEFT JOIN flat_statuses AS bs ON bs.id = flats.booking_status_id
+    LEFT JOIN bulks AS b ON b.id = flats.bulk_id
+    LEFT JOIN layouts AS l ON l.id = flats.layout_id
+"""
+
+
+async def _v13_raw_stripped_keys(conn: aiosqlite.Connection) -> None:
+    """Помнить, какие из url и pdf убраны из `raw`: `flats` возвращает только их."""
+
+    # 1 — url, 2 — pdf; layout убран, если задан layout_id
+    await conn.execute("ALTER TABLE flat_rows ADD COLUMN raw_stripped INTEGER NOT NULL DEFAULT 0")
+    # раньше это не запоминалось: отсутствующий ключ считаем убранным, как и
+    # показывало представление, а pdf — только если ссылку есть из чего собрать
+    await conn.execute(
+        """
+        UPDATE flat_rows SET raw_stripped =
+            (json_type(raw, '$.url') IS NULL)
+            | ((json_type(raw, '$.pdf') IS NULL AND (pdf IS NOT NULL OR pdf_version IS NOT NULL)) << 1)
+        WHERE raw IS NOT NULL
+        """
+    )
+    await conn.execute("DROP VIEW IF EXISTS flats")
+    await conn.execute(_V13_VIEW)
+
+
+# Порядок важен: версия схемы = номер последней применённой миграции.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS: List[Tuple[int, Migration]] = [
+    (1, _v1_flats),
+    (2, _v2_raw_json),
+    (3, _v3_archive),
+    (4, _v4_room_category),
+    (5, _v5_search_indexes),
+    (6, _v6_aggregates),
+    (7, _v7_deal_scores),
+    (8, _v8_leader_lease),
+    (9, _v9_watchlist),
+    (10, _v10_normalized_storage),
+    (11, _v11_cdc_events),
+    (12, _v12_watch_state),
+    (13, _v13_raw_stripped_keys),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("PRAGMA user_version")
+    (version,) = await cursor.fetchone()
+    return version
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """Применить недостающие миграции и вернуть итоговую версию схемы."""
+
+    version = await get_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version  # быстрый путь обычного рестарта: одна PRAGMA
+
+    for target, step in MIGRATIONS:
+        # BEGIN IMMEDIATE: параллельно стартующие экземпляры не применят миграцию дважды
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            if await get_version(conn) >= target:
+                await conn.rollback()
+                continue
+            await step(conn)
+            await conn.execute(f"PRAGMA user_version = {target}")
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+        logger.info("Schema migrated to version %s (%s)", target, step.__name__)
+
+    return await get_version(conn)
@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Flat(BaseModel):
@@ -40,4 +40,8 @@ class Flat(BaseModel):
     compass_angle: Optional[int] = None
     booking_status: Optional[str] = None
     pdf: Optional[str] = None
-    is_resell: Optional[bool] = None 
\ No newline at end of file
+    is_resell: Optional[bool] = None
+
+    # исходный объект квартиры из ответа API (JSON-текст) со вложенными
+    # layout, finish, booking, benefits и т. п.
+    raw: Optional[str] = Field(default=None, repr=False)
@@ -1,22 +1,33 @@
+import json
 import logging
-from typing import List, Optional
-
-import aiohttp
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from bot.config import get_settings
+from bot.governor import Priority, get_governor
 from bot.models import Flat
 
+if TYPE_CHECKING:
+    import aiohttp
+
 logger = logging.getLogger(__name__)
 
 
 class PIKApiClient:
-    """Клиент для работы с `api.pik.ru`. Используется как async context manager."""
+    """Клиент для работы с `api.pik.ru`. Используется как async context manager.
+
+    Каждый запрос сначала получает разрешение у общего `RequestGovernor`
+    с приоритетом `priority`; при исчерпанном лимите — `BudgetExceeded`.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, priority: Priority = Priority.SCHEDULED) -> None:
         self._settings = get_settings()
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._priority = priority
+        self._session: Optional["aiohttp.ClientSession"] = None
 
     async def __aenter__(self):
+        # aiohttp тяжёлый (~0.1 с на импорт), а нужен только при первом опросе API
+        import aiohttp
+
         self._session = aiohttp.ClientSession(
             base_url=self._settings.pik_base_url,
             headers={"User-Agent": "PikYauzaBot/1.0"},
@@ -27,68 +38,95 @@ class PIKApiClient:
         if self._session and not self._session.closed:
             await self._session.close()
 
-    async def fetch_flats(self) -> List[Flat]:
-        """Получить список всех квартир в ЖК «Яуза Парк»."""
+    async def fetch_body(self) -> bytes:
+        """Получить тело ответа `/v1/flat` без декодирования."""
 
         if self._session is None:
             raise RuntimeError("PIKApiClient используется вне контекста 'async with'.")
 
+        await get_governor().acquire(self._priority)
+
         url = f"/v1/flat?block_id={self._settings.yauza_block_id}"
         logger.info("GET %s", url)
         async with self._session.get(url, timeout=30) as resp:
             logger.info("%s -> %s", url, resp.status)
             resp.raise_for_status()
-            data = await resp.json()
-
-        # API иногда оборачивает данные в словарь
-        if isinstance(data, dict):
-            # Наиболее вероятные ключи
-            for key in ("data", "result", "flats"):
-                if key in data and isinstance(data[key], list):
-                    data = data[key]
-                    break
-
-        flats: List[Flat] = []
-        for item in data:
-            if not isinstance(item, dict):
-                logger.warning("Unexpected item type from API: %s", type(item))
-                continue
-            flats.append(
-                Flat(
-                    id=item.get("id"),
-                    rooms=str(item.get("rooms")),
-                    price=item.get("price", 0),
-                    status=item.get("status", "unknown"),
-                    url=item.get("url", ""),
-                    area=item.get("area"),
-                    floor=item.get("floor"),
-                    # дополнительные поля
-                    location=item.get("location"),
-                    type_id=item.get("type_id"),
-                    guid=item.get("guid"),
-                    bulk_id=item.get("bulk_id"),
-                    section_id=item.get("section_id"),
-                    sale_scheme_id=item.get("saleSchemeId"),
-                    ceiling_height=item.get("ceilingHeight"),
-                    is_pre_sale=item.get("isPreSale"),
-                    rooms_fact=item.get("rooms_fact"),
-                    number=item.get("number"),
-                    number_bti=item.get("number_bti"),
-                    number_stage=item.get("number_stage"),
-                    min_month_fee=item.get("minMonthFee"),
-                    discount=item.get("discount"),
-                    has_advertising_price=item.get("has_advertising_price"),
-                    has_new_price=item.get("hasNewPrice"),
-                    area_bti=item.get("area_bti"),
-                    area_project=item.get("area_project"),
-                    callback=item.get("callback"),
-                    kitchen_furniture=item.get("kitchenFurniture"),
-                    booking_cost=item.get("bookingCost"),
-                    compass_angle=item.get("compass_angle"),
-                    booking_status=item.get("bookingStatus"),
-                    pdf=item.get("pdf"),
-                    is_resell=item.get("isResell"),
-                )
+            return await resp.read()
+
+    async def fetch_raw(self) -> List[Dict[str, Any]]:
+        """Получить «сырой» ответ `/v1/flat` — список объектов квартир как есть."""
+
+        return unwrap_items(json.loads(await self.fetch_body()))
+
+    async def fetch_flats(self) -> List[Flat]:
+        """Получить список всех квартир в ЖК «Яуза Парк»."""
+
+        return parse_flats(await self.fetch_raw())
+
+
+def unwrap_items(data: Any) -> List[Dict[str, Any]]:
+    """Достать список квартир из ответа API."""
+
+    # API иногда оборачивает данные в словарь
+    if isinstance(data, dict):
+        # Наиболее вероятные ключи
+        for key in ("data", "result", "flats"):
+            if key in data and isinstance(data[key], list):
+                data = data[key]
+                break
+
+    items: List[Dict[str, Any]] = []
+    for item in data:
+        if not isinstance(item, dict):
+            logger.warning("Unexpected item type from API: %s", type(item))
+            continue
+        items.append(item)
+    return items
+
+
+def parse_flats(items: List[Dict[str, Any]]) -> List[Flat]:
+    """Преобразовать объекты из ответа `/v1/flat` в модели `Flat`."""
+
+    flats: List[Flat] = []
+    for item in items:
+        flats.append(
+            Flat(
+                id=item.get("id"),
+                rooms=str(item.get("rooms")),
+                price=item.get("price", 0),
+                status=item.get("status", "unknown"),
+                url=item.get("url", ""),
+                area=item.get("area"),
+                floor=item.get("floor"),
+                # дополнительные поля
+                location=item.get("location"),
+                type_id=item.get("type_id"),
+                guid=item.get("guid"),
+                bulk_id=item.get("bulk_id"),
+                section_id=item.get("section_id"),
+                sale_scheme_id=item.get("saleSchemeId"),
+                ceiling_height=item.get("ceilingHeight"),
+                is_pre_sale=item.get("isPreSale"),
+                rooms_fact=item.get("rooms_fact"),
+                number=item.get("number"),
+                number_bti=item.get("number_bti"),
+                number_stage=item.get("number_stage"),
+                min_month_fee=item.get("minMonthFee"),
+                discount=item.get("discount"),
+                has_advertising_price=item.get("has_advertising_price"),
+                has_new_price=item.get("hasNewPrice"),
+                area_bti=item.get("area_bti"),
+                area_project=item.get("area_project"),
+                callback=item.get("callback"),
+                kitchen_furniture=item.get("kitchenFurniture"),
+                booking_cost=item.get("bookingCost"),
+                compass_angle=item.get("compass_angle"),
+                booking_status=item.get("bookingStatus"),
+                pdf=item.get("pdf"),
+                is_resell=item.get("isResell"),
+                raw=json.dumps(item, ensure_ascii=False, separators=(",", ":")),
             )
+        )
 
-        return flats 
\ No newline at end of file
+    return flats
+ 
\ No newline at end of file
@@ -1,10 +1,19 @@
 import datetime
-from typing import List
+import json
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import aiosqlite
 
+from bot import cdc
+from bot.aggregates import affected_groups, refresh_groups, snapshot_sources
 from bot.config import get_settings
+from bot.deals import refresh_scores
+from bot.migrations import migrate
 from bot.models import Flat
+from bot.storage import FLAT_COLUMNS, UPSERT_FIELDS, delete_rows, write_rows
+
+if TYPE_CHECKING:
+    from bot.leader import LeaderElector
 
 
 class FlatRepository:
@@ -12,139 +21,88 @@ class FlatRepository:
 
     def __init__(self):
         self._settings = get_settings()
+        # Долгоживущее соединение для `/find`: sqlite3 кэширует подготовленные
+        # выражения в пределах соединения, и повторные фильтры не парсятся заново
+        self._search_conn: Optional[aiosqlite.Connection] = None
+        # `LeaderElector`, если экземпляров несколько: записи проверяют аренду
+        # в своей транзакции, чтобы «проспавший» бывший ведущий ничего не записал
+        self.fence: Optional["LeaderElector"] = None
+        # срабатывает после каждого коммита diff: будит ожидающих ленту `bot.cdc`
+        self.changes = cdc.ChangeSignal()
 
     async def init_db(self) -> None:
-        """Создать таблицы при первом запуске."""
+        """Создать таблицы при первом запуске и применить недостающие миграции."""
 
         async with aiosqlite.connect(self._settings.database_path) as conn:
-            await conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS flats (
-                    id INTEGER PRIMARY KEY,
-                    rooms TEXT,
-                    price INTEGER,
-                    status TEXT,
-                    url TEXT,
-                    area REAL,
-                    floor INTEGER,
-                    location INTEGER,
-                    type_id INTEGER,
-                    guid TEXT,
-                    bulk_id INTEGER,
-                    section_id INTEGER,
-                    sale_scheme_id INTEGER,
-                    ceiling_height REAL,
-                    is_pre_sale INTEGER,
-                    rooms_fact INTEGER,
-                    number TEXT,
-                    number_bti TEXT,
-                    number_stage INTEGER,
-                    min_month_fee INTEGER,
-                    discount INTEGER,
-                    has_advertising_price INTEGER,
-                    has_new_price INTEGER,
-                    area_bti REAL,
-                    area_project REAL,
-                    callback INTEGER,
-                    kitchen_furniture INTEGER,
-                    booking_cost INTEGER,
-                    compass_angle INTEGER,
-                    booking_status TEXT,
-                    pdf TEXT,
-                    is_resell INTEGER,
-                    last_seen TEXT NOT NULL
-                )
-                """
-            )
+            # WAL: читатели (в т.ч. другие экземпляры) не блокируются записью;
+            # режим сохраняется в файле БД
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await migrate(conn)
+            await self._fill_scores(conn)
+
+    async def _fill_scores(self, conn: aiosqlite.Connection) -> None:
+        """Первичный расчёт `deal_scores`, если квартиры есть, а оценок нет.
+
+        Дальше оценки обновляет `apply_diff` — только в затронутых корпусах.
+        """
+
+        cursor = await conn.execute("SELECT EXISTS(SELECT 1 FROM deal_scores)")
+        if (await cursor.fetchone())[0]:
+            return
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = await conn.execute("SELECT DISTINCT bulk_id FROM flats WHERE bulk_id IS NOT NULL")
+            await refresh_scores(conn, [row[0] for row in await cursor.fetchall()])
             await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
 
     async def upsert_many(self, flats: List[Flat]) -> None:
         """Обновить информацию о квартирах (insert/update)."""
 
-        now = datetime.datetime.utcnow().isoformat()
+        await self.upsert_rows([tuple(getattr(flat, name) for name in UPSERT_FIELDS) for flat in flats])
+
+    async def upsert_rows(self, rows: List[tuple]) -> None:
+        """То же, что `upsert_many`, для кортежей в порядке `UPSERT_FIELDS`."""
+
+        await self.apply_diff(rows, [])
+
+    async def apply_diff(self, rows: List[tuple], removed_ids: List[int]) -> List[int]:
+        """Применить результат diff одной транзакцией: удалить пропавшие и upsert свежие.
+
+        В этой же транзакции пересчитываются затронутые группы агрегатов `agg_*`
+        и оценки выгодности `deal_scores`, поэтому читатели никогда не видят их
+        расходящимися с таблицей flats, и дописываются события ленты `bot.cdc`.
+        Возвращает id квартир, которые только что стали выгодными (`bot.deals`).
+        """
+
+        moment = datetime.datetime.utcnow()
+        now = moment.isoformat()
+        cutoff = (moment - datetime.timedelta(days=self._settings.cdc_retention_days)).isoformat()
+        ids = [row[0] for row in rows]
         async with aiosqlite.connect(self._settings.database_path) as conn:
-            for flat in flats:
-                await conn.execute(
-                    """
-                    INSERT INTO flats(
-                        id, rooms, price, status, url, area, floor, location, type_id, guid,
-                        bulk_id, section_id, sale_scheme_id, ceiling_height, is_pre_sale, rooms_fact,
-                        number, number_bti, number_stage, min_month_fee, discount, has_advertising_price,
-                        has_new_price, area_bti, area_project, callback, kitchen_furniture, booking_cost,
-                        compass_angle, booking_status, pdf, is_resell, last_seen
-                    )
-                    VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                    ON CONFLICT(id) DO UPDATE SET
-                        rooms = excluded.rooms,
-                        price = excluded.price,
-                        status = excluded.status,
-                        url = excluded.url,
-                        area = excluded.area,
-                        floor = excluded.floor,
-                        location = excluded.location,
-                        type_id = excluded.type_id,
-                        guid = excluded.guid,
-                        bulk_id = excluded.bulk_id,
-                        section_id = excluded.section_id,
-                        sale_scheme_id = excluded.sale_scheme_id,
-                        ceiling_height = excluded.ceiling_height,
-                        is_pre_sale = excluded.is_pre_sale,
-                        rooms_fact = excluded.rooms_fact,
-                        number = excluded.number,
-                        number_bti = excluded.number_bti,
-                        number_stage = excluded.number_stage,
-                        min_month_fee = excluded.min_month_fee,
-                        discount = excluded.discount,
-                        has_advertising_price = excluded.has_advertising_price,
-                        has_new_price = excluded.has_new_price,
-                        area_bti = excluded.area_bti,
-                        area_project = excluded.area_project,
-                        callback = excluded.callback,
-                        kitchen_furniture = excluded.kitchen_furniture,
-                        booking_cost = excluded.booking_cost,
-                        compass_angle = excluded.compass_angle,
-                        booking_status = excluded.booking_status,
-                        pdf = excluded.pdf,
-                        is_resell = excluded.is_resell,
-                        last_seen = excluded.last_seen
-                    """,
-                    (
-                        flat.id,
-                        flat.rooms,
-                        flat.price,
-                        flat.status,
-                        flat.url,
-                        flat.area,
-                        flat.floor,
-                        flat.location,
-                        flat.type_id,
-                        flat.guid,
-                        flat.bulk_id,
-                        flat.section_id,
-                        flat.sale_scheme_id,
-                        flat.ceiling_height,
-                        flat.is_pre_sale,
-                        flat.rooms_fact,
-                        flat.number,
-                        flat.number_bti,
-                        flat.number_stage,
-                        flat.min_month_fee,
-                        flat.discount,
-                        flat.has_advertising_price,
-                        flat.has_new_price,
-                        flat.area_bti,
-                        flat.area_project,
-                        flat.callback,
-                        flat.kitchen_furniture,
-                        flat.booking_cost,
-                        flat.compass_angle,
-                        flat.booking_status,
-                        flat.pdf,
-                        flat.is_resell,
-                        now,
-                    ),
-                )
-            await conn.commit()
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.fence is not None:
+                    await self.fence.check(conn)
+                before = await snapshot_sources(conn, [*ids, *removed_ids])
+                feed_before = await cdc.snapshot(conn, [*ids, *removed_ids])
+                await delete_rows(conn, removed_ids)
+                # executemany: один переход в поток aiosqlite на всю пачку, а не на каждую строку
+                await write_rows(conn, [(*row, now) for row in rows])
+                after = await snapshot_sources(conn, ids)
+                groups = affected_groups(before, after)
+                await refresh_groups(conn, groups)
+                new_deals = await refresh_scores(conn, groups["bulk_id"])
+                events = await cdc.append_events(conn, feed_before, await cdc.snapshot(conn, ids), now, cutoff)
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+        if events:
+            self.changes.notify()
+        return new_deals
 
     async def delete_by_ids(self, ids: List[int]) -> None:
         """Удалить квартиры с заданными id из таблицы flats."""
@@ -152,12 +110,7 @@ class FlatRepository:
         if not ids:
             return  # Нечего удалять
 
-        placeholders = ",".join("?" * len(ids))
-        query = f"DELETE FROM flats WHERE id IN ({placeholders})"
-
-        async with aiosqlite.connect(self._settings.database_path) as conn:
-            await conn.execute(query, ids)
-            await conn.commit()
+        await self.apply_diff([], ids)
 
     async def select_cheapest(self, rooms: List[str], limit: int = 10) -> List[Flat]:
         placeholders = ",".join("?" * len(rooms))
@@ -183,6 +136,54 @@ class FlatRepository:
             for row in rows
         ]
 
+    async def select_page(
+        self,
+        category: str,
+        *,
+        after: Optional[Tuple[int, int]] = None,
+        before: Optional[Tuple[int, int]] = None,
+        limit: int = 10,
+    ) -> Tuple[List[Flat], bool]:
+        """Страница квартир категории `category` ('studio', 'one') по возрастанию цены.
+
+        Keyset-пагинация по (price, id): `after` — курсор последней строки
+        предыдущей страницы, `before` — первой строки следующей. Каждая страница —
+        поиск по индексу `idx_flats_category_price` без OFFSET, поэтому далёкие
+        страницы стоят столько же, сколько первая.
+        Возвращает квартиры и флаг «есть ещё» в направлении листания.
+        """
+
+        columns = "id, rooms, price, status, url, area, floor"
+        if before is not None:
+            query = (
+                f"SELECT {columns} FROM flats WHERE room_category = ? AND (price, id) < (?, ?) "
+                f"ORDER BY price DESC, id DESC LIMIT ?"
+            )
+            params: tuple = (category, *before, limit + 1)
+        elif after is not None:
+            query = (
+                f"SELECT {columns} FROM flats WHERE room_category = ? AND (price, id) > (?, ?) "
+                f"ORDER BY price ASC, id ASC LIMIT ?"
+            )
+            params = (category, *after, limit + 1)
+        else:
+            query = (
+                f"SELECT {columns} FROM flats WHERE room_category = ? "
+                f"ORDER BY price ASC, id ASC LIMIT ?"
+            )
+            params = (category, limit + 1)
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            cursor = await conn.execute(query, params)
+            rows = await cursor.fetchall()
+
+        has_more = len(rows) > limit
+        flats = [Flat(**dict(row)) for row in rows[:limit]]
+        if before is not None:
+            flats.reverse()
+        return flats, has_more
+
     async def count_by_rooms(self, rooms: List[str]) -> int:
         placeholders = ",".join("?" * len(rooms))
         query = f"SELECT COUNT(*) FROM flats WHERE rooms IN ({placeholders})"
@@ -202,18 +203,292 @@ class FlatRepository:
             rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
+    async def get_all_rows(self) -> List[tuple]:
+        """Вернуть все квартиры кортежами в порядке `FLAT_COLUMNS`.
+
+        Дешевле `get_all_flats`: строки не проходят валидацию pydantic, и их
+        можно без затрат передать в пул потоков/процессов (см. `bot.executor`).
+        """
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(f"SELECT {', '.join(FLAT_COLUMNS)} FROM flats")
+            return list(await cursor.fetchall())
+
+    async def iter_rows(
+        self, batch_size: int, columns: Tuple[str, ...] = FLAT_COLUMNS
+    ) -> AsyncIterator[List[tuple]]:
+        """Перебрать квартиры пачками по `batch_size` кортежей (по возрастанию id).
+
+        В памяти — не больше одной пачки, поэтому подходит для выгрузки
+        всей таблицы (см. `bot.export`).
+        """
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(f"SELECT {', '.join(columns)} FROM flats ORDER BY id")
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield list(rows)
+
     async def get_all_flats(self) -> List[Flat]:
         """Вернуть все квартиры из таблицы со всеми колонками."""
 
         async with aiosqlite.connect(self._settings.database_path) as conn:
             conn.row_factory = aiosqlite.Row  # позволит обращаться к столбцам по имени
-            cursor = await conn.execute("SELECT * FROM flats")
+            # `raw` не читаем: для diff и статистики он не нужен, а памяти занимает много
+            cursor = await conn.execute(f"SELECT {', '.join(FLAT_COLUMNS)} FROM flats")
+            rows = await cursor.fetchall()
+
+        return [Flat(**dict(row)) for row in rows]
+
+    async def select_by_attributes(
+        self,
+        *,
+        rooms: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        layout_id: Optional[int] = None,
+        layout_name: Optional[str] = None,
+        is_finish: Optional[bool] = None,
+        booking_period: Optional[int] = None,
+        benefit: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Flat]:
+        """Отобрать квартиры по вложенным полям исходного JSON.
+
+        Фильтры по планировке, отделке и сроку брони идут через индексированные
+        сгенерированные колонки; `benefit` ищется в массиве `benefits` по имени
+        или значению.
+        """
+
+        clauses: List[str] = []
+        params: List[Any] = []
+        if rooms:
+            clauses.append(f"rooms IN ({','.join('?' * len(rooms))})")
+            params.extend(rooms)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if layout_id is not None:
+            clauses.append("layout_id = ?")
+            params.append(layout_id)
+        if layout_name is not None:
+            clauses.append("layout_name = ?")
+            params.append(layout_name)
+        if is_finish is not None:
+            clauses.append("is_finish = ?")
+            params.append(int(is_finish))
+        if booking_period is not None:
+            clauses.append("booking_period = ?")
+            params.append(booking_period)
+        if benefit is not None:
+            clauses.append(
+                "EXISTS (SELECT 1 FROM json_each(flats.raw, '$.benefits') AS b "
+                "WHERE b.atom = ? OR (b.type = 'object' AND json_extract(b.value, '$.name') = ?))"
+            )
+            params.extend([benefit, benefit])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT {', '.join(FLAT_COLUMNS)} FROM flats {where} ORDER BY price ASC LIMIT ?"
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            cursor = await conn.execute(query, (*params, limit))
             rows = await cursor.fetchall()
 
-        flats: List[Flat] = []
+        return [Flat(**dict(row)) for row in rows]
+
+    async def get_rows_by_ids(self, ids: List[int]) -> List[tuple]:
+        """Как `get_all_rows`, но только для квартир `ids`."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(
+                f"SELECT {', '.join(FLAT_COLUMNS)} FROM flats WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(ids)),),
+            )
+            return list(await cursor.fetchall())
+
+    # --------------------------- watchlist ---------------------------------
+
+    async def add_watch(self, chat_id: int, flat_id: int) -> Optional[Flat]:
+        """Добавить квартиру в список отслеживания чата.
+
+        Возвращает квартиру или None, если такой квартиры нет в БД.
+        """
+
+        now = datetime.datetime.utcnow().isoformat()
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            cursor = await conn.execute(f"SELECT {', '.join(FLAT_COLUMNS)} FROM flats WHERE id = ?", (flat_id,))
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            await conn.execute(
+                "INSERT OR IGNORE INTO watchlist(chat_id, flat_id, added_at) VALUES(?, ?, ?)",
+                (chat_id, flat_id, now),
+            )
+            await conn.commit()
+        return Flat(**dict(row))
+
+    async def remove_watch(self, chat_id: int, flat_id: int) -> bool:
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(
+                "DELETE FROM watchlist WHERE chat_id = ? AND flat_id = ?", (chat_id, flat_id)
+            )
+            await conn.commit()
+            return cursor.rowcount > 0
+
+    async def count_watched(self, chat_id: int) -> int:
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM watchlist WHERE chat_id = ?", (chat_id,))
+            (count,) = await cursor.fetchone()
+        return count
+
+    async def get_watchlist(self, chat_id: int) -> List[Tuple[int, Optional[Flat]]]:
+        """Отслеживаемые чатом квартиры: (id, квартира или None, если пропала из продажи)."""
+
+        columns = ", ".join(f"f.{name}" for name in FLAT_COLUMNS)
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            cursor = await conn.execute(
+                f"SELECT w.flat_id AS watched_id, {columns} FROM watchlist w "
+                f"LEFT JOIN flats f ON f.id = w.flat_id WHERE w.chat_id = ? ORDER BY w.added_at, w.flat_id",
+                (chat_id,),
+            )
+            rows = await cursor.fetchall()
+
+        result: List[Tuple[int, Optional[Flat]]] = []
         for row in rows:
             data = dict(row)
-            data.pop("last_seen", None)  # это служебное поле, в модели его нет
-            flats.append(Flat(**data))
+            watched_id = data.pop("watched_id")
+            result.append((watched_id, Flat(**data) if data["id"] is not None else None))
+        return result
+
+    async def get_watchers(self) -> Dict[int, List[int]]:
+        """Все отслеживаемые квартиры: id квартиры → чаты."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute("SELECT flat_id, chat_id FROM watchlist ORDER BY flat_id")
+            rows = await cursor.fetchall()
+
+        watchers: Dict[int, List[int]] = {}
+        for flat_id, chat_id in rows:
+            watchers.setdefault(flat_id, []).append(chat_id)
+        return watchers
+
+    async def get_watch_state(self) -> Dict[int, Optional[Tuple[int, str]]]:
+        """Что видел быстрый опрос: id → (цена, статус); None — квартира пропала из продажи."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute("SELECT flat_id, price, status FROM watch_state")
+            rows = await cursor.fetchall()
+        return {fid: None if status is None else (price, status) for fid, price, status in rows}
+
+    async def save_watch_state(self, state: Dict[int, Optional[Tuple[int, str]]]) -> None:
+        """Запомнить результат быстрого опроса и забыть квартиры, которые больше никто не отслеживает."""
+
+        now = datetime.datetime.utcnow().isoformat()
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            await conn.executemany(
+                "INSERT OR REPLACE INTO watch_state(flat_id, price, status, seen_at) VALUES(?, ?, ?, ?)",
+                [(fid, *(seen or (None, None)), now) for fid, seen in state.items()],
+            )
+            await conn.execute("DELETE FROM watch_state WHERE flat_id NOT IN (SELECT flat_id FROM watchlist)")
+            await conn.commit()
 
-        return flats 
\ No newline at end of file
+    async def _get_search_conn(self) -> aiosqlite.Connection:
+        if self._search_conn is None:
+            self._search_conn = await aiosqlite.connect(self._settings.database_path)
+            self._search_conn.row_factory = aiosqlite.Row
+        return self._search_conn
+
+    async def explain(self, query: str, params: tuple) -> List[str]:
+        """Вернуть строки `EXPLAIN QUERY PLAN` для запроса."""
+
+        conn = await self._get_search_conn()
+        cursor = await conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row[3] for row in await cursor.fetchall()]
+
+    async def search(self, query: str, params: tuple) -> List[Flat]:
+        """Выполнить скомпилированный запрос `bot.search` (колонки как у `select_cheapest`)."""
+
+        conn = await self._get_search_conn()
+        cursor = await conn.execute(query, params)
+        rows = await cursor.fetchall()
+        await cursor.close()
+        return [Flat(**dict(row)) for row in rows]
+
+    async def get_events(self, after: int, limit: int) -> List[Tuple[int, str, str]]:
+        """События ленты `bot.cdc` с seq > `after`: (seq, op, строка JSON)."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(
+                f"SELECT seq, op, {cdc.EVENT_JSON_SQL} FROM cdc_events WHERE seq > ? ORDER BY seq LIMIT ?",
+                (after, limit),
+            )
+            return list(await cursor.fetchall())
+
+    async def first_event_seq(self) -> int:
+        """Самый старый seq ленты; если она пуста — seq следующего события."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute(
+                "SELECT COALESCE((SELECT MIN(seq) FROM cdc_events), "
+                "(SELECT seq FROM sqlite_sequence WHERE name = 'cdc_events') + 1, 1)"
+            )
+            (seq,) = await cursor.fetchone()
+        return seq
+
+    async def close(self) -> None:
+        """Закрыть долгоживущие соединения."""
+
+        if self._search_conn is not None:
+            await self._search_conn.close()
+            self._search_conn = None
+
+    async def get_aggregates(self, level: str) -> List[Dict[str, Any]]:
+        """Прочитать материализованные агрегаты: level — 'bulk', 'section' или 'layout'."""
+
+        table = {"bulk": "agg_bulk", "section": "agg_section", "layout": "agg_layout"}[level]
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            cursor = await conn.execute(f"SELECT * FROM {table} ORDER BY min_price IS NULL, min_price")
+            rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    async def get_deals(
+        self,
+        *,
+        ids: Optional[List[int]] = None,
+        category: Optional[str] = None,
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """Квартиры с лучшей ценой за м² относительно соседей (по возрастанию score)."""
+
+        clauses: List[str] = []
+        params: List[Any] = []
+        if ids is not None:
+            clauses.append("d.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(ids))
+        if category is not None:
+            clauses.append("d.room_category = ?")
+            params.append(category)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT d.*, f.price, f.area, f.area_project, f.floor, f.url FROM deal_scores AS d "
+            f"JOIN flats AS f ON f.id = d.id {where} ORDER BY d.score ASC LIMIT ?"
+        )
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            cursor = await conn.execute(query, (*params, limit))
+            rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    async def get_raw_item(self, flat_id: int) -> Optional[Dict[str, Any]]:
+        """Вернуть исходный объект квартиры из ответа API, если он сохранён."""
+
+        async with aiosqlite.connect(self._settings.database_path) as conn:
+            cursor = await conn.execute("SELECT raw FROM flats WHERE id = ?", (flat_id,))
+            row = await cursor.fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0]) 
\ No newline at end of file
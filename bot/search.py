@@ -0,0 +1,223 @@
+"""Разбор и компиляция фильтров команды `/find`.
+
+Фильтр — набор условий через пробел или запятую::
+
+    1-к. этаж 10-20 площадь>=38 цена<=12м свободные секция 22414
+
+Условия компилируются в параметризованный SQL. Текст запроса зависит только
+от «формы» фильтра (какие поля и операторы), поэтому он и вердикт по плану
+запроса кэшируются по форме, а значения идут параметрами.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from bot.models import Flat
+from bot.repository import FlatRepository
+
+MAX_RESULTS = 20
+
+
+class SearchError(ValueError):
+    """Фильтр не удалось разобрать или он слишком дорогой для выполнения."""
+
+
+class Condition(NamedTuple):
+    column: str
+    op: str  # '=', '>=', '<=', '>', '<', 'between'
+    value: Any
+
+
+class CompiledQuery(NamedTuple):
+    shape: Tuple[Tuple[str, str], ...]
+    sql: str
+    params: Tuple[Any, ...]
+
+
+# синонимы ключей → колонка и тип значения
+_KEYS: Dict[str, Tuple[str, str]] = {
+    "price": ("price", "money"),
+    "цена": ("price", "money"),
+    "area": ("area", "float"),
+    "площадь": ("area", "float"),
+    "floor": ("floor", "int"),
+    "этаж": ("floor", "int"),
+    "section": ("section_id", "int"),
+    "секция": ("section_id", "int"),
+    "bulk": ("bulk_id", "int"),
+    "корпус": ("bulk_id", "int"),
+    "layout": ("layout_name", "str"),
+    "планировка": ("layout_name", "str"),
+    "rooms": ("room_category", "rooms"),
+    "комнат": ("room_category", "rooms"),
+    "status": ("status", "str"),
+    "статус": ("status", "str"),
+    "finish": ("is_finish", "bool"),
+    "отделка": ("is_finish", "bool"),
+}
+
+# условия без значения
+_FLAGS: Dict[str, Condition] = {
+    "free": Condition("status", "=", "free"),
+    "свободные": Condition("status", "=", "free"),
+    "свободно": Condition("status", "=", "free"),
+    "reserve": Condition("status", "=", "reserve"),
+    "бронь": Condition("status", "=", "reserve"),
+    "studio": Condition("room_category", "=", "studio"),
+    "студия": Condition("room_category", "=", "studio"),
+    "студии": Condition("room_category", "=", "studio"),
+}
+
+_OPS = {">=", "<=", ">", "<", "=", ":"}
+_ROOMS_FLAG = re.compile(r"^(\d)-?к\.?$")
+_TOKEN = re.compile(r">=|<=|[=<>:]|[^\s,=<>:]+")
+
+# Порядок колонок в SQL: сначала те, с которых начинаются индексы
+_COLUMN_ORDER = (
+    "room_category",
+    "section_id",
+    "bulk_id",
+    "layout_name",
+    "status",
+    "is_finish",
+    "floor",
+    "area",
+    "price",
+)
+
+
+def _parse_number(raw: str, kind: str) -> float:
+    text = raw.replace(",", ".").rstrip(".")
+    multiplier = 1
+    if kind == "money":
+        for suffix, mult in (("млн", 1_000_000), ("м", 1_000_000), ("m", 1_000_000), ("k", 1_000), ("к", 1_000)):
+            if text.endswith(suffix):
+                text, multiplier = text[: -len(suffix)], mult
+                break
+    try:
+        value = float(text) * multiplier
+    except ValueError:
+        raise SearchError(f"Не число: {raw}") from None
+    return value if kind == "float" else int(value)
+
+
+def _parse_value(raw: str, kind: str) -> Any:
+    if kind == "rooms":
+        if raw in {"0", "studio", "студия"}:
+            return "studio"
+        return "one" if raw == "1" else raw
+    if kind == "bool":
+        if raw in {"yes", "да", "1", "true", "есть"}:
+            return 1
+        if raw in {"no", "нет", "0", "false"}:
+            return 0
+        raise SearchError(f"Ожидалось да/нет: {raw}")
+    if kind == "str":
+        return raw
+    return _parse_number(raw, kind)
+
+
+def parse_filter(text: str) -> List[Condition]:
+    """Разобрать текст фильтра в список условий."""
+
+    normalized = text.replace("≥", ">=").replace("≤", "<=").replace("–", "-").replace("—", "-")
+    # регистр важен только для строковых значений (например, имени планировки)
+    original = _TOKEN.findall(normalized)
+    tokens = [t.lower() for t in original]
+    conditions: List[Condition] = []
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+
+        if token in _FLAGS:
+            conditions.append(_FLAGS[token])
+            continue
+        match = _ROOMS_FLAG.match(token)
+        if match:
+            rooms = match.group(1)
+            conditions.append(Condition("room_category", "=", "one" if rooms == "1" else rooms))
+            continue
+        if token not in _KEYS:
+            raise SearchError(f"Непонятное условие: {token}")
+
+        column, kind = _KEYS[token]
+        op = "="
+        if i < len(tokens) and tokens[i] in _OPS:
+            op = "=" if tokens[i] == ":" else tokens[i]
+            i += 1
+        if i >= len(tokens):
+            raise SearchError(f"Не указано значение для «{token}»")
+        raw = original[i] if kind == "str" and column != "status" else tokens[i]
+        i += 1
+
+        # диапазон: этаж 10-20 или этаж 10..20
+        bounds = re.split(r"\.\.|-", raw) if kind in {"int", "float", "money"} else [raw]
+        if len(bounds) == 2 and op == "=":
+            low, high = (_parse_value(b, kind) for b in bounds)
+            conditions.append(Condition(column, "between", (low, high)))
+        else:
+            conditions.append(Condition(column, op, _parse_value(raw, kind)))
+
+    if not conditions:
+        raise SearchError("Пустой фильтр")
+    return conditions
+
+
+def compile_filter(conditions: List[Condition]) -> CompiledQuery:
+    """Скомпилировать условия в параметризованный SQL."""
+
+    ordered = sorted(conditions, key=lambda c: (_COLUMN_ORDER.index(c.column), c.op))
+    clauses: List[str] = []
+    params: List[Any] = []
+    for cond in ordered:
+        if cond.op == "between":
+            clauses.append(f"{cond.column} BETWEEN ? AND ?")
+            params.extend(cond.value)
+        else:
+            clauses.append(f"{cond.column} {cond.op} ?")
+            params.append(cond.value)
+
+    shape = tuple((c.column, c.op) for c in ordered)
+    sql = (
+        f"SELECT id, rooms, price, status, url, area, floor FROM flats "
+        f"WHERE {' AND '.join(clauses)} ORDER BY price ASC, id ASC LIMIT ?"
+    )
+    return CompiledQuery(shape, sql, tuple(params))
+
+
+class FlatSearch:
+    """Выполняет фильтры `/find` с кэшем скомпилированных запросов и планов."""
+
+    def __init__(self, repo: FlatRepository):
+        self._repo = repo
+        # форма фильтра → None (план с поиском по индексу) или причина отказа
+        self._plans: Dict[Tuple[Tuple[str, str], ...], Optional[str]] = {}
+
+    async def _check_plan(self, query: CompiledQuery) -> Optional[str]:
+        """Вернуть причину отказа, если запрос требует полного просмотра таблицы."""
+
+        if query.shape in self._plans:
+            return self._plans[query.shape]
+
+        details = await self._repo.explain(query.sql, (*query.params, MAX_RESULTS + 1))
+        rejected: Optional[str] = None
+        if not any(d.startswith("SEARCH flats") for d in details):
+            rejected = (
+                "Фильтр слишком общий — он требует просмотра всей таблицы. "
+                "Добавьте комнатность (студия, 1-к.), секцию, корпус или планировку."
+            )
+        self._plans[query.shape] = rejected
+        return rejected
+
+    async def find(self, text: str) -> Tuple[List[Flat], bool]:
+        """Выполнить фильтр; вернуть до `MAX_RESULTS` квартир и флаг «есть ещё»."""
+
+        query = compile_filter(parse_filter(text))
+        rejected = await self._check_plan(query)
+        if rejected is not None:
+            raise SearchError(rejected)
+
+        flats = await self._repo.search(query.sql, (*query.params, MAX_RESULTS + 1))
+        return flats[:MAX_RESULTS], len(flats) > MAX_RESULTS
@@ -1,186 +1,322 @@
+import asyncio
+import json
 import logging
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from bot.archive import ResponseArchive
+from bot.executor import CpuExecutor, drop_raw, pack_flats, unpack_flats
+from bot.governor import Priority
 from bot.models import Flat
-from bot.pik_api_client import PIKApiClient
+from bot.pik_api_client import PIKApiClient, parse_flats, unwrap_items
 from bot.repository import FlatRepository
 
 logger = logging.getLogger(__name__)
 
 
+# --------------------------- utils -------------------------------------
+#
+# Функции ниже не трогают event loop и состояние сервиса, поэтому их можно
+# выполнять в пуле потоков или процессов (см. `CpuExecutor`).
+
+
+def is_studio(flat: Flat) -> bool:
+    return str(flat.rooms) in {"0", "studio", "студия"}
+
+
+def is_one(flat: Flat) -> bool:
+    return str(flat.rooms) == "1"
+
+
+def price_fmt(price: int) -> str:
+    return f"{price / 1_000_000:.2f} млн"
+
+
+# Поля модели Flat, изменения которых попадают в отчёт
+FIELDS_TO_CHECK: Tuple[str, ...] = (
+    "price",
+    "status",
+    "area",
+    "floor",
+    "rooms",
+    "url",
+    "location",
+    "type_id",
+    "guid",
+    "bulk_id",
+    "section_id",
+    "sale_scheme_id",
+    "ceiling_height",
+    "is_pre_sale",
+    "rooms_fact",
+    "number",
+    "number_bti",
+    "number_stage",
+    "min_month_fee",
+    "discount",
+    "has_advertising_price",
+    "has_new_price",
+    "area_bti",
+    "area_project",
+    "callback",
+    "kitchen_furniture",
+    "compass_angle",
+    "is_resell",
+)
+
+
+def build_stats_lines(flats: List[Flat], *, include_links: bool = False) -> List[str]:
+    """Сформировать блок статистики и топ-3 цен."""
+
+    studio_free = sum(1 for f in flats if is_studio(f) and f.status == "free")
+    studio_reserved = sum(1 for f in flats if is_studio(f) and f.status != "free")
+
+    one_free = sum(1 for f in flats if is_one(f) and f.status == "free")
+    one_reserved = sum(1 for f in flats if is_one(f) and f.status != "free")
+
+    # Берём объекты, чтобы можно было использовать ссылки при необходимости
+    cheapest_studios = (
+        sorted(
+            (f for f in flats if is_studio(f) and f.status == "free"),
+            key=lambda x: x.price,
+        )[:3]
+    )
+    cheapest_ones = (
+        sorted(
+            (f for f in flats if is_one(f) and f.status == "free"),
+            key=lambda x: x.price,
+        )[:3]
+    )
+
+    number_emojis = ["1️⃣", "2️⃣", "3️⃣"]
+
+    lines: List[str] = ["\n📊 <b>Статистика</b>"]
+    lines.extend(
+        [
+            f"• 🏠 Студии: <b>{studio_free}</b> свободно (бронь {studio_reserved})",
+            f"• 🚪 1-к.: <b>{one_free}</b> свободно (бронь {one_reserved})",
+        ]
+    )
+
+    if cheapest_studios:
+        lines.append("\n💸 <b>Топ-3 дешёвых студий (свободные)</b>")
+        for idx, flat in enumerate(cheapest_studios):
+            price_part = (
+                f"<a href=\"{flat.url}\">{price_fmt(flat.price)}</a>"
+                if include_links and flat.url
+                else price_fmt(flat.price)
+            )
+            lines.append(f"{number_emojis[idx]} {price_part}")
+
+    if cheapest_ones:
+        lines.append("\n💸 <b>Топ-3 дешёвых 1-к. (свободные)</b>")
+        for idx, flat in enumerate(cheapest_ones):
+            price_part = (
+                f"<a href=\"{flat.url}\">{price_fmt(flat.price)}</a>"
+                if include_links and flat.url
+                else price_fmt(flat.price)
+            )
+            lines.append(f"{number_emojis[idx]} {price_part}")
+
+    return lines
+
+
+def compute_diff(old_flats: List[Flat], new_flats: List[Flat]) -> Tuple[List[str], List[int]]:
+    """Сравнить два состояния и вернуть строки отчёта и id пропавших квартир."""
+
+    old_map: Dict[int, Flat] = {f.id: f for f in old_flats}
+    new_map: Dict[int, Flat] = {f.id: f for f in new_flats}
+
+    diff_lines: List[str] = []
+
+    # --- добавленные и удалённые квартиры ----
+    added_ids = new_map.keys() - old_map.keys()
+    removed_ids = old_map.keys() - new_map.keys()
+
+    for fid in sorted(added_ids):
+        f = new_map[fid]
+        apartment_link = f"<a href=\"{f.url}\">#{f.id}</a>" if f.url else f"#{f.id}"
+        room_type = "студия" if is_studio(f) else "1-к."
+        diff_lines.append(
+            f"➕ Добавлена квартира {apartment_link} ({room_type}): {price_fmt(f.price)}, этаж {f.floor}, статус {f.status}"
+        )
+
+    for fid in sorted(removed_ids):
+        f = old_map[fid]
+        apartment_link = f"<a href=\"{f.url}\">#{f.id}</a>" if f.url else f"#{f.id}"
+        room_type = "студия" if is_studio(f) else "1-к."
+        diff_lines.append(
+            f"➖ Удалена квартира {apartment_link} ({room_type}): была {price_fmt(f.price)}, этаж {f.floor}, статус {f.status}"
+        )
+
+    # --- изменения параметров ----
+    common_ids = new_map.keys() & old_map.keys()
+    for fid in sorted(common_ids):
+        old = old_map[fid]
+        new = new_map[fid]
+        for field in FIELDS_TO_CHECK:
+            old_val = getattr(old, field)
+            new_val = getattr(new, field)
+            if old_val != new_val:
+                if field == "price":
+                    old_val_fmt = price_fmt(old_val)
+                    new_val_fmt = price_fmt(new_val)
+                else:
+                    old_val_fmt = old_val
+                    new_val_fmt = new_val
+
+                # Создаём ссылку на квартиру
+                apartment_link = f"<a href=\"{new.url}\">#{fid}</a>" if new.url else f"#{fid}"
+                room_type = "студия" if is_studio(new) else "1-к."
+                diff_lines.append(
+                    f"✏️ Квартира {apartment_link} ({room_type}): {field} {old_val_fmt} → {new_val_fmt}"
+                )
+
+    return diff_lines, sorted(removed_ids)
+
+
+def watch_diff(old_map: Dict[int, Flat], new_map: Dict[int, Flat]) -> List[Tuple[int, str]]:
+    """Изменения цены и статуса отслеживаемых квартир: (id, строка уведомления)."""
+
+    notes: List[Tuple[int, str]] = []
+    for fid in sorted(old_map):
+        old = old_map[fid]
+        new = new_map.get(fid)
+        room_type = "студия" if is_studio(old) else "1-к."
+        link = f"<a href=\"{old.url}\">#{fid}</a>" if old.url else f"#{fid}"
+        if new is None:
+            notes.append((fid, f"❌ {link} ({room_type}): пропала из продажи, была {price_fmt(old.price)}"))
+            continue
+        if new.price != old.price:
+            change = (new.price - old.price) / old.price * 100 if old.price else 0
+            icon = "📉" if new.price < old.price else "📈"
+            notes.append(
+                (fid, f"{icon} {link} ({room_type}): {price_fmt(old.price)} → {price_fmt(new.price)} ({change:+.1f}%)")
+            )
+        if new.status != old.status:
+            notes.append((fid, f"🔁 {link} ({room_type}): статус {old.status} → {new.status}"))
+    return notes
+
+
+def deal_lines(deals: List[Dict[str, Any]]) -> List[str]:
+    """Строки списка выгодных предложений (строки из `FlatRepository.get_deals`)."""
+
+    lines: List[str] = []
+    for deal in deals:
+        room_type = "студия" if deal["room_category"] == "studio" else "1-к."
+        below = (1 - deal["ppm"] / deal["median_ppm"]) * 100
+        area = deal["area"] or deal["area_project"]
+        link = f"<a href=\"{deal['url']}\">#{deal['id']}</a>" if deal["url"] else f"#{deal['id']}"
+        lines.append(
+            f"• {link} ({room_type}, {area} м², этаж {deal['floor']}): {price_fmt(deal['price'])} · "
+            f"{deal['ppm'] / 1000:.0f} тыс/м², на {below:.0f}% ниже медианы "
+            f"{deal['peer_count']} соседей (перцентиль {deal['percentile'] * 100:.0f})"
+        )
+    return lines
+
+
+# --- задачи для пула: принимают и возвращают кортежи вместо моделей --------
+
+
+def _decode_job(body: bytes) -> List[tuple]:
+    """Разобрать тело ответа API: студии и 1-к. кортежами.
+
+    Возвращаются только кортежи: «сырые» объекты в режиме ``process`` пришлось
+    бы целиком сериализовать обратно в event loop.
+    """
+
+    flats = [f for f in parse_flats(unwrap_items(json.loads(body))) if is_studio(f) or is_one(f)]
+    return pack_flats(flats)
+
+
+def _diff_job(old_rows: List[tuple], new_rows: List[tuple]) -> Tuple[List[str], List[int]]:
+    return compute_diff(unpack_flats(old_rows), unpack_flats(new_rows))
+
+
+def _stats_job(rows: List[tuple], include_links: bool) -> List[str]:
+    return build_stats_lines(unpack_flats(rows), include_links=include_links)
+
+
 class MonitorService:
     """Отвечает за обновление данных и формирование отчёта."""
 
-    def __init__(self, repo: FlatRepository):
+    def __init__(
+        self,
+        repo: FlatRepository,
+        archive: Optional[ResponseArchive] = None,
+        executor: Optional[CpuExecutor] = None,
+    ):
         self._repo = repo
+        self._archive = archive
+        self._executor = executor or CpuExecutor()
+        # обновления (ручные /update и по расписанию) могут идти одновременно;
+        # diff и запись в БД должны видеть результат предыдущего обновления
+        self._update_lock = asyncio.Lock()
+        # быстрый опрос `/watch` не пишет во flats и не ждёт обычного обновления
+        self._watch_lock = asyncio.Lock()
+        # уведомления `/watch` по ответам обычного обновления, ещё не отправленные
+        self._watch_notes: Dict[int, List[str]] = {}
+
+    @property
+    def archive(self) -> Optional[ResponseArchive]:
+        return self._archive
+
+    @property
+    def executor(self) -> CpuExecutor:
+        return self._executor
 
     # --------------------------- utils ---------------------------------
 
     @staticmethod
     def _is_studio(flat: Flat) -> bool:
-        return str(flat.rooms) in {"0", "studio", "студия"}
+        return is_studio(flat)
 
     @staticmethod
     def _is_one(flat: Flat) -> bool:
-        return str(flat.rooms) == "1"
+        return is_one(flat)
 
     @staticmethod
     def _price_fmt(price: int) -> str:
-        return f"{price / 1_000_000:.2f} млн"
+        return price_fmt(price)
 
     # -------------------------------------------------------------------
 
     def _build_stats_lines(self, flats: List[Flat], *, include_links: bool = False) -> List[str]:
         """Сформировать блок статистики и топ-3 цен."""
 
-        studio_free = sum(1 for f in flats if self._is_studio(f) and f.status == "free")
-        studio_reserved = sum(1 for f in flats if self._is_studio(f) and f.status != "free")
-
-        one_free = sum(1 for f in flats if self._is_one(f) and f.status == "free")
-        one_reserved = sum(1 for f in flats if self._is_one(f) and f.status != "free")
-
-        # Берём объекты, чтобы можно было использовать ссылки при необходимости
-        cheapest_studios = (
-            sorted(
-                (f for f in flats if self._is_studio(f) and f.status == "free"),
-                key=lambda x: x.price,
-            )[:3]
-        )
-        cheapest_ones = (
-            sorted(
-                (f for f in flats if self._is_one(f) and f.status == "free"),
-                key=lambda x: x.price,
-            )[:3]
-        )
-
-        number_emojis = ["1️⃣", "2️⃣", "3️⃣"]
-
-        lines: List[str] = ["\n📊 <b>Статистика</b>"]
-        lines.extend(
-            [
-                f"• 🏠 Студии: <b>{studio_free}</b> свободно (бронь {studio_reserved})",
-                f"• 🚪 1-к.: <b>{one_free}</b> свободно (бронь {one_reserved})",
-            ]
-        )
-
-        if cheapest_studios:
-            lines.append("\n💸 <b>Топ-3 дешёвых студий (свободные)</b>")
-            for idx, flat in enumerate(cheapest_studios):
-                price_part = (
-                    f"<a href=\"{flat.url}\">{self._price_fmt(flat.price)}</a>"
-                    if include_links and flat.url
-                    else self._price_fmt(flat.price)
-                )
-                lines.append(f"{number_emojis[idx]} {price_part}")
-
-        if cheapest_ones:
-            lines.append("\n💸 <b>Топ-3 дешёвых 1-к. (свободные)</b>")
-            for idx, flat in enumerate(cheapest_ones):
-                price_part = (
-                    f"<a href=\"{flat.url}\">{self._price_fmt(flat.price)}</a>"
-                    if include_links and flat.url
-                    else self._price_fmt(flat.price)
-                )
-                lines.append(f"{number_emojis[idx]} {price_part}")
-
-        return lines
+        return build_stats_lines(flats, include_links=include_links)
 
     async def stats_text(self, *, include_links: bool = False) -> str:
         """Публичный метод: вернуть текст статистики по данным в БД."""
 
-        flats = await self._repo.get_all_flats()
-        return "\n".join(self._build_stats_lines(flats, include_links=include_links))
+        rows = await self._repo.get_all_rows()
+        lines = await self._executor.run(_stats_job, rows, include_links)
+        return "\n".join(lines)
 
     async def _process_flats(self, new_flats: List[Flat]) -> str:
         """Сравнить `new_flats` с состоянием БД и вернуть отчёт."""
 
-        # Текущее состояние в БД до обновления
-        old_flats = await self._repo.get_all_flats()
-        old_map: Dict[int, Flat] = {f.id: f for f in old_flats}
-        new_map: Dict[int, Flat] = {f.id: f for f in new_flats}
-
-        diff_lines: List[str] = []
+        return await self._process_rows(pack_flats(new_flats))
 
-        # --- добавленные и удалённые квартиры ----
-        added_ids = new_map.keys() - old_map.keys()
-        removed_ids = old_map.keys() - new_map.keys()
+    async def _process_rows(self, new_rows: List[tuple]) -> str:
+        """То же, что `_process_flats`, для квартир, упакованных `pack_flats`."""
 
-        for fid in sorted(added_ids):
-            f = new_map[fid]
-            apartment_link = f"<a href=\"{f.url}\">#{f.id}</a>" if f.url else f"#{f.id}"
-            room_type = "студия" if self._is_studio(f) else "1-к."
-            diff_lines.append(
-                f"➕ Добавлена квартира {apartment_link} ({room_type}): {self._price_fmt(f.price)}, этаж {f.floor}, статус {f.status}"
-            )
+        # diff и статистике «сырой» JSON не нужен: он остаётся в event loop для записи в БД
+        report_rows = drop_raw(new_rows)
+        async with self._update_lock:
+            # Текущее состояние в БД до обновления
+            old_rows = await self._repo.get_all_rows()
+            diff_lines, removed_ids = await self._executor.run(_diff_job, old_rows, report_rows)
 
-        for fid in sorted(removed_ids):
-            f = old_map[fid]
-            apartment_link = f"<a href=\"{f.url}\">#{f.id}</a>" if f.url else f"#{f.id}"
-            room_type = "студия" if self._is_studio(f) else "1-к."
-            diff_lines.append(
-                f"➖ Удалена квартира {apartment_link} ({room_type}): была {self._price_fmt(f.price)}, этаж {f.floor}, статус {f.status}"
-            )
+            # --- Удаляем пропавшие квартиры и обновляем БД одной транзакцией
+            # (кортежи `pack_flats` идут в том же порядке, что и колонки INSERT)
+            new_deals = await self._repo.apply_diff(new_rows, removed_ids)
 
-        # --- физически удаляем отсутствующие квартиры из БД ----
-        if removed_ids:
-            await self._repo.delete_by_ids(list(removed_ids))
-
-        # --- изменения параметров ----
-        common_ids = new_map.keys() & old_map.keys()
-        # Проверяем некоторые поля модели Flat
-        fields_to_check: Tuple[str, ...] = (
-            "price",
-            "status",
-            "area",
-            "floor",
-            "rooms",
-            "url",
-            "location",
-            "type_id",
-            "guid",
-            "bulk_id",
-            "section_id",
-            "sale_scheme_id",
-            "ceiling_height",
-            "is_pre_sale",
-            "rooms_fact",
-            "number",
-            "number_bti",
-            "number_stage",
-            "min_month_fee",
-            "discount",
-            "has_advertising_price",
-            "has_new_price",
-            "area_bti",
-            "area_project",
-            "callback",
-            "kitchen_furniture",
-            "compass_angle",
-            "is_resell",
-        )
-        for fid in sorted(common_ids):
-            old = old_map[fid]
-            new = new_map[fid]
-            for field in fields_to_check:
-                old_val = getattr(old, field)
-                new_val = getattr(new, field)
-                if old_val != new_val:
-                    if field == "price":
-                        old_val_fmt = self._price_fmt(old_val)
-                        new_val_fmt = self._price_fmt(new_val)
-                    else:
-                        old_val_fmt = old_val
-                        new_val_fmt = new_val
-                    
-                    # Создаём ссылку на квартиру
-                    apartment_link = f"<a href=\"{new.url}\">#{fid}</a>" if new.url else f"#{fid}"
-                    room_type = "студия" if self._is_studio(new) else "1-к."
-                    diff_lines.append(
-                        f"✏️ Квартира {apartment_link} ({room_type}): {field} {old_val_fmt} → {new_val_fmt}"
-                    )
-
-        # --- Обновляем БД свежими данными (insert/update)
-        await self._repo.upsert_many(new_flats)
+        # тот же ответ проверяет и отслеживаемые квартиры: быстрый опрос идёт
+        # между обычными, и каждый запрос к API служит обоим (см. `take_watch_notes`)
+        watchers = await self._repo.get_watchers()
+        if watchers:
+            for chat_id, lines in (await self._process_watched_rows(watchers, new_rows)).items():
+                self._watch_notes.setdefault(chat_id, []).extend(lines)
 
         # Если изменений нет – краткое сообщение
         if not diff_lines:
@@ -191,25 +327,99 @@ class MonitorService:
         summary_lines.append("\n📝 <b>Изменения с последней проверки:</b>")
         summary_lines.extend(diff_lines)
 
+        # квартиры, которые после этого diff впервые стали выгодными
+        if new_deals:
+            deals = await self._repo.get_deals(ids=new_deals, limit=len(new_deals))
+            summary_lines.append("\n🔥 <b>Новые выгодные предложения (цена за м²)</b>")
+            summary_lines.extend(deal_lines(deals))
+
         # добавляем статистику и топ с ссылками
-        summary_lines.extend(self._build_stats_lines(new_flats, include_links=True))
+        summary_lines.extend(await self._executor.run(_stats_job, report_rows, True))
 
         return "\n".join(summary_lines)
 
     # --------------------------- public API ----------------------------
 
-    async def update_from_api(self) -> str:
-        """Скачивает данные с API, формирует diff, обновляет БД."""
+    async def update_from_api(self, priority: Priority = Priority.SCHEDULED) -> str:
+        """Скачивает данные с API, формирует diff, обновляет БД.
+
+        `priority` — приоритет запроса в общем лимите (см. `bot.governor`).
+        """
+
+        async with PIKApiClient(priority) as client:
+            body = await client.fetch_body()
+
+        # Декодирование JSON и маппинг в модели — вне event loop
+        new_rows = await self._executor.run(_decode_job, body)
+
+        # Сохраняем ответ целиком: архив сам разбирает тело в своём потоке
+        if self._archive is not None:
+            await self._archive.save_body(body)
+
+        return await self._process_rows(new_rows)
+
+    def take_watch_notes(self) -> Dict[int, List[str]]:
+        """Забрать уведомления `/watch`, найденные обычным обновлением."""
+
+        notes, self._watch_notes = self._watch_notes, {}
+        return notes
+
+    async def _process_watched_rows(self, watchers: Dict[int, List[int]], new_rows: List[tuple]) -> Dict[int, List[str]]:
+        """Сравнить только отслеживаемые квартиры; вернуть chat_id → строки уведомлений.
+
+        Сравнение идёт с тем, что видел прошлый быстрый опрос (`watch_state`), а
+        для новых в списке квартир — с flats. Сама flats не меняется: изменения,
+        удаления и новые выгодные предложения попадут в отчёт обычного обновления.
+        """
+
+        new_rows = [row for row in new_rows if row[0] in watchers]
+        async with self._watch_lock:
+            state = await self._repo.get_watch_state()
+            old_map: Dict[int, Flat] = {}
+            for flat in unpack_flats(await self._repo.get_rows_by_ids(list(watchers))):
+                seen = state.get(flat.id, (flat.price, flat.status))
+                if seen is None:
+                    continue  # об исчезновении уже сообщили
+                old_map[flat.id] = flat.model_copy(update={"price": seen[0], "status": seen[1]})
+            new_map = {f.id: f for f in unpack_flats(new_rows)}
+            notes = watch_diff(old_map, new_map)
+
+            new_state: Dict[int, Optional[Tuple[int, str]]] = {fid: (f.price, f.status) for fid, f in new_map.items()}
+            new_state.update({fid: None for fid in old_map.keys() - new_map.keys()})
+            await self._repo.save_watch_state(new_state)
+
+        by_chat: Dict[int, List[str]] = {}
+        for fid, line in notes:
+            for chat_id in watchers[fid]:
+                by_chat.setdefault(chat_id, []).append(line)
+        return by_chat
+
+    async def update_watched(self) -> Dict[int, List[str]]:
+        """Быстрый опрос: проверить только отслеживаемые квартиры.
+
+        Один запрос к API на вызов; если никто ничего не отслеживает — ни одного.
+        """
+
+        watchers = await self._repo.get_watchers()
+        if not watchers:
+            return {}
+
+        async with PIKApiClient(Priority.WATCH) as client:
+            body = await client.fetch_body()
+        new_rows = await self._executor.run(_decode_job, body)
+        return await self._process_watched_rows(watchers, new_rows)
+
+    async def update_watched_from_list(self, flats: List[Flat]) -> Dict[int, List[str]]:
+        """То же, что `update_watched`, но принимает готовый список квартир."""
 
-        async with PIKApiClient() as client:
-            all_flats = await client.fetch_flats()
-            # Фильтруем только студии и 1-комнатные
-            new_flats = [f for f in all_flats if self._is_studio(f) or self._is_one(f)]
-        return await self._process_flats(new_flats)
+        watchers = await self._repo.get_watchers()
+        if not watchers:
+            return {}
+        return await self._process_watched_rows(watchers, pack_flats(flats))
 
     async def update_from_list(self, flats: List[Flat]) -> str:
         """То же самое, но принимает готовый список квартир."""
 
         # Фильтруем только студии и 1-комнатные
         filtered_flats = [f for f in flats if self._is_studio(f) or self._is_one(f)]
-        return await self._process_flats(filtered_flats) 
\ No newline at end of file
+        return await self._process_flats(filtered_flats)
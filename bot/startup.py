@@ -0,0 +1,50 @@
+import contextlib
+import time
+from typing import Awaitable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class StartupProfile:
+    """Замеры фаз запуска бота.
+
+    Фазы могут идти параллельно, поэтому в отчёте кроме длительности каждой фазы
+    есть общее время от старта процесса до готовности.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        self._started = time.perf_counter() if started is None else started
+        self._phases: List[Tuple[str, float]] = []
+
+    def mark(self, name: str) -> None:
+        """Записать фазу, длившуюся от старта до текущего момента."""
+
+        self._phases.append((name, time.perf_counter() - self._started))
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases.append((name, time.perf_counter() - start))
+
+    async def track(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Дождаться `awaitable`, записав время его выполнения как фазу `name`."""
+
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._phases.append((name, time.perf_counter() - start))
+
+    @property
+    def phases(self) -> List[Tuple[str, float]]:
+        return list(self._phases)
+
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+
+    def report(self) -> str:
+        parts = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self._phases)
+        return f"Startup finished in {self.total() * 1000:.0f} ms ({parts})"
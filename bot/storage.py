@@ -0,0 +1,202 @@
+"""Нормализованное хранение квартир.
+
+Физически квартиры лежат в `flat_rows`. `flats` — представление с прежним
+набором колонок, поэтому читающие запросы (`bot.repository`, `bot.search`,
+`bot.aggregates`, `bot.deals`) не меняются. В строке не повторяется то, что
+можно восстановить:
+
+* `status` и `booking_status` — ссылки на словарь `flat_statuses`;
+* `url` и `pdf` не хранятся, если совпадают с шаблоном по id квартиры и
+  корпусу: от pdf остаётся только версия (`?v=`), а проект корпуса — в `bulks`;
+* из `raw` убраны `url`, `pdf` (восстанавливаются так же, `raw_stripped`
+  помнит, какие из них были в объекте) и `layout` — объект планировки общий
+  для всех её квартир и лежит в `layouts`.
+
+Значения, не подходящие под шаблон, хранятся как есть, так что представление
+всегда отдаёт то же, что было записано. Схему создают миграции 10 и 13
+(`bot.migrations`), а писать нужно через `write_rows` и `delete_rows` — в
+транзакции вызывающего.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiosqlite
+
+from bot.models import Flat
+
+# Колонки `flats`, соответствующие полям модели (кроме «сырого» JSON)
+FLAT_COLUMNS: Tuple[str, ...] = tuple(name for name in Flat.model_fields if name != "raw")
+
+# Порядок значений в строках `write_rows` (плюс `last_seen` в конце) —
+# совпадает с порядком полей модели
+UPSERT_FIELDS: Tuple[str, ...] = (*FLAT_COLUMNS, "raw")
+
+URL_PREFIX = "https://www.pik.ru/yauza/flats/"
+PDF_PREFIX = "https://pdf.pik.ru/flat/"
+_PDF_RE = re.compile(r"https://pdf\.pik\.ru/flat/(\d+)/(\d+)/(\d+)\.pdf\?v=(\d+)")
+
+# Колонки `flats`, которые в `flat_rows` хранятся в другом виде
+_ENCODED = {"status": "status_id", "booking_status": "booking_status_id"}
+
+# Колонки, производные от `raw`: меняются только вместе с ним
+_RAW_COLUMNS: Tuple[str, ...] = ("layout_id", "raw", "raw_stripped")
+
+# Биты `raw_stripped`: какие ключи убраны из `raw`
+_STRIPPED_BITS = {"url": 1, "pdf": 2}
+
+_STORED_COLUMNS: Tuple[str, ...] = (
+    *(_ENCODED.get(name, name) for name in FLAT_COLUMNS),
+    "pdf_version",
+    *_RAW_COLUMNS,
+    "last_seen",
+)
+
+# всё, кроме id, колонок `raw` и `last_seen`: они обновляются по своим правилам
+_PLAIN_COLUMNS = _STORED_COLUMNS[1:-len(_RAW_COLUMNS) - 1]
+_UPDATED = ", ".join(f"{name} = excluded.{name}" for name in _PLAIN_COLUMNS)
+# квартира изменилась, если отличается хоть одна из этих же колонок
+_CHANGED = " OR ".join(f"flat_rows.{name} IS NOT excluded.{name}" for name in _PLAIN_COLUMNS)
+_RAW_UPDATED = ",\n".join(
+    f"{name} = CASE WHEN excluded.raw IS NULL AND NOT ({_CHANGED}) THEN flat_rows.{name} ELSE excluded.{name} END"
+    for name in _RAW_COLUMNS
+)
+
+
+# Строка без `raw` (например, `Flat` не из ответа API) сохраняет прежние `raw` и
+# планировку, только если ничего не изменилось. Иначе они описывают уже другое
+# состояние квартиры (`is_finish`, `booking_period`, поиск по планировке), и их
+# лучше забыть, чем отдавать устаревшими.
+_UPSERT_SQL = f"""
+    INSERT INTO flat_rows({', '.join(_STORED_COLUMNS)})
+    VALUES({','.join('?' * len(_STORED_COLUMNS))})
+    ON CONFLICT(id) DO UPDATE SET
+        {_UPDATED},
+        last_seen = excluded.last_seen,
+        {_RAW_UPDATED}
+"""
+
+
+def _encode_pdf(pdf: Any, flat_id: int, bulk_id: Optional[int]) -> Optional[Tuple[int, int]]:
+    """(проект, версия), если `pdf` совпадает с шаблоном, иначе None."""
+
+    match = _PDF_RE.fullmatch(pdf) if isinstance(pdf, str) else None
+    if match is None or bulk_id is None:
+        return None
+    block_id, version = int(match[1]), int(match[4])
+    if pdf != f"{PDF_PREFIX}{block_id}/{bulk_id}/{flat_id}.pdf?v={version}":
+        return None  # другой корпус, квартира или незначащие нули в числах
+    return block_id, version
+
+
+async def _status_ids(conn: aiosqlite.Connection, names: Set[str]) -> Dict[str, int]:
+    param = (json.dumps(sorted(names)),)
+    await conn.execute("INSERT OR IGNORE INTO flat_statuses(name) SELECT value FROM json_each(?)", param)
+    cursor = await conn.execute(
+        "SELECT name, id FROM flat_statuses WHERE name IN (SELECT value FROM json_each(?))", param
+    )
+    return dict(await cursor.fetchall())
+
+
+async def _bulk_blocks(conn: aiosqlite.Connection, seen: Dict[int, int]) -> Dict[int, int]:
+    await conn.executemany("INSERT OR IGNORE INTO bulks(id, block_id) VALUES(?, ?)", list(seen.items()))
+    cursor = await conn.execute(
+        "SELECT id, block_id FROM bulks WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(seen)),),
+    )
+    return dict(await cursor.fetchall())
+
+
+async def write_rows(conn: aiosqlite.Connection, rows: List[tuple]) -> None:
+    """Upsert строк в порядке `UPSERT_FIELDS` + `last_seen` (без commit)."""
+
+    if not rows:
+        return
+    pos = {name: i for i, name in enumerate(UPSERT_FIELDS)}
+
+    statuses: Set[str] = set()
+    blocks: Dict[int, int] = {}
+    for row in rows:
+        statuses.update(row[pos[name]] for name in _ENCODED if row[pos[name]] is not None)
+        pdf = _encode_pdf(row[pos["pdf"]], row[0], row[pos["bulk_id"]])
+        if pdf is not None:
+            blocks.setdefault(row[pos["bulk_id"]], pdf[0])
+    status_ids = await _status_ids(conn, statuses) if statuses else {}
+    bulk_blocks = await _bulk_blocks(conn, blocks) if blocks else {}
+
+    layouts: Dict[int, tuple] = {}
+    encoded: List[tuple] = []
+    for row in rows:
+        flat_id, url, pdf, raw = row[0], row[pos["url"]], row[pos["pdf"]], row[pos["raw"]]
+        pdf_version = None
+        pdf_template = _encode_pdf(pdf, flat_id, row[pos["bulk_id"]])
+        if pdf_template is not None and bulk_blocks.get(row[pos["bulk_id"]]) == pdf_template[0]:
+            pdf, pdf_version = None, pdf_template[1]
+        if url == f"{URL_PREFIX}{flat_id}":
+            url = None
+
+        layout_id = None
+        stripped = 0
+        if raw is not None:
+            item = json.loads(raw)
+            layout = item.get("layout")
+            if isinstance(layout, dict) and isinstance(layout.get("id"), int):
+                layout_id = layout["id"]
+                data = json.dumps(layout, ensure_ascii=False, separators=(",", ":"))
+                layouts[layout_id] = (layout.get("name"), data)
+                del item["layout"]
+            # url и pdf в ответе совпадают с колонками — представление вернёт их на место
+            for key, bit in _STRIPPED_BITS.items():
+                value = row[pos[key]]
+                if key in item and item[key] == value and value is not None:
+                    del item[key]
+                    stripped |= bit
+            raw = json.dumps(item, ensure_ascii=False, separators=(",", ":"))
+
+        values: List[Any] = []
+        for name in FLAT_COLUMNS:
+            value = row[pos[name]]
+            if name in _ENCODED:
+                value = status_ids.get(value)
+            elif name == "url":
+                value = url
+            elif name == "pdf":
+                value = pdf
+            values.append(value)
+        encoded.append((*values, pdf_version, layout_id, raw, stripped, row[-1]))
+
+    if layouts:
+        # у всех квартир планировки объект один и тот же, поэтому хранится последний
+        await conn.executemany(
+            "INSERT INTO layouts(id, name, data) VALUES(?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, data = excluded.data",
+            [(layout_id, *layout) for layout_id, layout in layouts.items()],
+        )
+    await conn.executemany(_UPSERT_SQL, encoded)
+    if any(row[-3] is None for row in encoded):
+        # изменённые строки без `raw` могли оставить планировку без квартир
+        await conn.execute(
+            "DELETE FROM layouts WHERE NOT EXISTS (SELECT 1 FROM flat_rows WHERE flat_rows.layout_id = layouts.id)"
+        )
+
+
+async def delete_rows(conn: aiosqlite.Connection, ids: List[int]) -> None:
+    """Удалить квартиры и ставшие ненужными планировки (без commit)."""
+
+    if not ids:
+        return
+    param = (json.dumps(list(ids)),)
+    cursor = await conn.execute(
+        "SELECT DISTINCT layout_id FROM flat_rows "
+        "WHERE id IN (SELECT value FROM json_each(?)) AND layout_id IS NOT NULL",
+        param,
+    )
+    layout_ids = [row[0] for row in await cursor.fetchall()]
+    await conn.execute("DELETE FROM flat_rows WHERE id IN (SELECT value FROM json_each(?))", param)
+    if layout_ids:
+        await conn.execute(
+            "DELETE FROM layouts WHERE id IN (SELECT value FROM json_each(?)) "
+            "AND NOT EXISTS (SELECT 1 FROM flat_rows WHERE flat_rows.layout_id = layouts.id)",
+            (json.dumps(layout_ids),),
+        )
@@ -0,0 +1,108 @@
+"""Приём обновлений через webhook.
+
+Telegram сам присылает обновления POST-запросами, поэтому нет задержек
+long polling. Сервер на aiohttp (он уже есть в зависимостях) кладёт
+обновления в `Application.update_queue`, дальше они идут по обычному
+пути `Application` — в том числе через `ChatOrderedUpdateProcessor`.
+"""
+
+import asyncio
+import hmac
+import logging
+import signal
+from typing import TYPE_CHECKING, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot.config import Settings
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """HTTP-сервер, принимающий обновления для `app` на `/<path>`."""
+
+    def __init__(self, app: Application, listen: str, port: int, path: str, secret: str = ""):
+        self._app = app
+        self._listen = listen
+        self._port = port
+        self._path = "/" + path.strip("/")
+        self._secret = secret
+        self._runner: Optional["web.AppRunner"] = None
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (если сервер запущен с `port=0`)."""
+
+        if self._runner is None:
+            return self._port
+        return self._runner.addresses[0][1]
+
+    async def start(self) -> None:
+        from aiohttp import web
+
+        web_app = web.Application()
+        web_app.router.add_post(self._path, self._handle)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._listen, self._port).start()
+        logger.info("Webhook listening on %s:%s%s", self._listen, self.port, self._path)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        if self._secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self._secret):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self._app.bot)
+        except ValueError:
+            return web.Response(status=400)
+
+        # ответ Telegram сразу: обработка идёт в очереди `Application`
+        await self._app.update_queue.put(update)
+        return web.Response()
+
+
+async def run_webhook(app: Application, settings: Settings) -> None:
+    """Аналог `app.run_polling()` для webhook: работает до SIGINT/SIGTERM."""
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = WebhookServer(
+        app,
+        settings.webhook_listen,
+        settings.webhook_port,
+        settings.webhook_path,
+        settings.webhook_secret,
+    )
+    async with app:
+        if app.post_init is not None:
+            await app.post_init(app)
+        await app.bot.set_webhook(
+            settings.webhook_url,
+            allowed_updates=Update.ALL_TYPES,
+            secret_token=settings.webhook_secret or None,
+        )
+        await server.start()
+        await app.start()
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await app.stop()
+    if app.post_shutdown is not None:
+        await app.post_shutdown(app)
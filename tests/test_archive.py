@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from bot.archive import CODEC_DELTA, ResponseArchive
+
+
+@pytest.mark.asyncio
+async def test_archive_dedup_delta_and_iteration(tmp_path):
+    """Проверяем дедупликацию, хранение delta и потоковое чтение архива."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    archive = ResponseArchive()
+    archive._settings.database_path = str(tmp_path / "test.db")
+    await archive.init_db()
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    first = await archive.save(items, fetched_at="2024-01-01T00:00:00")
+    # Повторный одинаковый опрос не создаёт новых записей
+    again = await archive.save(items, fetched_at="2024-01-01T04:00:00")
+    assert again == first
+
+    # Меняется цена одной квартиры и пропадает другая
+    changed = [dict(item) for item in items[1:]]
+    changed[0]["price"] += 100_000
+    second = await archive.save(changed, fetched_at="2024-01-01T08:00:00")
+    assert second != first
+
+    import aiosqlite
+
+    async with aiosqlite.connect(archive._settings.database_path) as conn:
+        cursor = await conn.execute("SELECT digest, codec, length(data), size FROM raw_blobs")
+        blobs = {row[0]: row[1:] for row in await cursor.fetchall()}
+        cursor = await conn.execute("SELECT COUNT(*) FROM raw_polls")
+        (polls,) = await cursor.fetchone()
+
+    assert len(blobs) == 2
+    assert polls == 2
+    codec, stored, size = blobs[second]
+    assert codec == CODEC_DELTA
+    assert stored < size // 20  # delta заметно меньше полного тела
+
+    snapshots = [s async for s in archive.iter_snapshots()]
+    assert [s.items for s in snapshots] == [items, changed]
+    assert snapshots[0].last_seen == "2024-01-01T04:00:00"
+
+    # Выборка по периоду
+    later = [s.digest async for s in archive.iter_snapshots(since="2024-01-01T05:00:00")]
+    assert later == [second]
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from bot.cdc import CdcServer
+from bot.pik_api_client import parse_flats
+from bot.repository import FlatRepository
+
+
+@pytest.mark.asyncio
+async def test_cdc_feed_long_poll_and_stream(tmp_path):
+    """Каждый diff попадает в ленту; потребитель догоняет её пачками с курсора."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        flats = parse_flats(json.load(f))
+    await repo.upsert_many(flats)
+    await repo.upsert_many(flats)  # без изменений — без событий
+
+    server = CdcServer(repo, "127.0.0.1", 0, batch_limit=100)
+    await server.start()
+    base = f"http://127.0.0.1:{server.port}"
+    try:
+        async with aiohttp.ClientSession() as session:
+            # догоняем ленту пачками по 100 событий
+            events, after = [], 0
+            while True:
+                async with session.get(f"{base}/events", params={"after": after}) as resp:
+                    assert resp.headers["X-First-Seq"] == "1"
+                    lines = (await resp.text()).splitlines()
+                    after = int(resp.headers["X-Next-After"])
+                if not lines:
+                    break
+                assert len(lines) <= 100
+                events.extend(json.loads(line) for line in lines)
+            assert [event["seq"] for event in events] == list(range(1, len(flats) + 1))
+            assert {event["op"] for event in events} == {"insert"}
+            assert {event["tx"] for event in events} == {1}  # одна транзакция
+            prices = {flat.id: flat.price for flat in flats}
+            assert all(event["before"] is None for event in events)
+            assert {event["id"]: event["after"]["price"] for event in events} == prices
+
+            # long poll: ответ приходит сразу после коммита, а не по таймауту
+            async def change_price():
+                await asyncio.sleep(0.2)
+                changed = flats[0].model_copy(update={"price": flats[0].price - 100_000})
+                await repo.upsert_many([changed])
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            task = asyncio.create_task(change_price())
+            async with session.get(f"{base}/events", params={"after": after, "wait": 10}) as resp:
+                (update,) = [json.loads(line) for line in (await resp.text()).splitlines()]
+            await task
+            assert loop.time() - started < 5
+            assert update["op"] == "update" and update["id"] == flats[0].id
+            assert update["after"]["price"] == update["before"]["price"] - 100_000
+
+            await repo.delete_by_ids([flats[1].id])
+
+            # SSE: переподключение с Last-Event-ID продолжает после курсора
+            headers = {"Last-Event-ID": str(update["seq"])}
+            async with session.get(f"{base}/events/stream", headers=headers) as resp:
+                assert resp.headers["Content-Type"] == "text/event-stream"
+                frame = []
+                while not frame or frame[-1]:
+                    frame.append((await resp.content.readline()).decode().rstrip("\n"))
+            assert frame[0] == f"id: {update['seq'] + 1}"
+            assert frame[1] == "event: delete"
+            deleted = json.loads(frame[2][len("data: "):])
+            assert deleted["id"] == flats[1].id and deleted["after"] is None
+    finally:
+        await server.stop()
@@ -0,0 +1,70 @@
+import datetime
+import json
+
+import pytest
+
+from bot.archive import ResponseArchive
+from bot.charts import ChartCache, ChartError, ChartService, _min_free_prices
+
+
+@pytest.mark.asyncio
+async def test_chart_cache_lru_memory_and_disk(tmp_path):
+    """Память и диск вытесняют давно не запрошенные картинки."""
+
+    cache = ChartCache(2, str(tmp_path / "charts"), max_disk_items=3)
+    for key in ("a", "b", "c", "d"):
+        await cache.put(key, key.encode())
+    assert sorted(p.name for p in (tmp_path / "charts").iterdir()) == ["b.png", "c.png", "d.png"]
+
+    # "b" вытеснен из памяти, но читается с диска и снова попадает в память
+    assert await cache.get("b") == b"b"
+    assert await cache.get("a") is None
+
+    # без каталога кэш только в памяти
+    memory_only = ChartCache(1)
+    await memory_only.put("x", b"x")
+    await memory_only.put("y", b"y")
+    assert await memory_only.get("x") is None and await memory_only.get("y") == b"y"
+
+
+@pytest.mark.asyncio
+async def test_market_chart_is_cached_per_archive_version(tmp_path):
+    """Повторный /chart до нового опроса не перерисовывает картинку."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    archive = ResponseArchive()
+    archive._settings.database_path = str(tmp_path / "test.db")
+    await archive.init_db()
+    charts = ChartService(archive, cache=ChartCache(4))
+
+    with pytest.raises(ChartError):
+        await charts.market()  # архив пуст
+    with pytest.raises(ChartError):
+        await ChartService(None).market()  # архив выключен
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    now = datetime.datetime.utcnow()
+    await archive.save(items, fetched_at=(now - datetime.timedelta(hours=8)).isoformat())
+    studio, one = _min_free_prices(items)
+    assert studio == min(i["price"] for i in items if i["rooms"] == "studio" and i["status"] == "free")
+    assert one == min(i["price"] for i in items if i["rooms"] == "1" and i["status"] == "free")
+
+    first = await charts.market()
+    assert first.png.startswith(b"\x89PNG")
+    again = await charts.market()
+    assert again == first
+
+    charts.remember_file_id(first.key, "file-1")
+    assert (await charts.market()).file_id == "file-1"
+
+    # новый опрос — новая версия архива и новая картинка
+    changed = [dict(item) for item in items]
+    changed[0]["price"] += 100_000
+    await archive.save(changed, fetched_at=now.isoformat())
+    fresh = await charts.market()
+    assert fresh.key != first.key and fresh.file_id is None
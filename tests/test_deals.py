@@ -0,0 +1,60 @@
+import pytest
+
+from bot.deals import compute_scores
+from bot.models import Flat
+from bot.repository import FlatRepository
+from bot.services import MonitorService
+
+
+def test_compute_scores_flags_outlier_against_peers():
+    """Дешёвая за м² квартира выделяется среди соседей, большая «дорогая» студия — нет."""
+
+    rows = [
+        # id, категория, корпус, этаж, цена, площадь: ~250 тыс/м²
+        (i, "studio", 1, 3, 250_000 * area, area)
+        for i, area in enumerate([24.0, 25.0, 26.0, 27.0, 28.0, 30.0], start=1)
+    ]
+    rows.append((7, "studio", 1, 4, 200_000 * 25, 25.0))  # на 20% дешевле за м²
+    rows.append((8, "studio", 1, 2, 251_000 * 40, 40.0))  # дорогая по сумме, обычная за м²
+    rows.append((9, "studio", 2, 3, 100_000 * 25, 25.0))  # другой корпус — соседей мало
+
+    scores = {s.id: s for s in compute_scores(rows, floor_band=5, min_peers=5, threshold=-2.0)}
+
+    assert scores[7].is_outlier
+    assert scores[7].percentile == pytest.approx(1 / 8)
+    assert not scores[8].is_outlier
+    assert 9 not in scores
+
+
+@pytest.mark.asyncio
+async def test_new_deal_is_reported_after_diff(tmp_path):
+    """Квартира, подешевевшая относительно соседей, попадает в отчёт и в /best."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+    service = MonitorService(repo)
+
+    flats = [
+        Flat(id=i, rooms="1", price=int(300_000 * (38 + i)), status="free", url="",
+             area=38.0 + i, floor=10 + i % 3, bulk_id=5)
+        for i in range(8)
+    ]
+    await service.update_from_list(flats)
+    assert await repo.get_deals(limit=1)
+    assert not [d for d in await repo.get_deals() if d["is_outlier"]]
+
+    flats[3] = flats[3].model_copy(update={"price": int(240_000 * 41)})
+    report = await service.update_from_list(flats)
+
+    assert "Новые выгодные предложения" in report
+    best = await repo.get_deals(limit=1)
+    assert best[0]["id"] == 3 and best[0]["is_outlier"]
+
+    # Повторный опрос без изменений не дублирует уведомление
+    assert "Новые выгодные" not in await service.update_from_list(flats)
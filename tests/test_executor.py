@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import List, Tuple
+
+import pytest
+
+from bot.executor import CpuExecutor, pack_flats, unpack_flats
+from bot.models import Flat
+from bot.repository import FlatRepository
+from bot.services import MonitorService
+
+
+def _make_flats(count: int, price_shift: int = 0):
+    return [
+        Flat(
+            id=i,
+            rooms="studio" if i % 2 else "1",
+            price=7_000_000 + i * 10 + price_shift * (i % 3),
+            status="free" if i % 5 else "reserve",
+            url=f"https://www.pik.ru/yauza/flats/{i}",
+            area=30 + i % 20,
+            floor=i % 30,
+            bulk_id=i % 10,
+        )
+        for i in range(count)
+    ]
+
+
+def test_pack_roundtrip():
+    """Упаковка в кортежи не теряет данных."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    flats = _make_flats(10)
+    assert unpack_flats(pack_flats(flats)) == flats
+
+
+@pytest.mark.asyncio
+async def test_report_jobs_do_not_receive_raw(tmp_path):
+    """В задачи diff и статистики «сырой» JSON не передаётся, а в БД он попадает."""
+
+    import json
+    import os
+
+    from bot.pik_api_client import parse_flats
+    from bot.storage import FLAT_COLUMNS
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    class RecordingExecutor(CpuExecutor):
+        def __init__(self):
+            super().__init__("inline")
+            self.calls = []
+
+        async def run(self, fn, *args, **kwargs):
+            self.calls.append((fn.__name__, args))
+            return await super().run(fn, *args, **kwargs)
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    flats = parse_flats(items)
+    await repo.upsert_many(flats)
+
+    executor = RecordingExecutor()
+    await MonitorService(repo, executor=executor).update_from_list(flats)
+
+    jobs = {name: args for name, args in executor.calls}
+    assert {"_diff_job", "_stats_job"} <= jobs.keys()
+    old_rows, new_rows = jobs["_diff_job"]
+    for rows in (old_rows, new_rows, jobs["_stats_job"][0]):
+        assert rows and all(len(row) == len(FLAT_COLUMNS) for row in rows)
+    item = next(item for item in items if item["id"] == new_rows[0][0])
+    assert await repo.get_raw_item(item["id"]) == item
+
+
+async def _command_latencies(repo: FlatRepository, mode: str) -> Tuple[List[float], str]:
+    """Задержки `/studios` во время обновления 20 000 квартир в режиме `mode`."""
+
+    await repo.upsert_many(_make_flats(20_000))
+    executor = CpuExecutor(mode, workers=2)
+    service = MonitorService(repo, executor=executor)
+    new_flats = _make_flats(20_000, price_shift=50_000)
+
+    latencies: List[float] = []
+
+    async def simulate_commands(update_task: asyncio.Task) -> None:
+        # Аналог нажатий /studios во время обновления; замер включает паузу
+        # между командами, чтобы блокировка event loop не проскочила мимо него
+        while not update_task.done():
+            started = time.perf_counter()
+            await repo.select_cheapest(["studio"], limit=10)
+            await asyncio.sleep(0.01)
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        update_task = asyncio.create_task(service.update_from_list(new_flats))
+        await simulate_commands(update_task)
+        report = await update_task
+    finally:
+        executor.shutdown()
+    return latencies, report
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["thread", "process"])
+async def test_command_latency_during_large_update(tmp_path, mode):
+    """Команды отвечают быстро, пока идёт большое обновление: пул убирает паузы режима inline."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "inline.db")
+    await repo.init_db()
+    inline, _ = await _command_latencies(repo, "inline")
+
+    repo._settings.database_path = str(tmp_path / f"{mode}.db")
+    await repo.init_db()
+    latencies, report = await _command_latencies(repo, mode)
+
+    assert "✏️ Квартира" in report
+    assert inline and latencies
+    # в inline diff и статистика на 20 000 квартир блокируют event loop на
+    # сотни миллисекунд; в пуле самая долгая команда заметно короче
+    assert max(latencies) < max(inline) / 2
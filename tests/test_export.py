@@ -0,0 +1,93 @@
+import csv
+import json
+
+import pytest
+
+from bot.archive import ResponseArchive
+from bot.export import FLATS_EXPORT_COLUMNS, HISTORY_EXPORT_COLUMNS, ExportError, Exporter
+from bot.pik_api_client import parse_flats
+from bot.repository import FlatRepository
+
+
+@pytest.mark.asyncio
+async def test_export_catalog_and_history_to_csv(tmp_path):
+    """Каталог выгружается пачками курсора, история — по снимку архива."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    repo._settings.export_batch_size = 100
+    await repo.init_db()
+    archive = ResponseArchive()
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    await repo.upsert_many(parse_flats(items))
+    await archive.save(items, fetched_at="2024-01-01T00:00:00")
+    changed = [dict(item) for item in items[1:]]
+    changed[0]["price"] += 100_000
+    await archive.save(changed, fetched_at="2024-01-01T08:00:00")
+
+    exporter = Exporter(repo, archive)
+    reported = []
+
+    async def progress(rows):
+        reported.append(rows)
+
+    result = await exporter.export("flats", "csv", str(tmp_path / "flats.csv"), progress=progress)
+    assert result.rows == len(items)
+    assert reported == [100, 200, 300, len(items)]  # по пачке за раз
+    with open(result.path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert tuple(rows[0]) == FLATS_EXPORT_COLUMNS
+    by_id = {int(row["id"]): row for row in rows}
+    sample = items[0]
+    assert int(by_id[sample["id"]]["price"]) == sample["price"]
+    assert by_id[sample["id"]]["url"] == sample["url"]
+    assert by_id[sample["id"]]["pdf"] == sample["pdf"]
+
+    result = await exporter.export("history", "csv", str(tmp_path / "history.csv"))
+    assert result.rows == len(items) + len(changed)
+    with open(result.path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert tuple(rows[0]) == HISTORY_EXPORT_COLUMNS
+    prices = [
+        (row["poll_first_seen"], int(row["price"])) for row in rows if int(row["id"]) == changed[0]["id"]
+    ]
+    assert prices == [
+        ("2024-01-01T00:00:00", changed[0]["price"] - 100_000),
+        ("2024-01-01T08:00:00", changed[0]["price"]),
+    ]
+
+    # без архива истории нет
+    with pytest.raises(ExportError):
+        await Exporter(repo).export("history", "csv", str(tmp_path / "none.csv"))
+
+
+@pytest.mark.asyncio
+async def test_export_parquet(tmp_path):
+    """Parquet: типизированные колонки, логические значения из 0/1."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    await repo.upsert_many(parse_flats(items))
+
+    result = await Exporter(repo).export("flats", "parquet", str(tmp_path / "flats.parquet"))
+    table = pq.read_table(result.path)
+    assert table.num_rows == len(items)
+    assert table.schema.field("is_pre_sale").type == "bool"
+    assert sorted(table.column("id").to_pylist()) == sorted(item["id"] for item in items)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from bot.governor import BudgetExceeded, Priority, RequestGovernor
+
+
+def _governor(**max_wait):
+    waits = {Priority.WATCH: 5.0, Priority.SCHEDULED: 5.0, Priority.MANUAL: 5.0}
+    waits.update({Priority[name.upper()]: value for name, value in max_wait.items()})
+    # 20 запросов в секунду, без запаса
+    return RequestGovernor(rate_per_minute=1200, burst=1, max_queue=10, max_wait=waits)
+
+
+@pytest.mark.asyncio
+async def test_queued_requests_follow_priority():
+    """Без свободных токенов первым проходит отслеживание, затем плановые, затем ручные."""
+
+    governor = _governor()
+    await governor.acquire(Priority.MANUAL)  # единственный токен
+
+    order = []
+
+    async def request(priority: Priority) -> None:
+        await governor.acquire(priority)
+        order.append(priority)
+
+    tasks = [asyncio.ensure_future(request(p)) for p in (Priority.MANUAL, Priority.SCHEDULED, Priority.WATCH)]
+    await asyncio.sleep(0)
+    assert governor.stats().queued == {"WATCH": 1, "SCHEDULED": 1, "MANUAL": 1}
+
+    await asyncio.gather(*tasks)
+    assert order == [Priority.WATCH, Priority.SCHEDULED, Priority.MANUAL]
+
+    stats = governor.stats()
+    assert stats.used_last_hour == 4
+    assert stats.granted == {"WATCH": 1, "SCHEDULED": 1, "MANUAL": 2}
+    assert sum(stats.queued.values()) == 0
+
+
+@pytest.mark.asyncio
+async def test_over_budget_manual_request_is_rejected():
+    """Ручной запрос, которому пришлось бы долго ждать, отклоняется сразу; плановый ждёт."""
+
+    governor = _governor(manual=0.01)
+    await governor.acquire(Priority.SCHEDULED)
+
+    with pytest.raises(BudgetExceeded) as exc:
+        await governor.acquire(Priority.MANUAL)
+    assert exc.value.retry_after > 0.01
+
+    started = asyncio.get_running_loop().time()
+    await governor.acquire(Priority.SCHEDULED)
+    assert asyncio.get_running_loop().time() - started >= 0.03
+
+    stats = governor.stats()
+    assert stats.rejected["MANUAL"] == 1
+    assert stats.granted["SCHEDULED"] == 2
+
+
+def test_governor_survives_closed_event_loop():
+    """Таймер, оставшийся от закрытого loop, не блокирует очередь в новом."""
+
+    governor = _governor(manual=0.5)
+
+    async def leave_pending_timer() -> None:
+        await governor.acquire(Priority.MANUAL)
+        waiter = asyncio.ensure_future(governor.acquire(Priority.MANUAL))
+        await asyncio.sleep(0)  # ожидание в очереди, таймер взведён
+        waiter.cancel()
+
+    asyncio.run(leave_pending_timer())
+
+    async def acquire_twice() -> float:
+        started = asyncio.get_running_loop().time()
+        await governor.acquire(Priority.MANUAL)
+        await governor.acquire(Priority.MANUAL)  # ждёт токен по новому таймеру
+        return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(acquire_twice()) < 0.4
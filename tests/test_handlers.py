@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+
+def _update(update_id: int, chat_id: int):
+    from telegram import Update
+
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "/studios",
+            },
+        },
+        None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_updates_run_concurrently_but_in_order_per_chat():
+    """Долгое обновление одного чата не задерживает другие чаты, порядок в чате сохраняется."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    from bot.handlers import ChatOrderedUpdateProcessor
+
+    processor = ChatOrderedUpdateProcessor(max_workers=2)
+    finished = []
+
+    async def handle(name: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        finished.append(name)
+
+    await asyncio.gather(
+        processor.process_update(_update(1, 100), handle("a1 (долгий /update)", 0.2)),
+        processor.process_update(_update(2, 100), handle("a2", 0)),
+        processor.process_update(_update(3, 200), handle("b1", 0.01)),
+        processor.process_update(_update(4, 300), handle("c1", 0.02)),
+    )
+
+    # чаты 200 и 300 не ждут чат 100, а a2 идёт строго после a1
+    assert finished == ["b1", "c1", "a1 (долгий /update)", "a2"]
+    assert not processor._chats
+
+
+@pytest.mark.asyncio
+async def test_jobs_skip_run_when_budget_exhausted(caplog):
+    """Исчерпанный лимит API — пропуск запуска задачи с одной строкой в логе, без ошибки."""
+
+    import os
+    from types import SimpleNamespace
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    from bot.governor import BudgetExceeded, Priority
+    from bot.handlers import hourly_job, watch_job
+
+    class Monitor:
+        async def update_from_api(self):
+            raise BudgetExceeded(Priority.SCHEDULED, 42)
+
+        async def update_watched(self):
+            raise BudgetExceeded(Priority.WATCH, 7)
+
+        def take_watch_notes(self):
+            return {}
+
+    sent = []
+
+    async def send_message(**kwargs):
+        sent.append(kwargs)
+
+    context = SimpleNamespace(
+        application=SimpleNamespace(bot_data={}),
+        job=SimpleNamespace(data={"monitor": Monitor()}),
+        bot=SimpleNamespace(send_message=send_message),
+    )
+    with caplog.at_level("WARNING", logger="bot.handlers"):
+        await hourly_job(context)
+        await watch_job(context)
+
+    assert not sent
+    assert [record.getMessage() for record in caplog.records] == [
+        "Hourly update skipped: API budget exhausted, retry in 42 s",
+        "Watch poll skipped: API budget exhausted, retry in 7 s",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "data",
+    ["pg:studio:a:100", "pg:studio:a:100:1:2", "pg:studio:a:дорого:1", "pg:two:a:100:1", "pg:studio:x:100:1", None],
+)
+async def test_page_callback_rejects_malformed_data(data):
+    """Устаревшие или подделанные данные кнопки не роняют обработчик, а закрывают «часики»."""
+
+    import os
+    from types import SimpleNamespace
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    from bot.handlers import cb_page
+
+    answers = []
+
+    async def answer(text=None):
+        answers.append(text)
+
+    query = SimpleNamespace(data=data, answer=answer)
+    update = SimpleNamespace(callback_query=query)
+    context = SimpleNamespace(application=SimpleNamespace(bot_data={"repo": None}))
+    await cb_page(update, context)
+
+    assert answers == ["Список устарел, повторите команду"]
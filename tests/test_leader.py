@@ -0,0 +1,119 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from bot.leader import LeaderElector, NotLeaderError
+from bot.models import Flat
+from bot.repository import FlatRepository
+
+LEASE = 2.0
+HEARTBEAT = 0.1
+
+
+def _run_candidate(db_path: str, holder: str, events) -> None:
+    """Экземпляр бота в отдельном процессе: только цикл выбора ведущего."""
+
+    from bot.config import get_settings
+
+    get_settings().database_path = db_path
+
+    async def main() -> None:
+        elector = LeaderElector(holder=holder, lease_seconds=LEASE, heartbeat_seconds=HEARTBEAT)
+
+        async def elected() -> None:
+            events.put((holder, time.time()))
+
+        elector.on_elected(elected)
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        elector.start()
+        await stop.wait()
+        await elector.stop()
+
+    asyncio.run(main())
+
+
+def _wait_elected(events, timeout: float = 10.0):
+    return events.get(timeout=timeout)
+
+
+def test_failover_between_processes(tmp_path):
+    """Ведущий один; после падения аренду перехватывают за срок аренды, после остановки — сразу."""
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = db_path = str(tmp_path / "test.db")
+    asyncio.run(repo.init_db())
+
+    ctx = multiprocessing.get_context("fork")
+    events = ctx.Queue()
+    a = ctx.Process(target=_run_candidate, args=(db_path, "a", events))
+    b = ctx.Process(target=_run_candidate, args=(db_path, "b", events))
+    c = ctx.Process(target=_run_candidate, args=(db_path, "c", events))
+    try:
+        a.start()
+        assert _wait_elected(events)[0] == "a"
+        b.start()
+        time.sleep(5 * HEARTBEAT)
+        assert events.empty()  # второй экземпляр остаётся резервным
+
+        # падение ведущего: аренда не освобождена и истекает сама
+        killed = time.time()
+        os.kill(a.pid, signal.SIGKILL)
+        holder, elected = _wait_elected(events)
+        crash_failover = elected - killed
+        assert holder == "b"
+        assert crash_failover <= LEASE + 2 * HEARTBEAT + 0.5
+
+        # штатная остановка: аренда освобождается, резервный берёт её за heartbeat
+        c.start()
+        time.sleep(5 * HEARTBEAT)
+        stopped = time.time()
+        b.terminate()
+        holder, elected = _wait_elected(events)
+        graceful_failover = elected - stopped
+        assert holder == "c"
+        assert graceful_failover < LEASE / 2
+    finally:
+        for proc in (a, b, c):
+            if proc.is_alive():
+                proc.kill()
+            proc.join(5)
+
+
+@pytest.mark.asyncio
+async def test_stale_leader_cannot_write(tmp_path):
+    """Бывший ведущий, не успевший продлить аренду, не может записать в flats."""
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    old = LeaderElector(holder="old", lease_seconds=0.2)
+    new = LeaderElector(holder="new", lease_seconds=0.2)
+    assert await old.try_acquire()
+    assert not await new.try_acquire()
+
+    await asyncio.sleep(0.25)
+    assert not old.is_leader
+    assert await new.try_acquire()
+    assert new.term == old.term + 1
+
+    repo.fence = old
+    flat = Flat(id=1, rooms="1", price=1, status="free", url="", area=40.0, floor=1)
+    with pytest.raises(NotLeaderError):
+        await repo.upsert_many([flat])
+    assert await repo.get_all_flats() == []
+
+    repo.fence = new
+    await repo.upsert_many([flat])
+    assert len(await repo.get_all_flats()) == 1
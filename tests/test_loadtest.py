@@ -0,0 +1,37 @@
+import pytest
+
+from bot.loadtest import LoadConfig, run_load
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("webhook", [False, True])
+async def test_load_against_fake_bot_api(tmp_path, webhook):
+    """Бот на фейковом Bot API отвечает на все синтетические обновления."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    config = LoadConfig(
+        rate=40,
+        duration=1.0,
+        users=5,
+        burst=2,
+        burst_every=0.5,
+        drain_timeout=10,
+        database_path=str(tmp_path / "test.db"),
+        webhook=webhook,
+        pik_rate_per_minute=600,
+    )
+    report = await run_load(config)
+
+    assert report.sent > 30
+    assert report.answered == report.sent
+    assert {s.name for s in report.scenarios} >= {"page", "update"}
+    assert all(0 < s.p50 <= s.p99 <= s.max for s in report.scenarios)
+    # первичное наполнение БД и по одному опросу на каждую /update
+    assert report.api_calls["pik:/v1/flat"] == 1 + 2
+    assert ("setWebhook" in report.api_calls) == webhook
+    sent = {s.name: s.sent for s in report.scenarios}
+    assert report.api_calls["answerCallbackQuery"] == sent["page"]
@@ -0,0 +1,104 @@
+import aiosqlite
+import pytest
+
+from bot.migrations import SCHEMA_VERSION, _v1_flats, get_version, migrate
+from bot.repository import FlatRepository
+
+
+@pytest.mark.asyncio
+async def test_migrate_legacy_database(tmp_path):
+    """БД без версии схемы (старый CREATE TABLE IF NOT EXISTS) доводится до актуальной."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    db_path = tmp_path / "legacy.db"
+
+    # Схема и данные в том виде, в каком их оставляла первая версия бота:
+    # таблица flats без `raw` и user_version = 0
+    async with aiosqlite.connect(db_path) as conn:
+        await _v1_flats(conn)
+        await conn.execute(
+            "INSERT INTO flats(id, rooms, price, status, url, last_seen) "
+            "VALUES(1, 'studio', 9000000, 'free', '', '2024-01-01')"
+        )
+        await conn.commit()
+
+    async with aiosqlite.connect(db_path) as conn:
+        assert await get_version(conn) == 0
+        assert await migrate(conn) == SCHEMA_VERSION
+        # Повторный запуск ничего не делает
+        assert await migrate(conn) == SCHEMA_VERSION
+
+        cursor = await conn.execute("PRAGMA table_xinfo(flats)")
+        columns = {row[1] for row in await cursor.fetchall()}
+
+    assert {"raw", "layout_id", "layout_name", "is_finish", "booking_period"} <= columns
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(db_path)
+    await repo.init_db()
+    prices = {row[0]: row[2] for row in await repo.get_all_rows()}
+    assert prices == {1: 9_000_000}
+
+
+@pytest.mark.asyncio
+async def test_migrate_to_normalized_storage(tmp_path):
+    """Миграция 10 переносит квартиры в `flat_rows`, а `flats` отдаёт их без изменений."""
+
+    import json
+    import os
+
+    from bot.migrations import MIGRATIONS
+    from bot.pik_api_client import parse_flats
+    from bot.repository import UPSERT_FIELDS
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    db_path = tmp_path / "v9.db"
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    flats = parse_flats(items)
+
+    async with aiosqlite.connect(db_path) as conn:
+        for version, step in MIGRATIONS[:9]:
+            await step(conn)
+            await conn.execute(f"PRAGMA user_version = {version}")
+        await conn.executemany(
+            f"INSERT INTO flats({', '.join(UPSERT_FIELDS)}, last_seen) "
+            f"VALUES({','.join('?' * (len(UPSERT_FIELDS) + 1))})",
+            [(*(getattr(flat, name) for name in UPSERT_FIELDS), "2024-01-01") for flat in flats],
+        )
+        await conn.commit()
+        await conn.execute("VACUUM")
+        cursor = await conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'flats'")
+        (size_before,) = await cursor.fetchone()
+
+        assert await migrate(conn) == SCHEMA_VERSION
+        await conn.execute("VACUUM")
+        cursor = await conn.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN ('flat_rows', 'layouts', 'flat_statuses', 'bulks')"
+        )
+        (size_after,) = await cursor.fetchone()
+        cursor = await conn.execute("SELECT COUNT(*) FROM flat_rows WHERE url IS NULL AND pdf IS NULL")
+        (templated,) = await cursor.fetchone()
+
+    assert templated == len(items)
+    assert size_after < size_before * 0.85
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(db_path)
+    await repo.init_db()
+    expected = {flat.id: flat.model_copy(update={"raw": None}) for flat in flats}
+    assert {flat.id: flat for flat in await repo.get_all_flats()} == expected
+    for item in items[:20]:
+        assert await repo.get_raw_item(item["id"]) == item
+
+    # миграции не считают оценки выгодности — их заполняет старт репозитория
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute("SELECT COUNT(*) FROM deal_scores")
+        (scores,) = await cursor.fetchone()
+    assert scores > 0
@@ -89,4 +89,72 @@ async def test_stats_calculation(tmp_path):
     assert "• 🚪 1-к.: <b>2</b> свободно (бронь 1)" in stats_text
 
     # Проверяем, что 2-комнатные не учитываются в статистике
-    assert "2-к." not in stats_text 
\ No newline at end of file
+    assert "2-к." not in stats_text
+
+
+@pytest.mark.asyncio
+async def test_watched_flats_fast_diff(tmp_path):
+    """Быстрый опрос сообщает о цене и статусе только отслеживаемых квартир."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    service = MonitorService(repo)
+    await service.update_from_list(
+        [
+            Flat(id=1, rooms="1", price=10_000_000, status="free", url=""),
+            Flat(id=2, rooms="1", price=11_000_000, status="free", url=""),
+            Flat(id=3, rooms="studio", price=8_000_000, status="free", url=""),
+        ]
+    )
+    # без отслеживаемых квартир опрос ничего не делает
+    assert await service.update_watched_from_list([]) == {}
+
+    assert (await repo.add_watch(100, 1)).price == 10_000_000
+    assert await repo.add_watch(200, 1) is not None
+    assert await repo.add_watch(200, 3) is not None
+    assert await repo.add_watch(100, 42) is None
+
+    fresh = [
+        Flat(id=1, rooms="1", price=9_500_000, status="reserve", url=""),
+        Flat(id=2, rooms="1", price=1_000_000, status="reserve", url=""),  # не отслеживается
+    ]
+    notes = await service.update_watched_from_list(fresh)
+
+    assert set(notes) == {100, 200}
+    assert notes[100] == [
+        "📉 #1 (1-к.): 10.00 млн → 9.50 млн (-5.0%)",
+        "🔁 #1 (1-к.): статус free → reserve",
+    ]
+    assert notes[200][-1] == "❌ #3 (студия): пропала из продажи, была 8.00 млн"
+
+    # повторный опрос молчит, а flats остаётся обычному обновлению
+    assert await service.update_watched_from_list(fresh) == {}
+    prices = {f.id: (f.price, f.status) for f in await repo.get_all_flats()}
+    assert prices == {1: (10_000_000, "free"), 2: (11_000_000, "free"), 3: (8_000_000, "free")}
+
+    # изменения, уже отправленные отслеживающим, есть и в общем отчёте
+    report = await service.update_from_list(fresh)
+    assert "✏️ Квартира #1" in report
+    assert "➖ Удалена квартира #3" in report
+    assert service.take_watch_notes() == {}
+    assert await service.update_watched_from_list(fresh) == {}
+
+    # обычное обновление тоже проверяет отслеживаемые квартиры
+    cheaper = [fresh[0].model_copy(update={"price": 9_000_000}), fresh[1]]
+    await service.update_from_list(cheaper)
+    note = "📉 #1 (1-к.): 9.50 млн → 9.00 млн (-5.3%)"
+    assert service.take_watch_notes() == {100: [note], 200: [note]}
+    assert service.take_watch_notes() == {}
+    assert await service.update_watched_from_list(cheaper) == {}
+
+    watched = await repo.get_watchlist(200)
+    assert [(fid, flat is None) for fid, flat in watched] == [(1, False), (3, True)]
+    assert await repo.remove_watch(200, 3)
+    assert not await repo.remove_watch(200, 3)
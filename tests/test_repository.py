@@ -3,7 +3,7 @@ from typing import List
 import pytest
 
 from bot.models import Flat
-from bot.repository import FlatRepository
+from bot.repository import UPSERT_FIELDS, FlatRepository
 
 
 @pytest.mark.asyncio
@@ -48,4 +48,182 @@ async def test_upsert_and_delete(tmp_path):
     await repo.delete_by_ids([2])
     all_flats = await repo.get_all_flats()
     assert len(all_flats) == 1
-    assert all_flats[0].id == 1 
\ No newline at end of file
+    assert all_flats[0].id == 1
+
+
+@pytest.mark.asyncio
+async def test_nested_json_filters(tmp_path):
+    """Проверяем хранение исходного JSON и фильтры по вложенным полям."""
+
+    import json
+    import os
+
+    import aiosqlite
+
+    from bot.pik_api_client import parse_flats
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    await repo.upsert_many(parse_flats(items))
+
+    sample = items[0]
+    found = await repo.select_by_attributes(
+        layout_name=sample["layout"]["name"],
+        is_finish=sample["finish"]["isFinish"],
+        booking_period=sample["booking"]["period"],
+    )
+    expected = {
+        item["id"]
+        for item in items
+        if item["layout"]["name"] == sample["layout"]["name"]
+        and item["finish"]["isFinish"] == sample["finish"]["isFinish"]
+        and item["booking"]["period"] == sample["booking"]["period"]
+    }
+    assert {f.id for f in found} == expected
+    assert await repo.get_raw_item(sample["id"]) == sample
+
+    # Фильтр по планировке использует индекс, а не полный просмотр таблицы
+    async with aiosqlite.connect(repo._settings.database_path) as conn:
+        cursor = await conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM flats WHERE layout_id = ?", (sample["layout"]["id"],)
+        )
+        plan = " ".join(row[3] for row in await cursor.fetchall())
+    assert "idx_flats_layout_id" in plan
+
+    # Та же квартира без исходного JSON и без изменений сохранённый JSON не затирает
+    (stored,) = [flat for flat in await repo.get_all_flats() if flat.id == sample["id"]]
+    await repo.upsert_many([stored])
+    assert await repo.get_raw_item(sample["id"]) == sample
+
+    # Изменённая квартира без исходного JSON забывает его, чтобы фильтры не отдавали устаревшее
+    await repo.upsert_many([Flat(id=sample["id"], rooms="3", price=1, status="free", url="")])
+    assert await repo.get_raw_item(sample["id"]) is None
+    found = await repo.select_by_attributes(
+        layout_name=sample["layout"]["name"],
+        is_finish=sample["finish"]["isFinish"],
+        booking_period=sample["booking"]["period"],
+    )
+    assert {f.id for f in found} == expected - {sample["id"]}
+
+
+@pytest.mark.asyncio
+async def test_raw_roundtrip_without_optional_keys(tmp_path):
+    """Представление возвращает `raw` как записан: без ключей, которых в объекте не было."""
+
+    import json
+    import os
+
+    from bot.pik_api_client import parse_flats
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)[:3]
+    # без планировки, ссылки и PDF; планировка-null; ключи на месте
+    bare = {key: value for key, value in items[0].items() if key not in ("layout", "url", "pdf")}
+    null_layout = {**items[1], "layout": None}
+    await repo.upsert_many(parse_flats([bare, null_layout, items[2]]))
+
+    for item in (bare, null_layout, items[2]):
+        assert await repo.get_raw_item(item["id"]) == item
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination(tmp_path):
+    """Листание по (price, id) вперёд и назад без пропусков и повторов."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    # Одинаковые цены у соседних квартир — курсор должен различать их по id
+    studios = [
+        Flat(id=i, rooms="studio" if i % 2 else "0", price=5_000_000 + (i // 3) * 10_000, status="free", url="")
+        for i in range(1, 26)
+    ]
+    others = [Flat(id=100 + i, rooms="1", price=1_000_000 + i, status="free", url="") for i in range(5)]
+    await repo.upsert_many(studios + others)
+
+    expected = [f.id for f in sorted(studios, key=lambda f: (f.price, f.id))]
+
+    seen: List[int] = []
+    pages = []
+    flats, has_more = await repo.select_page("studio", limit=10)
+    while True:
+        pages.append(flats)
+        seen.extend(f.id for f in flats)
+        if not has_more:
+            break
+        last = flats[-1]
+        flats, has_more = await repo.select_page("studio", after=(last.price, last.id), limit=10)
+    assert seen == expected
+    assert [len(p) for p in pages] == [10, 10, 5]
+
+    # Назад с последней страницы возвращает предыдущую
+    first = pages[-1][0]
+    prev, has_prev = await repo.select_page("studio", before=(first.price, first.id), limit=10)
+    assert [f.id for f in prev] == [f.id for f in pages[1]]
+    assert has_prev
+
+
+@pytest.mark.asyncio
+async def test_incremental_aggregates(tmp_path):
+    """Агрегаты по корпусам после diff совпадают с полным пересчётом."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    flats = [
+        Flat(id=i, rooms="1", price=8_000_000 + i * 100_000, status="free" if i % 4 else "reserve",
+             url="", area=40.0, bulk_id=10 + i % 3, section_id=100 + i % 6)
+        for i in range(1, 19)
+    ]
+    await repo.upsert_many(flats)
+
+    # Меняем цену одной квартиры, переносим другую в новый корпус и удаляем третью
+    flats[0] = flats[0].model_copy(update={"price": 1_000_000})
+    flats[1] = flats[1].model_copy(update={"bulk_id": 99})
+    removed = flats.pop(2)
+    await repo.apply_diff([tuple(getattr(f, n) for n in UPSERT_FIELDS) for f in flats], [removed.id])
+
+    expected = {}
+    for f in flats:
+        entry = expected.setdefault(f.bulk_id, {"free": 0, "reserved": 0, "prices": []})
+        if f.status == "free":
+            entry["free"] += 1
+            entry["prices"].append(f.price)
+        else:
+            entry["reserved"] += 1
+
+    rows = {row["bulk_id"]: row for row in await repo.get_aggregates("bulk")}
+    assert rows.keys() == expected.keys()
+    for bulk_id, entry in expected.items():
+        row = rows[bulk_id]
+        assert (row["free_count"], row["reserved_count"]) == (entry["free"], entry["reserved"])
+        assert row["min_price"] == min(entry["prices"], default=None)
+        assert row["max_price"] == max(entry["prices"], default=None)
+        if entry["prices"]:
+            assert row["min_ppm"] == pytest.approx(min(entry["prices"]) / 40.0)
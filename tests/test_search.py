@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from bot.pik_api_client import parse_flats
+from bot.repository import FlatRepository
+from bot.search import Condition, FlatSearch, SearchError, compile_filter, parse_filter
+
+
+def test_parse_filter_grammar():
+    """Разбор фильтра с синонимами, диапазонами и суффиксами цен."""
+
+    conditions = parse_filter("1-к., floor 10–20, area ≥ 38, price ≤ 12M, free, section 22414")
+    assert set(conditions) == {
+        Condition("room_category", "=", "one"),
+        Condition("floor", "between", (10, 20)),
+        Condition("area", ">=", 38.0),
+        Condition("price", "<=", 12_000_000),
+        Condition("status", "=", "free"),
+        Condition("section_id", "=", 22414),
+    }
+
+    # Одинаковая форма фильтра даёт одинаковый SQL — меняются только параметры
+    a = compile_filter(parse_filter("студия цена<=8млн этаж 3..5"))
+    b = compile_filter(parse_filter("этаж 10-12 studio price<=9.5m"))
+    assert a.sql == b.sql and a.params != b.params
+
+    with pytest.raises(SearchError):
+        parse_filter("вид_из_окна=парк")
+
+
+@pytest.mark.asyncio
+async def test_find_uses_indexes_and_rejects_full_scans(tmp_path):
+    """Фильтр выполняется по индексу, а фильтр без индексируемых полей отклоняется."""
+
+    import os
+
+    os.environ.setdefault("telegram_token", "dummy")
+    os.environ.setdefault("telegram_chat_id", "dummy")
+
+    repo = FlatRepository()
+    repo._settings.database_path = str(tmp_path / "test.db")
+    await repo.init_db()
+
+    with open("mock_data.json", "r", encoding="utf-8") as f:
+        items = json.load(f)
+    await repo.upsert_many(parse_flats(items))
+
+    search = FlatSearch(repo)
+    try:
+        flats, _ = await search.find("1-к этаж 10..20 цена<=12м свободные")
+        expected = sorted(
+            (i for i in items if i["rooms"] == "1" and 10 <= i["floor"] <= 20
+             and i["price"] <= 12_000_000 and i["status"] == "free"),
+            key=lambda i: (i["price"], i["id"]),
+        )
+        assert [f.id for f in flats] == [i["id"] for i in expected][:20]
+
+        layout = items[0]["layout"]["name"]
+        flats, _ = await search.find(f"планировка {layout}")
+        assert {f.id for f in flats} == {i["id"] for i in items if i["layout"]["name"] == layout}
+
+        with pytest.raises(SearchError):
+            await search.find("цена<10м")
+    finally:
+        await repo.close()